@@ -0,0 +1,230 @@
+#! /usr/bin/env python3
+import sys
+import argparse
+import csv
+import random
+import time
+
+# --the columns of the tutorial's test_set1.csv, any more asked for are added as extra_nn
+baseColumns = [
+    "uniqueid",
+    "type",
+    "name",
+    "gender",
+    "dob",
+    "ssn",
+    "addr1",
+    "city",
+    "state",
+    "zip",
+    "create_date",
+    "status",
+    "value",
+]
+firstNames = ["Bob", "Mary", "Jose", "Wei", "Aisha", "John", "Olga", "Raj", "Ana"]
+lastNames = ["Jones", "Smith", "Garcia", "Chen", "Khan", "Miller", "Ivanov", "Patel"]
+companyWords = ["ABC", "Acme", "Global", "First", "United", "Summit", "Delta"]
+companyTypes = ["Company", "Corp", "LLC", "Inc", "Partners"]
+streetNames = ["First", "Second", "Main", "Oak", "Pine", "Maple", "Lake", "Hill"]
+cityStates = [
+    ("Las Vegas", "NV"),
+    ("Reno", "NV"),
+    ("Phoenix", "AZ"),
+    ("Austin", "TX"),
+    ("Denver", "CO"),
+    ("Boise", "ID"),
+]
+
+
+# ----------------------------------------
+def getColumnNames(columnCount):
+    columnNames = baseColumns[0:columnCount]
+    for i in range(len(columnNames), columnCount):
+        columnNames.append("extra_%02d" % (i - len(baseColumns) + 1))
+    return columnNames
+
+
+# ----------------------------------------
+def makeValuePool(columnName, cardinality, rng):
+    """the distinct values a column draws from, so its cardinality can be controlled"""
+    if columnName == "type":
+        return ["individual", "company"]
+    if columnName == "gender":
+        return ["M", "F", "u"]
+    if columnName == "status":
+        return ["Active", "Inactive", "Pending"]
+
+    valuePool = []
+    for i in range(cardinality):
+        if columnName == "name":
+            if i % 2:
+                value = "%s %s %s" % (
+                    rng.choice(companyWords),
+                    rng.choice(streetNames),
+                    rng.choice(companyTypes),
+                )
+            else:
+                value = "%s %s" % (rng.choice(firstNames), rng.choice(lastNames))
+            value += " %s" % i if i >= 50 else ""
+        elif columnName in ("dob", "create_date"):
+            value = "%s/%s/%s" % (
+                rng.randint(1, 12),
+                rng.randint(1, 28),
+                rng.randint(1930, 2020),
+            )
+        elif columnName == "ssn":
+            value = "%03d-%02d-%04d" % (
+                rng.randint(100, 899),
+                rng.randint(10, 99),
+                rng.randint(1000, 9999),
+            )
+        elif columnName == "addr1":
+            value = "%s %s" % (rng.randint(1, 9999), rng.choice(streetNames))
+        elif columnName == "city":
+            value = cityStates[i % len(cityStates)][0]
+        elif columnName == "state":
+            value = cityStates[i % len(cityStates)][1]
+        elif columnName == "zip":
+            value = "%05d" % rng.randint(10000, 99999)
+        elif columnName == "value":
+            value = str(rng.randint(1, 100000))
+        else:
+            value = "%s value %s" % (columnName, i)
+        valuePool.append(value)
+    return valuePool
+
+
+# ----------------------------------------
+def generateFile(fileArgs):
+    """write a csv file of made up people and companies, returns the column names"""
+    # --fileArgs are parsed by getArgParser, so the benchmarks get the same defaults as the command line
+    rng = random.Random(fileArgs.seed)
+    columnNames = getColumnNames(fileArgs.columnCount)
+    valuePools = {
+        columnName: makeValuePool(columnName, fileArgs.cardinality, rng)
+        for columnName in columnNames[1:]
+    }
+    keyCardinality = fileArgs.keyCardinality or fileArgs.rowCount
+    fieldDelimiter = fileArgs.fieldDelimiter
+    nullRate = fileArgs.nullRate
+    quoteRate = fileArgs.quoteRate
+    newlineRate = fileArgs.newlineRate
+
+    # --values with a delimiter or quote in them have to be quoted, ones with newlines as well
+    quotedValues = ['say "%s"' % i for i in range(10)]
+    quotedValues += ["%s%s later" % (i, fieldDelimiter) for i in range(10)]
+    newlineValues = ["line one\nline %s" % i for i in range(10)]
+
+    with open(fileArgs.outputFileName, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, delimiter=fieldDelimiter, lineterminator="\n")
+        writer.writerow(columnNames)
+        for rowNum in range(fileArgs.rowCount):
+            rowData = [1000 + (rowNum % keyCardinality)]
+            for columnName in columnNames[1:]:
+                randomValue = rng.random()
+                if randomValue < nullRate and columnName != "type":
+                    rowData.append("")
+                elif randomValue < nullRate + quoteRate:
+                    rowData.append(rng.choice(quotedValues))
+                elif randomValue < nullRate + quoteRate + newlineRate:
+                    rowData.append(rng.choice(newlineValues))
+                else:
+                    rowData.append(rng.choice(valuePools[columnName]))
+            writer.writerow(rowData)
+    return columnNames
+
+
+# ----------------------------------------
+def getArgParser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-o",
+        "--outputFileName",
+        dest="outputFileName",
+        help="the name of the csv file to generate",
+    )
+    parser.add_argument(
+        "-r", "--rows", dest="rowCount", type=int, default=1000000, help="rows to write"
+    )
+    parser.add_argument(
+        "-c",
+        "--columns",
+        dest="columnCount",
+        type=int,
+        default=len(baseColumns),
+        help="columns per row, past the %s of test_set1.csv extra ones are added"
+        % len(baseColumns),
+    )
+    parser.add_argument(
+        "--nullRate",
+        dest="nullRate",
+        type=float,
+        default=0.1,
+        help="fraction of values left empty, default 0.1",
+    )
+    parser.add_argument(
+        "--cardinality",
+        dest="cardinality",
+        type=int,
+        default=1000,
+        help="distinct values per column, default 1000",
+    )
+    parser.add_argument(
+        "--keyCardinality",
+        dest="keyCardinality",
+        type=int,
+        help="distinct uniqueid values, fewer than the rows repeats them for aggregation",
+    )
+    parser.add_argument(
+        "--quoteRate",
+        dest="quoteRate",
+        type=float,
+        default=0.01,
+        help="fraction of values with a quote or delimiter in them, default 0.01",
+    )
+    parser.add_argument(
+        "--newlineRate",
+        dest="newlineRate",
+        type=float,
+        default=0.0,
+        help="fraction of values with an embedded newline, default 0",
+    )
+    parser.add_argument(
+        "-d",
+        "--fieldDelimiter",
+        dest="fieldDelimiter",
+        default=",",
+        help="a single delimiter character, default is a comma",
+    )
+    parser.add_argument(
+        "--seed", dest="seed", type=int, default=1, help="random seed, default 1"
+    )
+    return parser
+
+
+# ----------------------------------------
+if __name__ == "__main__":
+    procStartTime = time.time()
+
+    args = getArgParser().parse_args()
+
+    if not args.outputFileName:
+        print("an output file must be specified with -o")
+        sys.exit(1)
+    if len(args.fieldDelimiter) != 1:
+        print("the delimiter must be a single character")
+        sys.exit(1)
+    if args.nullRate + args.quoteRate + args.newlineRate > 1:
+        print("the null, quote and newline rates cannot add up to more than 1")
+        sys.exit(1)
+
+    generateFile(args)
+    print(
+        "%s rows written to %s in %s seconds"
+        % (
+            args.rowCount,
+            args.outputFileName,
+            round(time.time() - procStartTime, 1),
+        )
+    )
+    sys.exit(0)
@@ -0,0 +1,400 @@
+#! /usr/bin/env python3
+import os
+import sys
+import argparse
+import csv
+import importlib
+import io
+import itertools
+import json
+import platform
+import statistics
+import timeit
+from datetime import datetime
+from importlib.machinery import SourceFileLoader
+
+benchmarkDir = os.path.dirname(os.path.abspath(__file__))
+rootDir = os.path.dirname(benchmarkDir)
+sys.path.insert(0, os.path.join(rootDir, "src"))
+
+defaultBaselineFile = os.path.join(benchmarkDir, "micro_baseline.json")
+templateModuleFile = os.path.join(rootDir, "mappings", "test_set1.py")
+
+# --sample values like the ones in input/test_set1.csv, each call of a benchmark runs through all of them
+sampleValues = [
+    "ABC Company",
+    "  Bob   Jones ",
+    "null",
+    "111 First",
+    "Las Vegas",
+    "N/A",
+    "89111",
+    "",
+    "2/2/92",
+    "333-33-3333",
+]
+sampleAttributes = [
+    "NAME_FULL",
+    "NAME_ORG",
+    "HOME_ADDR_LINE1",
+    "ADDR_CITY_BUSINESS",
+    "IMPORTANT_DATE",
+    "STATUS",
+    "DATE_OF_BIRTH",
+    "SSN_NUMBER",
+]
+sampleDates = ["1/1/01", "2/2/1992", "1992-02-02", "12-Mar-1985", "1985", "bad date"]
+sampleHeader = [
+    "uniqueid",
+    "type",
+    "name",
+    "gender",
+    "dob",
+    "ssn",
+    "addr1",
+    "city",
+    "state",
+    "zip",
+    "create_date",
+    "status",
+    "value",
+]
+sampleLines = [
+    "1001,company,ABC Company,u,,null,111 First,Las Vegas,NV,89111,1/1/01,Active,1000\n",
+    '1002,individual,"Jones, Bob",u,2/2/92,333-33-3333,222 Second,Las Vegas,NV,89112,2/2/02,Inactive,2000\n',
+]
+sampleRecord = {
+    "DATA_SOURCE": "TEST",
+    "RECORD_ID": "1001",
+    "NAME_FULL": "Bob Jones",
+    "DATE_OF_BIRTH": "1992-02-02",
+    "ADDRESSES": [
+        {"ADDR_TYPE": "HOME", "ADDR_LINE1": "111 First", "ADDR_CITY": "Las Vegas"},
+        {"ADDR_TYPE": "MAIL", "ADDR_LINE1": "PO Box 1", "ADDR_CITY": "Reno"},
+    ],
+    "IMPORTANT_STATUS": "Active",
+}
+
+
+# ----------------------------------------
+def calibrate():
+    """a fixed pure python workload, the other timings are compared as a multiple of it"""
+    wordList = ("alpha beta gamma delta " * 5).split()
+    counts = {}
+    for word in wordList:
+        counts[word.upper()] = counts.get(word.upper(), 0) + len(word)
+    return " ".join(sorted(counts))
+
+
+# ----------------------------------------
+def getBenchmarks():
+    """the functions to time as {name: (function, calls per run)}, or a reason they are skipped"""
+    benchmarks = {}
+    skipped = {}
+
+    # --the modules being timed are in src, found through the path added above
+    csv_mapping = importlib.import_module("csv_mapping")
+    csv_reader = importlib.import_module("csv_reader")
+    csvFunctions = importlib.import_module("csv_functions").csv_functions()
+    benchmarks["calibration"] = (calibrate, 1)
+    benchmarks["csv_functions.clean_value"] = (
+        lambda: [csvFunctions.clean_value("NAME_FULL", x) for x in sampleValues],
+        len(sampleValues),
+    )
+    benchmarks["csv_functions.format_date"] = (
+        lambda: [csvFunctions.format_date(x) for x in sampleDates],
+        len(sampleDates),
+    )
+    benchmarks["csv_functions.is_senzing_attribute"] = (
+        lambda: [csvFunctions.is_senzing_attribute(x) for x in sampleAttributes],
+        len(sampleAttributes),
+    )
+    benchmarks["csv_functions.updateStat"] = (
+        lambda: [csvFunctions.updateStat("GARBAGE", "NAME", x) for x in sampleValues],
+        len(sampleValues),
+    )
+
+    # --rows come from an endless csv reader so every call gets a fresh one
+    csv_mapping.headerCheck = True
+    fileInfo = csv_mapping.setFileHeader(
+        {"rowCnt": 0, "skipCnt": 0, "csvDialect": "excel"}, sampleHeader
+    )
+    fileInfo["reader"] = csv.reader(itertools.cycle(sampleLines))
+    benchmarks["csv_mapping.getNextRow"] = (
+        lambda: [csv_mapping.getNextRow(fileInfo) for x in sampleLines],
+        len(sampleLines),
+    )
+
+    # --the same rows with a multi-character delimiter, enough of them to fill a few blocks
+    multiLines = [x.replace(",", "~|~") for x in sampleLines]
+    multiLines[1] = multiLines[1].replace('"Jones~|~ Bob"', '"Jones, Bob ~|~ Jr"')
+    multiText = "".join(multiLines) * 1000
+    benchmarks["csv_reader.multi_delimiter_reader"] = (
+        lambda: list(csv_reader.multi_delimiter_reader(io.StringIO(multiText), "~|~")),
+        len(multiLines) * 1000,
+    )
+
+    # --quoted values as left in the fields of a multi-character delimited file
+    quotedValues = ['"%s"' % x for x in sampleValues] + [
+        "'Bob'",
+        '"unbalanced',
+        "plain",
+    ]
+    benchmarks["csv_reader.removeQuoteChar"] = (
+        lambda: [csv_reader.removeQuoteChar(x) for x in quotedValues],
+        len(quotedValues),
+    )
+
+    # --the python template functions, as generated into the tutorial's module
+    try:
+        templateMapper = SourceFileLoader("test_set1", templateModuleFile).load_module()
+        mapper = templateMapper.mapper()
+    except Exception as err:
+        for functionName in (
+            "compute_record_hash",
+            "remove_empty_tags",
+            "is_organization",
+        ):
+            skipped["template.%s" % functionName] = str(err)
+    else:
+        hashAttributes = ["NAME_FULL", "DATE_OF_BIRTH", "RECORD_ID"]
+        benchmarks["template.compute_record_hash"] = (
+            lambda: (
+                mapper.compute_record_hash(sampleRecord, hashAttributes),
+                mapper.compute_record_hash(sampleRecord),
+            ),
+            2,
+        )
+        benchmarks["template.remove_empty_tags"] = (
+            lambda: mapper.remove_empty_tags(sampleRecord),
+            1,
+        )
+        benchmarks["template.is_organization"] = (
+            lambda: [mapper.is_organization(x, "", "") for x in sampleValues],
+            len(sampleValues),
+        )
+    return benchmarks, skipped
+
+
+# ----------------------------------------
+def getLoopCount(benchmarkFunction, minSeconds):
+    """how many calls of a benchmark it takes to run for at least minSeconds"""
+    loopCount, loopSeconds = timeit.Timer(benchmarkFunction).autorange()
+    return max(int(loopCount * minSeconds / max(loopSeconds, 0.000001)), 1)
+
+
+# ----------------------------------------
+def runBenchmarks(benchmarks, minSeconds, repeatCount):
+    """the best nanoseconds per call of each benchmark, and its median time as a multiple of the calibration"""
+    loopCounts = {}
+    for benchmarkName in benchmarks:
+        loopCounts[benchmarkName] = getLoopCount(
+            benchmarks[benchmarkName][0], minSeconds
+        )
+    calibrationLoops = getLoopCount(calibrate, minSeconds)
+
+    # --the repeats go round all the benchmarks in turn rather than one after the other,
+    # --so a busy spell on the machine slows one run of each instead of every run of one
+    bestSeconds = {}
+    runRatios = {}
+    for repeatNum in range(repeatCount):
+        for benchmarkName in benchmarks:
+
+            # --each run is paired with a run of the calibration just before it, a busy
+            # --spell slows both so their ratio holds steadier than either time
+            calibrationSeconds = (
+                timeit.Timer(calibrate).timeit(calibrationLoops) / calibrationLoops
+            )
+            runSeconds = (
+                timeit.Timer(benchmarks[benchmarkName][0]).timeit(
+                    loopCounts[benchmarkName]
+                )
+                / loopCounts[benchmarkName]
+                / benchmarks[benchmarkName][1]
+            )
+            bestSeconds[benchmarkName] = min(
+                bestSeconds.get(benchmarkName, runSeconds), runSeconds
+            )
+            runRatios.setdefault(benchmarkName, []).append(
+                runSeconds / calibrationSeconds
+            )
+
+    # --relative to the calibration so a baseline from one machine can be used on another
+    results = {}
+    for benchmarkName in benchmarks:
+        results[benchmarkName] = {
+            "nsPerCall": round(bestSeconds[benchmarkName] * 1000000000, 1),
+            "relative": round(statistics.median(runRatios[benchmarkName]), 4),
+        }
+    return results
+
+
+# ----------------------------------------
+def compareToBaseline(results, baselineDoc, tolerance):
+    """print each benchmark against the baseline, returns the names of the ones that regressed"""
+    regressions = []
+    print(
+        "  %s %12s %12s %10s" % ("benchmark".ljust(40), "ns/call", "baseline", "change")
+    )
+    for benchmarkName in results:
+        if benchmarkName == "calibration":
+            continue
+        baselineResult = baselineDoc["benchmarks"].get(benchmarkName)
+        if not baselineResult:
+            print(
+                "  %s %12s %12s %10s"
+                % (
+                    benchmarkName.ljust(40),
+                    results[benchmarkName]["nsPerCall"],
+                    "",
+                    "new",
+                )
+            )
+            continue
+        relativeChange = (
+            results[benchmarkName]["relative"] / baselineResult["relative"] - 1
+        )
+        regressed = relativeChange > tolerance
+        if regressed:
+            regressions.append(benchmarkName)
+        print(
+            "  %s %12s %12s %+9.1f%%%s"
+            % (
+                benchmarkName.ljust(40),
+                results[benchmarkName]["nsPerCall"],
+                baselineResult["nsPerCall"],
+                relativeChange * 100,
+                (
+                    "  <-- slower than the %s%% allowed" % round(tolerance * 100)
+                    if regressed
+                    else ""
+                ),
+            )
+        )
+    return regressions
+
+
+# ----------------------------------------
+def checkBenchmarks(benchmarks, baselineDoc, tolerance, minSeconds, repeatCount):
+    """run and compare the benchmarks, returns the ones still slower when timed a second time"""
+    results = runBenchmarks(benchmarks, minSeconds, repeatCount)
+    regressions = compareToBaseline(results, baselineDoc, tolerance)
+
+    # --one slow run can be the machine rather than the code, so only a second one counts
+    if regressions:
+        print("")
+        print("Timing %s again ..." % ", ".join(regressions))
+        retryBenchmarks = {
+            benchmarkName: benchmarks[benchmarkName]
+            for benchmarkName in ["calibration"] + regressions
+        }
+        retryResults = runBenchmarks(retryBenchmarks, minSeconds, repeatCount)
+        regressions = compareToBaseline(retryResults, baselineDoc, tolerance)
+    return regressions
+
+
+# ----------------------------------------
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-b",
+        "--baselineFile",
+        dest="baselineFile",
+        default=defaultBaselineFile,
+        help="the baseline to compare to, default is benchmarks/micro_baseline.json",
+    )
+    parser.add_argument(
+        "-t",
+        "--tolerance",
+        dest="tolerance",
+        type=float,
+        help="how much slower than the baseline a function may be before it fails, default is the baseline's own or 0.5",
+    )
+    parser.add_argument(
+        "-u",
+        "--update",
+        dest="updateBaseline",
+        action="store_true",
+        default=False,
+        help="write the results as the new baseline rather than comparing to it",
+    )
+    parser.add_argument(
+        "-f",
+        "--filter",
+        dest="nameFilter",
+        help="only run the benchmarks whose name contains this",
+    )
+    parser.add_argument(
+        "--minSeconds",
+        dest="minSeconds",
+        type=float,
+        default=0.1,
+        help="seconds to time each benchmark for in each of the repeats, default 0.1",
+    )
+    parser.add_argument(
+        "--repeat",
+        dest="repeatCount",
+        type=int,
+        default=7,
+        help="runs of each benchmark to take the best of, default 7",
+    )
+    args = parser.parse_args()
+
+    benchmarks, skipped = getBenchmarks()
+    if args.nameFilter:
+        benchmarks = {
+            benchmarkName: benchmarks[benchmarkName]
+            for benchmarkName in benchmarks
+            if args.nameFilter in benchmarkName or benchmarkName == "calibration"
+        }
+    for benchmarkName in skipped:
+        print("skipping %s: %s" % (benchmarkName, skipped[benchmarkName]))
+
+    print("")
+    print("Running %s micro-benchmarks ..." % (len(benchmarks) - 1))
+    if args.updateBaseline:
+        results = runBenchmarks(benchmarks, args.minSeconds, args.repeatCount)
+        baselineDoc = {}
+        if os.path.exists(args.baselineFile):
+            baselineDoc = json.load(open(args.baselineFile, "r"))
+        baselineDoc["baselineTime"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        baselineDoc["python"] = platform.python_version()
+        baselineDoc["platform"] = platform.platform()
+        baselineDoc["tolerance"] = args.tolerance or baselineDoc.get("tolerance", 0.5)
+        baselineDoc["benchmarks"] = baselineDoc.get("benchmarks", {})
+        baselineDoc["benchmarks"].update(results)
+        with open(args.baselineFile, "w") as f:
+            json.dump(baselineDoc, f, indent=4)
+        for benchmarkName in results:
+            print(
+                "  %s %12s ns/call"
+                % (benchmarkName.ljust(40), results[benchmarkName]["nsPerCall"])
+            )
+        print("")
+        print("Baseline written to %s" % args.baselineFile)
+        sys.exit(0)
+
+    if not os.path.exists(args.baselineFile):
+        print("")
+        print("%s not found, run with --update to create it" % args.baselineFile)
+        sys.exit(1)
+    baselineDoc = json.load(open(args.baselineFile, "r"))
+    tolerance = args.tolerance or baselineDoc.get("tolerance", 0.5)
+
+    print("")
+    regressions = checkBenchmarks(
+        benchmarks, baselineDoc, tolerance, args.minSeconds, args.repeatCount
+    )
+    print("")
+    if regressions:
+        print(
+            "%s of the functions are more than %s%% slower than the baseline!"
+            % (len(regressions), round(tolerance * 100))
+        )
+        sys.exit(1)
+    print(
+        "No function is more than %s%% slower than the baseline"
+        % round(tolerance * 100)
+    )
+    sys.exit(0)
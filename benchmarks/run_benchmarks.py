@@ -0,0 +1,333 @@
+#! /usr/bin/env python3
+import os
+import sys
+import argparse
+import json
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import generate_csv
+
+benchmarkDir = os.path.dirname(os.path.abspath(__file__))
+srcDir = os.path.join(os.path.dirname(benchmarkDir), "src")
+scenarioNames = ["mapper_map", "mapper_python", "mapper_aggregate", "analyzer"]
+
+# --a mapping like the tutorial's test_set1.map, the aggregate one gathers every row of a uniqueid
+benchmarkMapping = {
+    "input": {"fieldDelimiter": ","},
+    "calculations": [
+        {"name_org": "rowData['name'] if rowData['type'] == 'company' else ''"},
+        {"name_full": "rowData['name'] if rowData['type'] != 'company' else ''"},
+        {"addr_type": "'BUSINESS' if rowData['type'] == 'company' else ''"},
+    ],
+    "outputs": [
+        {
+            "filter": "not rowData['name']",
+            "data_source": "TEST",
+            "record_type": "GENERIC",
+            "record_id": "%(uniqueid)s",
+            "attributes": [
+                {"attribute": "NAME_ORG", "mapping": "%(name_org)s"},
+                {"attribute": "NAME_FULL", "mapping": "%(name_full)s"},
+                {"attribute": "GENDER", "mapping": "%(gender)s"},
+                {"attribute": "DATE_OF_BIRTH", "mapping": "%(dob)s"},
+                {"attribute": "SSN_NUMBER", "mapping": "%(ssn)s"},
+                {"attribute": "ADDR_TYPE", "mapping": "%(addr_type)s"},
+                {"attribute": "ADDR_LINE1", "mapping": "%(addr1)s"},
+                {"attribute": "ADDR_CITY", "mapping": "%(city)s"},
+                {"attribute": "ADDR_STATE", "mapping": "%(state)s"},
+                {"attribute": "ADDR_POSTAL_CODE", "mapping": "%(zip)s"},
+                {"attribute": "STATUS", "mapping": "%(status)s"},
+            ],
+        }
+    ],
+}
+aggregateAttributes = {
+    "NAME_ORG": "NAMES",
+    "NAME_FULL": "NAMES",
+    "ADDR_LINE1": "ADDRESSES",
+    "ADDR_CITY": "ADDRESSES",
+    "ADDR_STATE": "ADDRESSES",
+    "ADDR_POSTAL_CODE": "ADDRESSES",
+}
+benchmarkModule = """#! /usr/bin/env python3
+
+
+class mapper:
+
+    def __init__(self):
+        self.stat_pack = {}
+
+    def map(self, raw_data, input_row_num=None):
+        if not raw_data["name"]:
+            return None
+        json_data = {}
+        json_data["DATA_SOURCE"] = "TEST"
+        json_data["RECORD_ID"] = raw_data["uniqueid"]
+        if raw_data["type"] == "company":
+            json_data["NAME_ORG"] = raw_data["name"]
+            json_data["ADDR_TYPE"] = "BUSINESS"
+        else:
+            json_data["NAME_FULL"] = raw_data["name"]
+        json_data["GENDER"] = raw_data["gender"]
+        json_data["DATE_OF_BIRTH"] = raw_data["dob"]
+        json_data["SSN_NUMBER"] = raw_data["ssn"]
+        json_data["ADDR_LINE1"] = raw_data["addr1"]
+        json_data["ADDR_CITY"] = raw_data["city"]
+        json_data["ADDR_STATE"] = raw_data["state"]
+        json_data["ADDR_POSTAL_CODE"] = raw_data["zip"]
+        json_data["STATUS"] = raw_data["status"]
+        return json_data
+"""
+
+
+# ----------------------------------------
+def writeBenchmarkFiles(workDir):
+    """write the mapping files and python module the scenarios run with"""
+    with open(os.path.join(workDir, "benchmark.map"), "w") as f:
+        json.dump(benchmarkMapping, f, indent=4)
+
+    aggregateMapping = json.loads(json.dumps(benchmarkMapping))
+    for attributeDict in aggregateMapping["outputs"][0]["attributes"]:
+        if attributeDict["attribute"] in aggregateAttributes:
+            attributeDict["subList"] = aggregateAttributes[attributeDict["attribute"]]
+    with open(os.path.join(workDir, "benchmark_aggregate.map"), "w") as f:
+        json.dump(aggregateMapping, f, indent=4)
+
+    with open(os.path.join(workDir, "benchmark_module.py"), "w") as f:
+        f.write(benchmarkModule)
+
+
+# ----------------------------------------
+def getInputFile(workDir, rowCount, keyCardinality=None):
+    """generate an input file the first time one of its size is needed"""
+    fileName = os.path.join(
+        workDir,
+        "benchmark-%s%s.csv"
+        % (rowCount, "-keys%s" % keyCardinality if keyCardinality else ""),
+    )
+    if not os.path.exists(fileName):
+        print(" generating %s ..." % fileName)
+        generateArgs = ["-o", fileName, "-r", str(rowCount), "--newlineRate", "0.001"]
+        if keyCardinality:
+            generateArgs += ["--keyCardinality", str(keyCardinality)]
+        generate_csv.generateFile(generate_csv.getArgParser().parse_args(generateArgs))
+    return fileName
+
+
+# ----------------------------------------
+def runScenario(scenarioName, rowCount, workDir, extraArgs):
+    """run one scenario, returns its result with the rates from the tool's run report"""
+    outputFileName = os.path.join(workDir, "%s-%s" % (scenarioName, rowCount))
+    if scenarioName == "analyzer":
+        inputFileName = getInputFile(workDir, rowCount)
+        reportFileName = outputFileName + "-report.json"
+        runArgs = [os.path.join(srcDir, "csv_analyzer.py"), "-i", inputFileName]
+        runArgs += ["-o", outputFileName + ".csv"]
+    else:
+        if scenarioName == "mapper_aggregate":
+            inputFileName = getInputFile(workDir, rowCount, max(rowCount // 4, 1))
+            mappingArgs = ["-m", os.path.join(workDir, "benchmark_aggregate.map")]
+        elif scenarioName == "mapper_python":
+            inputFileName = getInputFile(workDir, rowCount)
+            mappingArgs = ["-p", os.path.join(workDir, "benchmark_module.py")]
+        else:
+            inputFileName = getInputFile(workDir, rowCount)
+            mappingArgs = ["-m", os.path.join(workDir, "benchmark.map")]
+        reportFileName = outputFileName + "-stats-report.json"
+        runArgs = [os.path.join(srcDir, "csv_mapper.py"), "-i", inputFileName]
+        runArgs += mappingArgs + ["-o", outputFileName + ".json"]
+        runArgs += ["-l", outputFileName + "-stats.json"] + extraArgs
+
+    print(" running %s on %s rows ..." % (scenarioName, rowCount))
+    startTime = time.time()
+    # --a failed run is recorded as an error instead of a timing and fails the benchmark run
+    scenarioResult = {}
+    scenarioResult["scenario"] = scenarioName
+    scenarioResult["rows"] = rowCount
+    try:
+        subprocess.run(
+            [sys.executable] + runArgs,
+            cwd=srcDir,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+            check=True,
+        )
+    except subprocess.CalledProcessError as err:
+        scenarioResult["error"] = err.stdout[-2000:]
+        print("  failed!")
+        return scenarioResult
+    elapsedSeconds = time.time() - startTime
+    if not os.path.exists(reportFileName):
+        scenarioResult["error"] = "no run report was written to %s" % reportFileName
+        print("  failed!")
+        return scenarioResult
+
+    scenarioResult["seconds"] = round(elapsedSeconds, 3)
+    scenarioResult["rowsPerSecond"] = round(rowCount / elapsedSeconds)
+    runReport = json.load(open(reportFileName, "r"))
+    scenarioResult["bytesPerSecond"] = round(
+        os.path.getsize(inputFileName) / elapsedSeconds
+    )
+    scenarioResult["peakRssMB"] = runReport.get("peakRssMB")
+    scenarioResult["workerPeakRssMB"] = runReport.get("workerPeakRssMB")
+    scenarioResult["stages"] = {
+        stageName: stageInfo["seconds"]
+        for stageName, stageInfo in runReport["stages"].items()
+    }
+    print(
+        "  %s rows/sec, %s MB peak"
+        % (scenarioResult["rowsPerSecond"], scenarioResult["peakRssMB"])
+    )
+    return scenarioResult
+
+
+# ----------------------------------------
+def getGitCommit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=benchmarkDir,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ----------------------------------------
+def compareResults(benchmarkDoc, priorDoc):
+    """print the change in rows/sec from a prior run for each scenario they share"""
+    priorResults = {
+        (x["scenario"], x["rows"]): x for x in priorDoc["results"] if "error" not in x
+    }
+    print("")
+    print(
+        "Compared to %s (%s) ..." % (priorDoc["benchmarkTime"], priorDoc["gitCommit"])
+    )
+    for scenarioResult in benchmarkDoc["results"]:
+        priorResult = priorResults.get(
+            (scenarioResult["scenario"], scenarioResult["rows"])
+        )
+        if not priorResult or "error" in scenarioResult:
+            continue
+        print(
+            " %s %10s rows %10s rows/sec, was %10s, %+.1f%%"
+            % (
+                scenarioResult["scenario"].ljust(20, "."),
+                scenarioResult["rows"],
+                scenarioResult["rowsPerSecond"],
+                priorResult["rowsPerSecond"],
+                (scenarioResult["rowsPerSecond"] / priorResult["rowsPerSecond"] - 1)
+                * 100,
+            )
+        )
+
+
+# ----------------------------------------
+if __name__ == "__main__":
+    procStartTime = time.time()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-r",
+        "--rows",
+        dest="rowCounts",
+        default="1000000,10000000",
+        help="comma separated row counts to run each scenario at, default 1000000,10000000",
+    )
+    parser.add_argument(
+        "-s",
+        "--scenarios",
+        dest="scenarios",
+        default=",".join(scenarioNames),
+        help="comma separated scenarios to run from %s" % ", ".join(scenarioNames),
+    )
+    parser.add_argument(
+        "-o",
+        "--outputFileName",
+        dest="outputFileName",
+        help="the json file to write the results to, default is results/benchmark-<time>.json",
+    )
+    parser.add_argument(
+        "-c",
+        "--compare",
+        dest="priorFileName",
+        help="a prior results file to compare the rows/sec to",
+    )
+    parser.add_argument(
+        "-t",
+        "--tempDir",
+        dest="tempDir",
+        help="where to generate the input files, they are kept to reuse if given",
+    )
+    parser.add_argument(
+        "--mapperArgs",
+        dest="mapperArgs",
+        default="",
+        help='extra parameters for the mapper scenarios such as "-w 4"',
+    )
+    args = parser.parse_args()
+
+    rowCounts = [int(x) for x in args.rowCounts.split(",") if x.strip()]
+    scenarios = [x.strip() for x in args.scenarios.split(",") if x.strip()]
+    for scenarioName in scenarios:
+        if scenarioName not in scenarioNames:
+            print(
+                "%s is not a scenario, choose from %s" % (scenarioName, scenarioNames)
+            )
+            sys.exit(1)
+    outputFileName = args.outputFileName or os.path.join(
+        benchmarkDir,
+        "results",
+        "benchmark-%s.json" % datetime.now().strftime("%Y%m%d-%H%M%S"),
+    )
+
+    workDir = args.tempDir or tempfile.mkdtemp(prefix="mapper-csv-benchmark-")
+    os.makedirs(workDir, exist_ok=True)
+    writeBenchmarkFiles(workDir)
+
+    benchmarkDoc = {}
+    benchmarkDoc["benchmarkTime"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    benchmarkDoc["gitCommit"] = getGitCommit()
+    benchmarkDoc["python"] = platform.python_version()
+    benchmarkDoc["platform"] = platform.platform()
+    benchmarkDoc["cpuCount"] = os.cpu_count()
+    benchmarkDoc["mapperArgs"] = args.mapperArgs
+    benchmarkDoc["results"] = []
+    try:
+        for rowCount in rowCounts:
+            print("")
+            print("Benchmarking %s rows ..." % rowCount)
+            for scenarioName in scenarios:
+                benchmarkDoc["results"].append(
+                    runScenario(
+                        scenarioName, rowCount, workDir, args.mapperArgs.split()
+                    )
+                )
+    finally:
+        if not args.tempDir:
+            shutil.rmtree(workDir, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(os.path.abspath(outputFileName)), exist_ok=True)
+    with open(outputFileName, "w") as f:
+        json.dump(benchmarkDoc, f, indent=4)
+    print("")
+    print("Results written to %s" % outputFileName)
+
+    if args.priorFileName:
+        compareResults(benchmarkDoc, json.load(open(args.priorFileName, "r")))
+
+    print("")
+    print(
+        "Benchmarks finished in %s minutes"
+        % round((time.time() - procStartTime) / 60, 1)
+    )
+    sys.exit(1 if any("error" in x for x in benchmarkDoc["results"]) else 0)
@@ -0,0 +1,20 @@
+#! /usr/bin/env python3
+import json
+import micro_benchmarks
+
+
+# ----------------------------------------
+def test_micro_benchmarks():
+    """fails when a benchmarked function is slower than micro_baseline.json allows"""
+    # --the template ones are skipped where the template's imports are not installed
+    benchmarks = micro_benchmarks.getBenchmarks()[0]
+    with open(micro_benchmarks.defaultBaselineFile, "r") as f:
+        baselineDoc = json.load(f)
+    tolerance = baselineDoc.get("tolerance", 0.5)
+    regressions = micro_benchmarks.checkBenchmarks(
+        benchmarks, baselineDoc, tolerance, 0.1, 7
+    )
+    assert not regressions, "more than %s%% slower than the baseline: %s" % (
+        round(tolerance * 100),
+        ", ".join(regressions),
+    )
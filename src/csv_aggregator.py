@@ -0,0 +1,328 @@
+#! /usr/bin/env python3
+import os
+import json
+import heapq
+import shutil
+import tempfile
+import zlib
+
+
+# =========================
+class csv_aggregator:
+
+    partitionCount = 64
+
+    # --only set when the input is sorted by key, see sorted_aggregator
+    orderError = None
+
+    # ----------------------------------------
+    def __init__(self, memoryLimitMB=None, tempDir=None):
+        self.memoryLimit = memoryLimitMB * 1048576 if memoryLimitMB else None
+        self.tempDir = tempDir
+        self.spillDir = None
+        self.spillCount = 0
+
+        # --records in first appearance order, each entry is [sequence, owner, record]
+        # --plus an index of the sub-records already merged into each subList
+        self.aggregatedRecords = {}
+        self.memoryUsed = 0
+        self.nextSequence = 0
+
+    # ----------------------------------------
+    def __len__(self):
+        return len(self.aggregatedRecords) + self.spillCount
+
+    # ----------------------------------------
+    def add(self, uniqueKey, jsonData, owner=None):
+        """add a record or merge it into the one with the same key"""
+        if uniqueKey not in self.aggregatedRecords:
+            self.aggregatedRecords[uniqueKey] = [self.nextSequence, owner, jsonData, {}]
+            self.nextSequence += 1
+            self.memoryUsed += self.getRecordSize(uniqueKey, jsonData)
+        else:
+            aggregatedRecord = self.aggregatedRecords[uniqueKey]
+            self.memoryUsed += self.mergeRecord(
+                aggregatedRecord[2], jsonData, aggregatedRecord[3]
+            )
+
+        if self.memoryLimit and self.memoryUsed > self.memoryLimit:
+            self.spill()
+
+    # ----------------------------------------
+    def popClosedRecords(self):
+        """records are only written at the end unless the input is sorted by key"""
+        return []
+
+    # ----------------------------------------
+    def items(self):
+        """the in-memory records as (uniqueKey, owner, record) for handing to another aggregator"""
+        for uniqueKey, aggregatedRecord in self.aggregatedRecords.items():
+            yield uniqueKey, aggregatedRecord[1], aggregatedRecord[2]
+
+    # ----------------------------------------
+    def records(self):
+        """all the aggregated records as (owner, record) in order of first appearance"""
+        if not self.spillCount:
+            for aggregatedRecord in self.aggregatedRecords.values():
+                yield aggregatedRecord[1], aggregatedRecord[2]
+            return
+
+        # --spill what is left so every record is in a partition, then merge each one
+        self.spill()
+        sortedRuns = []
+        for partitionFileName in self.getPartitionFiles(self.spillDir):
+            sortedRuns.extend(self.mergePartition(partitionFileName, 0))
+
+        # --keep the number of files open at once well under the usual limits
+        while len(sortedRuns) > 256:
+            mergedFileName = sortedRuns[0] + ".merged"
+            with open(mergedFileName, "w", encoding="utf-8") as f:
+                for line in self.mergeSortedRuns(sortedRuns[0:256]):
+                    f.write(line)
+            sortedRuns = sortedRuns[256:] + [mergedFileName]
+
+        for line in self.mergeSortedRuns(sortedRuns):
+            sequence, owner, uniqueKey, jsonData = json.loads(line)
+            yield owner, jsonData
+
+    # ----------------------------------------
+    def mergeSortedRuns(self, sortedRuns):
+        """merge files sorted by first appearance into one stream, removing them after"""
+        runHandles = [open(fileName, "r", encoding="utf-8") for fileName in sortedRuns]
+        try:
+            yield from heapq.merge(
+                *runHandles, key=lambda line: int(line[1 : line.find(",")])
+            )
+        finally:
+            for runHandle in runHandles:
+                runHandle.close()
+            for fileName in sortedRuns:
+                os.remove(fileName)
+
+    # ----------------------------------------
+    def close(self):
+        if self.spillDir:
+            shutil.rmtree(self.spillDir, ignore_errors=True)
+            self.spillDir = None
+        self.aggregatedRecords = {}
+
+    # ----------------------------------------
+    def mergeRecord(self, aggregatedRecord, jsonData, subListIndex):
+        """merge a record (or a partial aggregate) into another, returns the bytes added"""
+        addedSize = 0
+
+        # --update root attributes
+        for attribute in jsonData:
+            if type(jsonData[attribute]) != list:
+                # --append missing
+                if attribute not in aggregatedRecord:
+                    aggregatedRecord[attribute] = jsonData[attribute]
+                    addedSize += self.getValueSize(attribute, jsonData[attribute])
+                elif jsonData[attribute] != aggregatedRecord[attribute]:
+                    print(
+                        " %s update ignored ... [%s] vs [%s]"
+                        % (attribute, jsonData[attribute], aggregatedRecord[attribute])
+                    )
+                    # --do not update for now... just not sure how!
+
+        # --aggregate distinct subLists
+        for subList in jsonData:
+            if type(jsonData[subList]) == list:
+                if subList not in aggregatedRecord:
+                    aggregatedRecord[subList] = []
+
+                # --index the sub-records already there the first time the subList is merged
+                if subList not in subListIndex:
+                    subListIndex[subList] = set(
+                        self.getSubRecordKey(subRecord)
+                        for subRecord in aggregatedRecord[subList]
+                    )
+                subRecordKeys = subListIndex[subList]
+                for subRecord in jsonData[subList]:
+                    subRecordKey = self.getSubRecordKey(subRecord)
+                    if subRecordKey not in subRecordKeys:
+                        subRecordKeys.add(subRecordKey)
+                        aggregatedRecord[subList].append(subRecord)
+                        addedSize += self.getValueSize(subList, subRecord)
+        return addedSize
+
+    # ----------------------------------------
+    def getSubRecordKey(self, subRecord):
+        """a hashable key that is equal whenever the sub-records are"""
+        try:
+            if type(subRecord) == dict:
+                return frozenset(subRecord.items())
+            return (hash(subRecord), subRecord)
+        except TypeError:
+            # --nested values from a python module are compared by their sorted json
+            return ("json", json.dumps(subRecord, sort_keys=True))
+
+    # ----------------------------------------
+    def getValueSize(self, attribute, value):
+        """rough size of a value in memory, python objects cost a few times their text"""
+        if type(value) == dict:
+            return 64 + sum(self.getValueSize(k, v) for k, v in value.items())
+        if type(value) == list:
+            return 64 + sum(self.getValueSize(attribute, v) for v in value)
+        return 100 + len(attribute) + len(str(value))
+
+    # ----------------------------------------
+    def getRecordSize(self, uniqueKey, jsonData):
+        return 200 + len(uniqueKey) + self.getValueSize("", jsonData)
+
+    # ----------------------------------------
+    def getPartition(self, uniqueKey, level):
+        return zlib.crc32(("%s|%s" % (level, uniqueKey)).encode("utf-8")) % (
+            self.partitionCount
+        )
+
+    # ----------------------------------------
+    def getPartitionFiles(self, directory):
+        return [
+            os.path.join(directory, "partition-%03d.jsonl" % i)
+            for i in range(self.partitionCount)
+            if os.path.exists(os.path.join(directory, "partition-%03d.jsonl" % i))
+        ]
+
+    # ----------------------------------------
+    def spill(self):
+        """append the in-memory records to hash partitioned files on disk"""
+        if not self.aggregatedRecords:
+            return
+        if not self.spillDir:
+            self.spillDir = tempfile.mkdtemp(prefix="csv_aggregator-", dir=self.tempDir)
+            print(" aggregation memory limit reached, spilling to %s" % self.spillDir)
+
+        partitionLines = [[] for i in range(self.partitionCount)]
+        for uniqueKey, aggregatedRecord in self.aggregatedRecords.items():
+            sequence, owner, jsonData = aggregatedRecord[0:3]
+            partitionLines[self.getPartition(uniqueKey, 0)].append(
+                json.dumps([sequence, owner, uniqueKey, jsonData]) + "\n"
+            )
+        for i in range(self.partitionCount):
+            if partitionLines[i]:
+                with open(
+                    os.path.join(self.spillDir, "partition-%03d.jsonl" % i),
+                    "a",
+                    encoding="utf-8",
+                ) as f:
+                    f.writelines(partitionLines[i])
+
+        self.spillCount += len(self.aggregatedRecords)
+        self.aggregatedRecords = {}
+        self.memoryUsed = 0
+
+    # ----------------------------------------
+    def mergePartition(self, partitionFileName, level):
+        """merge the spilled runs of a partition, returns its files sorted by first appearance"""
+
+        # --a partition too big for the memory limit is split again with a different hash
+        if (
+            self.memoryLimit
+            and os.path.getsize(partitionFileName) * 3 > self.memoryLimit
+            and level < 4
+        ):
+            subDir = partitionFileName + ".split"
+            os.mkdir(subDir)
+            subFiles = [
+                open(
+                    os.path.join(subDir, "partition-%03d.jsonl" % i),
+                    "w",
+                    encoding="utf-8",
+                )
+                for i in range(self.partitionCount)
+            ]
+            with open(partitionFileName, "r", encoding="utf-8") as f:
+                for line in f:
+                    uniqueKey = json.loads(line)[2]
+                    subFiles[self.getPartition(uniqueKey, level + 1)].write(line)
+            for subFile in subFiles:
+                subFile.close()
+            os.remove(partitionFileName)
+            sortedRuns = []
+            for subFileName in self.getPartitionFiles(subDir):
+                if os.path.getsize(subFileName):
+                    sortedRuns.extend(self.mergePartition(subFileName, level + 1))
+            return sortedRuns
+
+        # --runs were appended in order, so merging in file order matches a single pass
+        partitionRecords = {}
+        with open(partitionFileName, "r", encoding="utf-8") as f:
+            for line in f:
+                sequence, owner, uniqueKey, jsonData = json.loads(line)
+                if uniqueKey not in partitionRecords:
+                    partitionRecords[uniqueKey] = [sequence, owner, jsonData, {}]
+                else:
+                    partitionRecord = partitionRecords[uniqueKey]
+                    self.mergeRecord(partitionRecord[2], jsonData, partitionRecord[3])
+        os.remove(partitionFileName)
+
+        sortedFileName = partitionFileName + ".sorted"
+        with open(sortedFileName, "w", encoding="utf-8") as f:
+            for uniqueKey, partitionRecord in sorted(
+                partitionRecords.items(), key=lambda x: x[1][0]
+            ):
+                sequence, owner, jsonData = partitionRecord[0:3]
+                f.write(json.dumps([sequence, owner, uniqueKey, jsonData]) + "\n")
+        return [sortedFileName]
+
+
+# =========================
+class sorted_aggregator(csv_aggregator):
+    """aggregates input sorted by key, where only the current record of each output is open"""
+
+    # ----------------------------------------
+    def __init__(self):
+        super().__init__()
+        self.openRecords = {}
+        self.closedRecords = []
+        self.orderError = None
+
+    # ----------------------------------------
+    def __len__(self):
+        return len(self.openRecords) + len(self.closedRecords)
+
+    # ----------------------------------------
+    def add(self, uniqueKey, jsonData, owner=None):
+        """merge into the open record while the key stays the same, close it when it changes"""
+        openRecord = self.openRecords.get(owner)
+        if openRecord and openRecord[0] == uniqueKey:
+            self.mergeRecord(openRecord[2], jsonData, openRecord[3])
+            return
+
+        sortValue = jsonData.get("ENTITY_KEY", jsonData.get("RECORD_ID", ""))
+        if openRecord:
+            if self.isOutOfOrder(openRecord[1], sortValue) and not self.orderError:
+                self.orderError = "key %s came after %s, the input is not sorted" % (
+                    sortValue,
+                    openRecord[1],
+                )
+            self.closedRecords.append((openRecord[0], owner, openRecord[2]))
+        self.openRecords[owner] = [uniqueKey, sortValue, jsonData, {}]
+
+    # ----------------------------------------
+    def isOutOfOrder(self, priorValue, sortValue):
+        """keys must ascend as text, the way sort puts them, so 10 comes before 9"""
+        return str(sortValue) < str(priorValue)
+
+    # ----------------------------------------
+    def popClosedRecords(self):
+        """the records whose key has changed as (uniqueKey, owner, record), ready to write"""
+        closedRecords = self.closedRecords
+        self.closedRecords = []
+        return closedRecords
+
+    # ----------------------------------------
+    def items(self):
+        """the open records as (uniqueKey, owner, record) for handing to another aggregator"""
+        for owner, openRecord in self.openRecords.items():
+            yield openRecord[0], owner, openRecord[2]
+
+    # ----------------------------------------
+    def records(self):
+        """the records still to write as (owner, record), the closed ones then the open ones"""
+        for uniqueKey, owner, jsonData in self.popClosedRecords():
+            yield owner, jsonData
+        for uniqueKey, owner, jsonData in self.items():
+            yield owner, jsonData
+        self.openRecords = {}
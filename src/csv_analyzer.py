@@ -9,6 +9,17 @@ from datetime import datetime, timedelta
 import json
 import csv
 import glob
+import shutil
+import tempfile
+import random
+import csv_reader
+import csv_index
+import csv_sample
+import csv_state
+import csv_statistics
+import csv_unique
+from csv_run_report import csv_run_report
+from csv_profiler import csv_profiler
 
 
 # ----------------------------------------
@@ -28,102 +39,24 @@ def signal_handler(signal, frame):
     global shutDown
     print("USER INTERRUPT! Shutting down ... (please wait)")
     shutDown = True
+    csv_statistics.shutDown = True
     return
 
 
 # ----------------------------------------
-def getNextRow(fileInfo):
-    errCnt = 0
-    csv_data = None
-    while not csv_data:
-
-        # --quit for consecutive errors
-        if errCnt >= 10:
-            fileInfo["ERROR"] = "YES"
-            print()
-            print("Shutdown due to too many errors")
-            break
-
-        try:
-            line = next(fileInfo["reader"])
-        except StopIteration:
-            break
-        except:
-            print(" row %s: %s" % (fileInfo["rowCnt"], sys.exc_info()[0]))
-            fileInfo["skipCnt"] += 1
-            errCnt += 1
-            continue
-        fileInfo["rowCnt"] += 1
-        if line:  # --skip empty lines
-
-            if fileInfo["fieldDelimiter"] == "JSON":
-                csv_data = json.loads(line)
-                for attr in csv_data:
-                    if (
-                        type(csv_data[attr]) not in (list, dict)
-                        and attr not in fileInfo["header"]
-                    ):
-                        fileInfo["header"].append(attr)
-
-                return fileInfo, csv_data
-
-            # --csv reader will return a list (mult-char delimiter must be manually split)
-            if type(line) == list:
-                row = line
-            else:
-                row = [
-                    removeQuoteChar(x.strip())
-                    for x in line.split(fileInfo["fieldDelimiter"])
-                ]
-
-            # --turn into a dictionary if there is a header
-            if "header" in fileInfo:
-
-                # --column mismatch
-                if len(row) != len(fileInfo["header"]):
-                    print(
-                        " row %s has %s columns, expected %s"
-                        % (fileInfo["rowCnt"], len(row), len(fileInfo["header"]))
-                    )
-                    fileInfo["skipCnt"] += 1
-                    errCnt += 1
-                    continue
-
-                # --is it the header row
-                elif (
-                    str(row[0]).upper() == fileInfo["header"][0].upper()
-                    and str(row[len(row) - 1]).upper()
-                    == fileInfo["header"][len(fileInfo["header"]) - 1].upper()
-                ):
-                    fileInfo["skipCnt"] += 1
-                    if fileInfo["rowCnt"] != 1:
-                        print(" row %s contains the header" % fileInfo["rowCnt"])
-                        errCnt += 1
-                    continue
-
-                # --return a good row
-                else:
-                    csv_data = dict(
-                        zip(fileInfo["header"], [str(x).strip() for x in row])
-                    )
-
-            else:  # --if not just return what should be the header row
-                fileInfo["skipCnt"] += 1
-                csv_data = [str(x).strip() for x in row]
-
-        else:
-            print(" row %s is blank" % fileInfo["rowCnt"])
-            fileInfo["skipCnt"] += 1
-            continue
-
-    return fileInfo, csv_data
-
-
-# ----------------------------------------
-def removeQuoteChar(s):
-    if len(s) > 2 and s[0] + s[-1] in ("''", '""'):
-        return s[1:-1]
-    return s
+def getColumnPercents(statPack, sketchPack, totalRowCnt, columnHeaders):
+    """the percent populated and unique of each column so far"""
+    columnPercents = {}
+    for columnName in columnHeaders:
+        recordCount = totalRowCnt - statPack[columnName]["null"]
+        uniqueCount = len(statPack[columnName]) - 1
+        if columnName in sketchPack:
+            uniqueCount = min(sketchPack[columnName].getUniqueCount(), recordCount)
+        columnPercents[columnName] = (
+            recordCount / totalRowCnt * 100,
+            uniqueCount / recordCount * 100 if recordCount else 0,
+        )
+    return columnPercents
 
 
 # ----------------------------------------
@@ -131,6 +64,7 @@ def analyzeFile():
     """analyze a csv file"""
     global shutDown
     statPack = {}
+    sketchPack = {}
     totalRowCnt = 0
 
     # --get parameters from a mapping file
@@ -153,6 +87,33 @@ def analyzeFile():
     if "columnHeaders" not in mappingDoc["input"]:
         mappingDoc["input"]["columnHeaders"] = []
 
+    # --a fixed width layout names the columns, there is no header row or delimiter,
+    # --it is read from a list of the columns or the input section of a mapping file
+    if fixedWidthFile:
+        try:
+            layoutDoc = json.load(open(fixedWidthFile, "r"))
+        except (IOError, ValueError) as err:
+            print("")
+            print("layout file error: %s in %s" % (err, fixedWidthFile))
+            return 1
+        if type(layoutDoc) == dict:
+            layoutDoc = layoutDoc.get("input", {}).get("fixedWidth")
+        mappingDoc["input"]["fixedWidth"] = layoutDoc
+    if "fixedWidth" in mappingDoc["input"]:
+        errorList = csv_reader.checkFixedWidth(mappingDoc["input"]["fixedWidth"])
+        if errorList:
+            print("")
+            for errorMessage in errorList:
+                print(
+                    "layout file error: %s in %s"
+                    % (errorMessage, fixedWidthFile or mappingFileName)
+                )
+            return 1
+        mappingDoc["input"]["fieldDelimiter"] = "FIXED"
+        mappingDoc["input"]["columnHeaders"] = [
+            columnDict["column"] for columnDict in mappingDoc["input"]["fixedWidth"]
+        ]
+
     # --get the input file
     if not mappingDoc["input"]["inputFileName"]:
         print("")
@@ -163,90 +124,205 @@ def analyzeFile():
         print("")
         print("%s not found" % inputFileName)
         return 1
+    if (firstRow or lastRow) and len(fileList) > 1:
+        print("")
+        print("--firstRow and --lastRow can only be used with a single input file")
+        return 1
+
+    # --a sample is so many rows or a percent of each file, taken the way asked
+    sampleRows = samplePercent = None
+    if sampleSize:
+        sampleRows, samplePercent, errorMessage = csv_sample.getSampleSize(sampleSize)
+        if errorMessage:
+            print("")
+            print(errorMessage)
+            return 1
+    errorMessage = csv_sample.checkSampleMethod(
+        sampleMethod, sampleRows, samplePercent, sampleTolerance
+    )
+    if errorMessage:
+        print("")
+        print(errorMessage)
+        return 1
+    sampleRng = random.Random(sampleSeed)
+    sampleConvergence = None
+    if sampleTolerance:
+        sampleConvergence = csv_sample.sample_convergence(sampleTolerance)
+
+    stageTimes = dict.fromkeys(["read", "analyze", "export"], 0.0)
+    runReport = csv_run_report("csv_analyzer", reportFileName, fileList, stageTimes)
+
+    # --with a state file the statistics saved for the files that have not changed since
+    # --are used again, so only new or changed files are read
+    stateDoc = None
+    fileResults = {}
+    fileStats = {}
+    allFiles = fileList
+    if stateFileName:
+        if sampleMethod or sampleConvergence or firstRow or lastRow or keyColumns:
+            print("")
+            print(
+                "--state cannot be used with --sample, --sampleTolerance, --firstRow, --lastRow or --keyColumns"
+            )
+            return 1
+        stateDoc = csv_state.loadState(stateFileName, mappingDoc["input"], sketchSize)
+        for fileName in allFiles:
+            fileResult = csv_state.getFileResult(stateDoc, fileName)
+            if fileResult:
+                fileResults[fileName] = fileResult
+                runReport.skipInput(os.path.getsize(fileName))
+            else:
+                fileStats[fileName] = csv_state.getFileStat(fileName)
+        fileList = [x for x in allFiles if x not in fileResults]
+        print("")
+        print(
+            "%s files unchanged since the state was saved, %s to analyze"
+            % (len(fileResults), len(fileList))
+        )
 
     # --need a test record for python module
     testRecord = None
 
+    # --the key columns have to be in the header before any rows are read, json lines
+    # --have no header so their columns are only known as they are found
+    keyList = csv_unique.getKeyList(keyColumns or "")
+    if keyList and fileList:
+        currentFile = csv_statistics.openInputFile(fileList[0], mappingDoc)
+        currentFile["handle"].close()
+        if currentFile["csvDialect"] != "json":
+            for keyName in keyList:
+                for columnName in keyName:
+                    if columnName not in mappingDoc["input"]["columnHeaders"]:
+                        print("")
+                        print(
+                            "key column %s not found in %s" % (columnName, fileList[0])
+                        )
+                        return 1
+
+    # --key columns are checked exactly for repeats with their values spilled to disk, with
+    # --sketches every column that is unique in the first 10,000 rows is checked as well,
+    # --but not with a state file as the values of the files not read again are not kept
+    keyCheckers = {}
+    keySpillDir = None
+    if (keyColumns or sketchSize) and stateDoc is None:
+        try:
+            keySpillDir = tempfile.mkdtemp(prefix="csv_analyzer-", dir=tempDir)
+        except OSError as err:
+            print("")
+            print("Could not create a temporary directory in %s \n%s" % (tempDir, err))
+            return 1
+        csv_statistics.addKeyCheckers(keyCheckers, keyList, keySpillDir)
+    keysChosen = not (sketchSize and keySpillDir)
+
+    # --hand the files off to worker processes, a sample is taken a file at a time
+    if workerCount > 1 and (sampleMethod or sampleConvergence):
+        print("")
+        print("a sample is read a file at a time, analyzing in one process")
+    elif workerCount > 1 and fileList:
+        parallelResult = csv_statistics.analyzeFilesParallel(
+            fileList,
+            mappingDoc,
+            statPack,
+            sketchPack,
+            keyCheckers,
+            spillDir=keySpillDir,
+            stageTimes=stageTimes,
+            runReport=runReport,
+            workerCount=workerCount,
+            fileResults=fileResults if stateDoc else None,
+            firstRow=firstRow,
+            lastRow=lastRow,
+            profiler=profiler,
+        )
+        if not parallelResult:
+            if keySpillDir:
+                shutil.rmtree(keySpillDir, ignore_errors=True)
+            return 1
+        totalRowCnt, testRecord = parallelResult
+        fileList = []
+
     # --for each input file
     for fileName in fileList:
         print("")
         print("Analyzing %s ..." % fileName)
-        currentFile = {}
-        currentFile["name"] = fileName
-        currentFile["rowCnt"] = 0
-        currentFile["skipCnt"] = 0
-
-        # --open the file
-        if mappingDoc["input"]["fileEncoding"]:
-            currentFile["fileEncoding"] = mappingDoc["input"]["fileEncoding"]
-            currentFile["handle"] = open(
-                fileName, "r", encoding=mappingDoc["input"]["fileEncoding"]
-            )
-        else:
-            currentFile["handle"] = open(fileName, "r")
+        currentFile = csv_statistics.openInputFile(fileName, mappingDoc)
 
-        # --set the dialect
-        currentFile["fieldDelimiter"] = mappingDoc["input"]["fieldDelimiter"]
-        if not mappingDoc["input"]["fieldDelimiter"]:
-            sniffer = csv.Sniffer().sniff(
-                currentFile["handle"].readline(), delimiters="|,\t"
-            )
-            currentFile["handle"].seek(0)
-            currentFile["fieldDelimiter"] = sniffer.delimiter
-            mappingDoc["input"]["fieldDelimiter"] = sniffer.delimiter
-
-        if mappingDoc["input"]["fieldDelimiter"].lower() in ("csv", "comma", ","):
-            currentFile["csvDialect"] = "excel"
-        elif mappingDoc["input"]["fieldDelimiter"].lower() in ("tab", "tsv", "\t"):
-            currentFile["csvDialect"] = "excel-tab"
-        elif mappingDoc["input"]["fieldDelimiter"].lower() in ("pipe", "|"):
-            csv.register_dialect("pipe", delimiter="|", quotechar='"')
-            currentFile["csvDialect"] = "pipe"
-        elif len(mappingDoc["input"]["fieldDelimiter"]) == 1:
-            csv.register_dialect("other", delimiter=delimiter, quotechar='"')
-            currentFile["csvDialect"] = "other"
-        elif len(mappingDoc["input"]["fieldDelimiter"]) > 1:
-            currentFile["csvDialect"] = "multi"
-        else:
-            currentFile["csvDialect"] = "excel"
-
-        mappingDoc["input"]["csvDialect"] = currentFile["csvDialect"]
-
-        # --set the reader (csv cannot be used for multi-char delimiters)
-        if currentFile["csvDialect"] != "multi":
-            currentFile["reader"] = csv.reader(
-                currentFile["handle"], dialect=currentFile["csvDialect"]
-            )
-        else:
-            currentFile["reader"] = currentFile["handle"]
-
-        # --get the current file header row and use it if not one already
-        currentFile, currentHeaders = getNextRow(currentFile)
-        if not mappingDoc["input"]["columnHeaders"]:
-            mappingDoc["input"]["columnHeaders"] = [
-                str(x).replace(" ", "_") for x in currentHeaders
-            ]
-        currentFile["header"] = mappingDoc["input"]["columnHeaders"]
+        # --with a state file each file is counted on its own so it can be replaced on its own
+        if stateDoc:
+            statPack, sketchPack, testRecord = {}, {}, None
+            fileStartCnt = totalRowCnt
 
         # --initialize the statpack first time through
-        if not statPack:
-            colNum = 0
-            errCnt = 0
-            for columnName in mappingDoc["input"]["columnHeaders"]:
-                colNum += 1
-                if not columnName:
-                    print(" column %s header is blank!" % colNum)
-                    errCnt += 1
-                if columnName not in statPack:
-                    statPack[columnName] = {"null": 0}
-            if errCnt:
-                print()
-                print("Row 1 does not contain a valid column header!")
-                currentFile["handle"].close
+        if not statPack and csv_statistics.initStatPack(
+            statPack, mappingDoc["input"]["columnHeaders"]
+        ):
+            currentFile["handle"].close()
+            return 1
+
+        # --just the rows asked for are read, found with the file's row index
+        fileStart = 0
+        fileEnd = os.path.getsize(fileName)
+        rangeRowCnt = 0
+        if firstRow or lastRow:
+            if not csv_index.openRowRange(currentFile, firstRow, lastRow):
+                print("")
+                print("Could not find the rows asked for in %s" % fileName)
+                currentFile["handle"].close()
+                return 1
+            fileStart = currentFile["rangeStart"]
+            fileEnd = currentFile["rangeEnd"]
+
+            # --the rows are numbered from the start of the file, but just the range is reported
+            rangeRowCnt = currentFile["rowCnt"]
+            runReport.skipInput(os.path.getsize(fileName) - (fileEnd - fileStart))
+
+        # --or just a sample of them, seeking to random spots needs a file that can be mapped
+        if sampleMethod == "seek":
+            if not csv_reader.canMapFile(fileName, currentFile.get("fileEncoding")):
+                print("")
+                print(
+                    "%s cannot be sampled by seeking, only uncompressed files that are not utf-16 or utf-32 can"
+                    % fileName
+                )
+                currentFile["handle"].close()
                 return 1
+            sampleStart = fileStart
+            if not (firstRow or lastRow):
+                sampleStart = csv_sample.getDataStart(
+                    fileName, currentFile["csvDialect"], currentFile["fieldDelimiter"]
+                )
+            currentFile["handle"].close()
+            currentFile["handle"] = csv_sample.seek_sampler(
+                currentFile,
+                sampleStart,
+                fileEnd,
+                sampleRows=sampleRows,
+                samplePercent=samplePercent,
+                rng=sampleRng,
+            )
+            currentFile["rawHandle"] = currentFile["handle"]
+            currentFile["reader"] = iter(currentFile["handle"])
+        elif sampleMethod:
+            if sampleMethod == "reservoir":
+                print(" sampling %s rows from all of them ..." % sampleRows)
+            currentFile["reader"] = csv_sample.getSampleReader(
+                currentFile,
+                fileEnd,
+                sampleMethod=sampleMethod,
+                sampleRows=sampleRows,
+                samplePercent=samplePercent,
+                rng=sampleRng,
+            )
+        if sampleConvergence:
+            sampleConvergence.restart()
 
         # --process the rows in the input file
-        currentFile, rowData = getNextRow(currentFile)
+        if profiler:
+            profiler.nextRow()
+        startTime = time.perf_counter()
+        currentFile, rowData = csv_statistics.getNextRow(currentFile)
+        stageTime = time.perf_counter()
+        stageTimes["read"] += stageTime - startTime
         while rowData:
             totalRowCnt += 1
 
@@ -257,34 +333,38 @@ def analyzeFile():
                 rowData = pythonMapperClass.process(rowData)
                 print(rowData)
 
-            # --for each column
-            for columnName in currentFile["header"]:
-
-                if columnName not in rowData:  # --may not be if json
-                    statPack[columnName]["null"] += 1
-                    continue
-                if columnName not in statPack:  # --may not be if json
-                    statPack[columnName] = {"null": 0}
-                if columnName not in mappingDoc["input"]["columnHeaders"]:
-                    mappingDoc["input"]["columnHeaders"].append(
-                        columnName
-                    )  # --may not be if json
-
-                columnValue = str(rowData[columnName]).strip()
-                if not columnValue or columnValue.strip().upper() in (
-                    "NONE",
-                    "NULL",
-                    "\\N",
-                ):
-                    statPack[columnName]["null"] += 1
-                    continue
-
-                if columnValue in statPack[columnName]:
-                    statPack[columnName][columnValue] += 1
-                else:
-                    statPack[columnName][columnValue] = 1
+            csv_statistics.analyzeRow(
+                rowData, currentFile["header"], statPack, mappingDoc
+            )
+            for keyChecker in keyCheckers.values():
+                keyChecker.add(rowData)
+
+            # --with sketches no column holds more than the sketch size plus the
+            # --distinct values of the last 10,000 rows
+            if sketchSize and totalRowCnt % 10000 == 0:
+                if not keysChosen:
+                    csv_statistics.addUniqueColumns(
+                        keyCheckers, statPack, totalRowCnt, keySpillDir
+                    )
+                    keysChosen = True
+                csv_statistics.sketchStatPack(statPack, sketchPack)
+
+            # --stop once another 10,000 rows would not change the statistics much
+            if sampleConvergence and totalRowCnt % 10000 == 0:
+                columnPercents = getColumnPercents(
+                    statPack, sketchPack, totalRowCnt, currentFile["header"]
+                )
+                if sampleConvergence.isConverged(columnPercents):
+                    print(" statistics settled at %s rows" % totalRowCnt)
+                    break
 
-            currentFile, rowData = getNextRow(currentFile)
+            startTime = time.perf_counter()
+            stageTimes["analyze"] += startTime - stageTime
+            if profiler:
+                profiler.nextRow()
+            currentFile, rowData = csv_statistics.getNextRow(currentFile)
+            stageTime = time.perf_counter()
+            stageTimes["read"] += stageTime - startTime
 
             # --break conditions
             if shutDown:
@@ -292,16 +372,92 @@ def analyzeFile():
             elif "ERROR" in currentFile:
                 break
 
-            if currentFile["rowCnt"] % 10000 == 0:
-                print(" %s records processed" % currentFile["rowCnt"])
-
+            if (currentFile["rowCnt"] - rangeRowCnt) % 10000 == 0:
+                runReport.setPosition(currentFile["rawHandle"].tell() - fileStart)
+                runReport.update(totalRowCnt, 0)
+                print(
+                    " %s records processed%s"
+                    % (currentFile["rowCnt"] - rangeRowCnt, runReport.getProgress())
+                )
+
+        if profiler:
+            profiler.stop()
+        readBytes = min(
+            currentFile["rawHandle"].tell() - fileStart, fileEnd - fileStart
+        )
+        runReport.setPosition(readBytes)
+        runReport.update(totalRowCnt, 0)
         currentFile["handle"].close()
         if shutDown:
             break
+        elif sampleMethod or sampleConvergence:
+            runReport.skipInput(fileEnd - fileStart - readBytes)
+            runReport.finishInput(readBytes)
+            print(
+                " %s records sampled, complete!" % (currentFile["rowCnt"] - rangeRowCnt)
+            )
         else:
-            print(" %s records processed, complete!" % currentFile["rowCnt"])
+            runReport.finishInput(fileEnd - fileStart)
+            print(
+                " %s records processed, complete!"
+                % (currentFile["rowCnt"] - rangeRowCnt)
+            )
+
+        if stateDoc:
+            if sketchSize:
+                csv_statistics.sketchStatPack(statPack, sketchPack)
+            fileResult = csv_statistics.newFileResult()
+            fileResult["analyzedCnt"] = totalRowCnt - fileStartCnt
+            fileResult["header"] = list(statPack)
+            fileResult["statPack"] = statPack
+            fileResult["sketchPack"] = sketchPack
+            fileResult["testRecord"] = testRecord
+            fileResults[fileName] = fileResult
+
+    # --the totals are each file's statistics added up in order, which are saved for next time
+    if stateDoc:
+        statPack, sketchPack = {}, {}
+        mappingDoc["input"]["columnHeaders"] = []
+        totalRowCnt, testRecord = csv_statistics.mergeFileResults(
+            allFiles, fileResults, mappingDoc, statPack, sketchPack
+        )
+        try:
+            csv_state.writeState(
+                stateFileName, stateDoc, mappingDoc["input"], fileResults, fileStats
+            )
+        except IOError as err:
+            print("")
+            print("Could not write the state file %s \n%s" % (stateFileName, err))
+        else:
+            print("")
+            print("State written to %s" % stateFileName)
 
     # --export the analysis
+    startTime = time.perf_counter()
+    if sketchSize:
+        if not keysChosen:
+            csv_statistics.addUniqueColumns(
+                keyCheckers, statPack, totalRowCnt, keySpillDir
+            )
+        csv_statistics.sketchStatPack(statPack, sketchPack)
+
+    # --the keys not ruled out along the way are read back from disk to be sure
+    keyResults = {}
+    if keyCheckers:
+        print("")
+        print("Checking key columns ...")
+        for keyName, keyChecker in keyCheckers.items():
+            keyResults[keyName] = keyChecker.confirm()
+            print(" %s: %s" % (keyName, keyChecker.getStatus()))
+        shutil.rmtree(keySpillDir, ignore_errors=True)
+
+        # --the sketched columns found unique have exact counts, their estimate is not used
+        checkedColumns = [x for x in keyResults if keyResults[x] and x in sketchPack]
+        if checkedColumns:
+            print(
+                " every value was checked, so the unique count is exact for %s"
+                % ", ".join(checkedColumns)
+            )
     if outputFileName:
         try:
             outputFileHandle = open(outputFileName, "w", newline="")
@@ -316,6 +472,8 @@ def analyzeFile():
     bestRecordID = "<remove-or-supply>"
     possibleMappings = []
     columnHeaders = "columnName,recordCount,percentPopulated,uniqueCount,uniquePercent,topValue1,topValue2,topValue3,topValue4,topValue5"
+    if sketchSize:
+        columnHeaders += ",uniqueErrorPercent,topCountError"
     if outputFileName:
         outputFileWriter.writerow(columnHeaders.split(","))
     else:
@@ -325,10 +483,33 @@ def analyzeFile():
         recordCount = totalRowCnt - statPack[columnName]["null"]
         percentPopulated = round(recordCount / totalRowCnt * 100, 2)
         uniqueCount = len(statPack[columnName]) - 1
+        isUnique = uniqueCount == totalRowCnt
+
+        # --a sketched column's unique count is an estimate and its top counts may be low,
+        # --19 times out of 20 the estimate is within uniqueError percent, whether it is
+        # --unique was checked exactly if it was unique in the first 10,000 rows, except
+        # --with a state file when only the estimate is known
+        uniqueError = 0
+        topCountError = 0
+        if columnName in sketchPack:
+            uniqueCount = min(sketchPack[columnName].getUniqueCount(), recordCount)
+            uniqueError = sketchPack[columnName].getUniqueError()
+            topCountError = sketchPack[columnName].maxUndercount
+            if keySpillDir:
+                isUnique = keyResults.get(columnName, False)
+            else:
+                isUnique = totalRowCnt - uniqueCount <= totalRowCnt * uniqueError / 100
+
+            # --a column the key check found unique has every value once, so its counts are
+            # --exact rather than estimated, no value is frequent enough to be a top one
+            if keyResults.get(columnName):
+                uniqueCount = recordCount
+                uniqueError = 0
+                topCountError = 0
         uniquePercent = round(uniqueCount / recordCount * 100, 2) if recordCount else 0
 
         # --first 100% unique field is recordID
-        if uniqueCount == totalRowCnt and not bestRecordID.startswith("%"):
+        if isUnique and not bestRecordID.startswith("%"):
             bestRecordID = columnName
 
         topValue = []
@@ -354,6 +535,9 @@ def analyzeFile():
             columnMapping["statistics"]["top5values"] = [
                 item for item in topValue if item
             ]
+            if columnName in sketchPack:
+                columnMapping["statistics"]["uniqueError%"] = uniqueError
+                columnMapping["statistics"]["topCountError"] = topCountError
             possibleMappings.append(columnMapping)
 
         rowData = (
@@ -368,15 +552,41 @@ def analyzeFile():
             topValue[3],
             topValue[4],
         )
+        if sketchSize:
+            rowData += (uniqueError, topCountError)
         if outputFileName:
             outputFileWriter.writerow(rowData)
+        elif sketchSize:
+            print(
+                '"%s", %s, %s, %s, %s, "%s", "%s", "%s", "%s", "%s", %s, %s' % rowData
+            )
         else:
             print('"%s", %s, %s, %s, %s, "%s", "%s", "%s", "%s", "%s"' % rowData)
 
+    # --with no single column unique the first unique set of key columns is the recordID
+    bestRecordColumns = []
+    if not bestRecordID.startswith("<"):
+        bestRecordColumns = [bestRecordID]
+    else:
+        for keyName, keyChecker in keyCheckers.items():
+            if keyResults[keyName] and len(keyChecker.keyColumns) > 1:
+                bestRecordColumns = keyChecker.keyColumns
+                break
+
     # --close the output file
     if outputFileName:
         outputFileHandle.close()
         print("\nStatistics written to %s" % outputFileName)
+    stageTimes["export"] += time.perf_counter() - startTime
+
+    if reportFileName:
+        try:
+            runReport.write("complete" if not shutDown else "aborted")
+        except IOError as err:
+            print()
+            print("Could not write the run report %s" % reportFileName)
+        else:
+            print("\nRun report written to %s" % reportFileName)
 
     # --create or update the mapping file if provided
     if mappingFileName:
@@ -392,6 +602,10 @@ def analyzeFile():
             outputDoc["data_source"] = "<supply>"
             outputDoc["record_type"] = "GENERIC"
             outputDoc["record_id"] = "<remove_or_supply>"
+            if bestRecordColumns:
+                outputDoc["record_id"] = "|".join(
+                    "%(" + x + ")s" for x in bestRecordColumns
+                )
             outputDoc["attributes"] = possibleMappings
             mappingDoc["outputs"].append(outputDoc)
         try:
@@ -448,10 +662,13 @@ def analyzeFile():
                         )
                     )
 
-                elif line.strip() == "json_data['RECORD_ID'] = '<supply>'":
-                    if not bestRecordID.startswith("<"):
+                elif line.strip() == 'json_data["RECORD_ID"] = "<remove_or_supply>"':
+                    if bestRecordColumns:
                         line = line.replace(
-                            "'<supply>'", "raw_data['%s']" % bestRecordID
+                            '"<remove_or_supply>"',
+                            " + '|' + ".join(
+                                "raw_data['%s']" % x for x in bestRecordColumns
+                            ),
                         )
                     codeLines.append(line)
 
@@ -558,6 +775,116 @@ if __name__ == "__main__":
         dest="pythonModuleFile",
         help="optional name of a python module file to generate",
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        dest="workerCount",
+        type=int,
+        default=1,
+        help="number of worker processes to analyze the input files with, defaults to 1",
+    )
+    parser.add_argument(
+        "--fixedWidth",
+        dest="fixedWidthFile",
+        help="a json file with the fixed width layout of the input, either a list of its columns or a mapping file with one in its input section",
+    )
+    parser.add_argument(
+        "--sketch",
+        dest="sketch",
+        action="store_true",
+        default=False,
+        help="estimate the unique counts and top values of columns with too many values to count exactly, bounding the memory used",
+    )
+    parser.add_argument(
+        "--sketchSize",
+        dest="sketchSize",
+        type=int,
+        default=10000,
+        help="with --sketch, the most distinct values to count exactly per column, default is 10000",
+    )
+    parser.add_argument(
+        "--sample",
+        dest="sampleSize",
+        help="analyze just a sample of each file, either a number of rows or a percent such as 5%%",
+    )
+    parser.add_argument(
+        "--sampleMethod",
+        dest="sampleMethod",
+        choices=csv_sample.sampleMethods,
+        help="first takes the start of the file and is the default, random keeps each row by chance and needs a percent, reservoir evenly samples a number of rows from all of them and seek reads from random spots through an uncompressed file",
+    )
+    parser.add_argument(
+        "--sampleTolerance",
+        dest="sampleTolerance",
+        type=float,
+        help="stop reading a file once no column's percent populated or unique has moved more than this many points in the last 20,000 rows",
+    )
+    parser.add_argument(
+        "--sampleSeed",
+        dest="sampleSeed",
+        type=int,
+        help="seed the random sampling so it picks the same rows each run",
+    )
+    parser.add_argument(
+        "--keyColumns",
+        dest="keyColumns",
+        help="columns to check exactly for a different value in every row, such as id,first_name+last_name where columns joined by + are checked together",
+    )
+    parser.add_argument(
+        "--tempDir",
+        dest="tempDir",
+        help="where to spill key column values while checking them, default is the system temp directory",
+    )
+    parser.add_argument(
+        "--state",
+        dest="stateFileName",
+        help="optional file to save each input file's statistics to, the next run with it only reads the files that are new or have changed since",
+    )
+    parser.add_argument(
+        "--decompressThread",
+        dest="decompressThread",
+        action="store_true",
+        default=False,
+        help="decompress compressed input in a separate thread",
+    )
+    parser.add_argument(
+        "--memoryMap",
+        dest="memoryMap",
+        action="store_true",
+        default=False,
+        help="read uncompressed input through a memory map",
+    )
+    parser.add_argument(
+        "--firstRow",
+        dest="firstRow",
+        type=int,
+        help="start at this row after the header, found with the file's row index which is built if need be",
+    )
+    parser.add_argument(
+        "--lastRow",
+        dest="lastRow",
+        type=int,
+        help="stop after this row, found with the file's row index which is built if need be",
+    )
+    parser.add_argument(
+        "--profile",
+        dest="profileFileName",
+        help="optional file to write a pstats profile of the analysis to, with a -summary.txt beside it",
+    )
+    parser.add_argument(
+        "--profileSample",
+        dest="profileSample",
+        type=int,
+        default=1,
+        help="profile only 1 in this many rows to keep the overhead down, default is every row",
+    )
+    parser.add_argument(
+        "--profileTop",
+        dest="profileTop",
+        type=int,
+        default=25,
+        help="the number of functions to list in the profile summary, default is 25",
+    )
     args = parser.parse_args()
     inputFileName = args.inputFileName
     fieldDelimiter = args.fieldDelimiter
@@ -565,6 +892,29 @@ if __name__ == "__main__":
     outputFileName = args.outputFileName
     mappingFileName = args.mappingFileName
     pythonModuleFile = args.pythonModuleFile
+    workerCount = args.workerCount
+    fixedWidthFile = args.fixedWidthFile
+    sketchSize = max(args.sketchSize, 10) if args.sketch else None
+    csv_statistics.setOptions(
+        {
+            "sketchSize": sketchSize,
+            "memoryMap": args.memoryMap,
+            "decompressThread": args.decompressThread,
+        }
+    )
+    sampleSize = args.sampleSize
+    sampleMethod = args.sampleMethod or ("first" if sampleSize else None)
+    sampleTolerance = args.sampleTolerance
+    sampleSeed = args.sampleSeed
+    keyColumns = args.keyColumns
+    tempDir = args.tempDir
+    stateFileName = args.stateFileName
+    firstRow = args.firstRow
+    lastRow = args.lastRow
+    profileFileName = args.profileFileName
+    reportFileName = (
+        os.path.splitext(outputFileName)[0] + "-report.json" if outputFileName else None
+    )
 
     if not inputFileName:
         print("\nAn input file name is required\n")
@@ -596,8 +946,27 @@ if __name__ == "__main__":
             print(f"\nCannot find {templateFile}\n")
             sys.exit(1)
 
+    profiler = None
+    if profileFileName:
+        profiler = csv_profiler(profileFileName, args.profileSample, args.profileTop)
+
     result = analyzeFile()
 
+    if profiler:
+        print("")
+        try:
+            summaryFileName = profiler.write()
+        except IOError as err:
+            print("Could not write profile %s \n%s" % (profileFileName, err))
+        else:
+            if summaryFileName:
+                print(
+                    "Profile written to %s, summary in %s"
+                    % (profileFileName, summaryFileName)
+                )
+            else:
+                print("No rows were profiled")
+
     print("")
     if result != 0:
         print("process aborted!")
@@ -0,0 +1,201 @@
+#! /usr/bin/env python3
+import os
+import io
+import gzip
+import bz2
+import lzma
+import queue
+import threading
+
+try:
+    import zstandard
+except:
+    zstandard = None
+
+compressionExtensions = {
+    ".gz": "gzip",
+    ".gzip": "gzip",
+    ".bz2": "bz2",
+    ".xz": "xz",
+    ".lzma": "xz",
+    ".zst": "zstd",
+    ".zstd": "zstd",
+}
+compressionMagic = [
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+]
+defaultLevels = {"gzip": 6, "bz2": 9, "xz": 6, "zstd": 3}
+
+
+# ----------------------------------------
+def getCompression(fileName, checkContents=True):
+    """returns gzip, bz2, xz, zstd or None from the file's magic bytes or extension"""
+    if checkContents and os.path.isfile(fileName):
+        with open(fileName, "rb") as f:
+            fileStart = f.read(6)
+        for magicBytes, compression in compressionMagic:
+            if fileStart.startswith(magicBytes):
+                return compression
+    return compressionExtensions.get(os.path.splitext(fileName)[1].lower())
+
+
+# ----------------------------------------
+def openBinary(fileName, compression, mode, compressionLevel=None, rawHandle=None):
+    """open a compressed file as a binary stream for reading or writing"""
+    if compression == "zstd" and not zstandard:
+        raise IOError(
+            "zstandard must be installed for %s, pip install zstandard" % fileName
+        )
+
+    if mode == "rb":
+        rawHandle = rawHandle or open(fileName, "rb")
+        if compression == "gzip":
+            binaryHandle = gzip.GzipFile(fileobj=rawHandle, mode="rb")
+        elif compression == "bz2":
+            binaryHandle = bz2.BZ2File(rawHandle, "rb")
+        elif compression == "xz":
+            binaryHandle = lzma.LZMAFile(rawHandle, "rb")
+        else:
+            binaryHandle = zstandard.ZstdDecompressor().stream_reader(
+                rawHandle, read_across_frames=True, closefd=False
+            )
+        return decompressing_reader(binaryHandle, rawHandle)
+
+    compressionLevel = compressionLevel or defaultLevels[compression]
+    if compression == "gzip":
+        return gzip.open(fileName, "wb", compresslevel=compressionLevel)
+    if compression == "bz2":
+        return bz2.open(fileName, "wb", compresslevel=compressionLevel)
+    if compression == "xz":
+        return lzma.open(fileName, "wb", preset=compressionLevel)
+    return zstandard.ZstdCompressor(level=compressionLevel).stream_writer(
+        open(fileName, "wb"), closefd=True
+    )
+
+
+# ----------------------------------------
+def openBinaryInput(fileName, threaded=False, rawHandle=None):
+    """open a possibly compressed input file as a binary stream of its contents"""
+    # --a caller that passes the unbuffered file can use its tell() to see how far through it is
+    compression = getCompression(fileName)
+    if not compression:
+        return io.BufferedReader(rawHandle) if rawHandle else open(fileName, "rb")
+
+    binaryHandle = openBinary(fileName, compression, "rb", rawHandle=rawHandle)
+    if threaded:
+        return io.BufferedReader(threaded_reader(binaryHandle), 1048576)
+    return io.BufferedReader(binaryHandle, 1048576)
+
+
+# ----------------------------------------
+def openInput(fileName, fileEncoding=None, threaded=False, rawHandle=None):
+    """open a possibly compressed input file as text, optionally decompressing in a thread"""
+    if not getCompression(fileName) and not rawHandle:
+        return open(fileName, "r", encoding=fileEncoding)
+    return io.TextIOWrapper(
+        openBinaryInput(fileName, threaded, rawHandle), encoding=fileEncoding
+    )
+
+
+# ----------------------------------------
+def openOutput(fileName, compressionLevel=None):
+    """open a binary output file, compressed if its extension asks for it"""
+    compression = getCompression(fileName, checkContents=False)
+    if not compression:
+        return open(fileName, "wb")
+    return openBinary(fileName, compression, "wb", compressionLevel)
+
+
+# =========================
+class decompressing_reader(io.RawIOBase):
+    """a decompressor that closes the file under it when it is closed"""
+
+    # ----------------------------------------
+    def __init__(self, binaryHandle, rawHandle):
+        self.binaryHandle = binaryHandle
+        self.rawHandle = rawHandle
+
+    # ----------------------------------------
+    def readable(self):
+        return True
+
+    # ----------------------------------------
+    def readinto(self, buffer):
+        return self.binaryHandle.readinto(buffer)
+
+    # ----------------------------------------
+    def close(self):
+        if not self.closed:
+            try:
+                self.binaryHandle.close()
+            finally:
+                self.rawHandle.close()
+        super().close()
+
+
+# =========================
+class threaded_reader(io.RawIOBase):  # pylint: disable=too-many-instance-attributes
+    """reads a decompressing stream ahead in a thread, the codecs release the gil while they work"""
+
+    # ----------------------------------------
+    def __init__(self, binaryHandle, blockSize=1048576, queueSize=8):
+        self.binaryHandle = binaryHandle
+        self.blockSize = blockSize
+        self.blockQueue = queue.Queue(queueSize)
+        self.readError = None
+        self.stopped = False
+        self.finished = False
+        self.pending = memoryview(b"")
+        self.thread = threading.Thread(target=self.readBlocks, daemon=True)
+        self.thread.start()
+
+    # ----------------------------------------
+    def readBlocks(self):
+        """the background thread, an empty block marks the end of the stream"""
+        try:
+            while not self.stopped:
+                block = self.binaryHandle.read(self.blockSize)
+                self.blockQueue.put(block)
+                if not block:
+                    return
+        except Exception as err:
+            self.readError = err
+            self.blockQueue.put(b"")
+
+    # ----------------------------------------
+    def readable(self):
+        return True
+
+    # ----------------------------------------
+    def readinto(self, buffer):
+        while not self.pending:
+            if self.finished:
+                return 0
+            block = self.blockQueue.get()
+            if not block:
+                self.finished = True
+                if self.readError:
+                    raise IOError(self.readError)
+                return 0
+            self.pending = memoryview(block)
+
+        byteCnt = min(len(buffer), len(self.pending))
+        buffer[0:byteCnt] = self.pending[0:byteCnt]
+        self.pending = self.pending[byteCnt:]
+        return byteCnt
+
+    # ----------------------------------------
+    def close(self):
+        if not self.closed:
+            # --drain the queue so a blocked thread can see it has been stopped
+            self.stopped = True
+            while self.thread.is_alive():
+                try:
+                    self.blockQueue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self.binaryHandle.close()
+        super().close()
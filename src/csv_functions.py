@@ -162,6 +162,30 @@ class csv_functions:
                     self.statPack[cat1][cat2]["examples"][randomSampleI] = example
         return
 
+    # ----------------------------------------
+    def mergeStatPack(self, otherStatPack):
+        for cat1 in otherStatPack:
+            if cat1 not in self.statPack:
+                self.statPack[cat1] = {}
+            for cat2 in otherStatPack[cat1]:
+                if cat2 not in self.statPack[cat1]:
+                    self.statPack[cat1][cat2] = {}
+                    self.statPack[cat1][cat2]["count"] = 0
+
+                self.statPack[cat1][cat2]["count"] += otherStatPack[cat1][cat2]["count"]
+                for example in otherStatPack[cat1][cat2].get("examples", []):
+                    if "examples" not in self.statPack[cat1][cat2]:
+                        self.statPack[cat1][cat2]["examples"] = []
+                    if example not in self.statPack[cat1][cat2]["examples"]:
+                        if len(self.statPack[cat1][cat2]["examples"]) < 100:
+                            self.statPack[cat1][cat2]["examples"].append(example)
+                        else:
+                            randomSampleI = random.randint(25, 99)
+                            self.statPack[cat1][cat2]["examples"][
+                                randomSampleI
+                            ] = example
+        return
+
 
 # ----------------------------------------
 if __name__ == "__main__":
@@ -0,0 +1,316 @@
+#! /usr/bin/env python3
+import os
+import sys
+import argparse
+import array
+import bisect
+import codecs
+import csv
+import io
+import json
+import locale
+import struct
+import csv_reader
+
+# --the sidecar is the magic bytes, a version and metadata length, the json metadata and
+# --then the byte offset of every indexInterval'th row as little-endian 64 bit integers
+indexMagic = b"CSVROWIX"
+indexVersion = 1
+indexPrefix = struct.Struct("<8sHI")
+defaultInterval = 10000
+
+
+# ----------------------------------------
+def getIndexFileName(fileName):
+    return fileName + ".idx"
+
+
+# ----------------------------------------
+def getEncodingName(fileEncoding):
+    return codecs.lookup(fileEncoding or locale.getpreferredencoding(False)).name
+
+
+# ----------------------------------------
+def getRecordEnds(binaryHandle, offset, quoteChar):
+    """the byte offset after each record from offset on, a newline in a quoted field does not end one"""
+    # --just like splitting for workers, any field containing a quote is assumed to be quoted
+    inQuotes = False
+    for line in binaryHandle:
+        offset += len(line)
+        if quoteChar and quoteChar in line:
+            inQuotes ^= line.count(quoteChar) % 2 == 1
+        if not inQuotes:
+            yield offset
+
+
+# ----------------------------------------
+def buildIndex(fileName, fieldDelimiter=None, fileEncoding=None, indexInterval=None):
+    """read a file once to find the offset of every indexInterval'th row, returns the index or None"""
+    if not csv_reader.canMapFile(fileName, fileEncoding):
+        print("")
+        print(
+            "%s cannot be indexed, only uncompressed files that are not utf-16 or utf-32 can"
+            % fileName
+        )
+        return None
+    indexInterval = indexInterval or defaultInterval
+    fileStat = os.stat(fileName)
+
+    with open(fileName, "rb") as f:
+
+        # --the header is the first record of a delimited file, the delimiter is sniffed from it if not supplied
+        firstLine = f.readline()
+        f.seek(0)
+        if not fieldDelimiter:
+            fieldDelimiter = (
+                csv.Sniffer()
+                .sniff(
+                    firstLine.decode(getEncodingName(fileEncoding), "replace"), "|,\t"
+                )
+                .delimiter
+            )
+        csvDialect = csv_reader.getDialect(fieldDelimiter)
+        recordEnds = getRecordEnds(f, 0, csv_reader.getRecordQuote(fieldDelimiter))
+        headerEnd = 0
+        if csvDialect not in ("json", "fixed"):
+            headerEnd = next(recordEnds, fileStat.st_size)
+
+        # --then the offset of a row is kept as every interval of them starts
+        rowOffsets = array.array("Q", [headerEnd])
+        rowCount = 0
+        for rowCount, rowEnd in enumerate(recordEnds, 1):
+            if rowCount % indexInterval == 0:
+                rowOffsets.append(rowEnd)
+        if rowCount and rowCount % indexInterval == 0:
+            rowOffsets.pop()
+
+        f.seek(0)
+        headerText = f.read(headerEnd).decode(getEncodingName(fileEncoding))
+    headerRow = []
+    if headerText:
+        headerRow = next(
+            csv_reader.getReader(io.StringIO(headerText), csvDialect, fieldDelimiter),
+            [],
+        )
+
+    indexDoc = {}
+    indexDoc["fileSize"] = fileStat.st_size
+    indexDoc["fileModified"] = fileStat.st_mtime_ns
+    indexDoc["fieldDelimiter"] = fieldDelimiter
+    indexDoc["csvDialect"] = csvDialect
+    indexDoc["fileEncoding"] = getEncodingName(fileEncoding)
+    indexDoc["header"] = [str(x).strip() for x in headerRow]
+    indexDoc["rowCount"] = rowCount
+    indexDoc["indexInterval"] = indexInterval
+    indexDoc["rowOffsets"] = rowOffsets
+    return indexDoc
+
+
+# ----------------------------------------
+def writeIndex(fileName, indexDoc):
+    """write the index beside the file, replacing any old one in one step"""
+    indexFileName = getIndexFileName(fileName)
+    metadata = json.dumps(
+        {key: indexDoc[key] for key in indexDoc if key != "rowOffsets"}
+    ).encode("utf-8")
+    rowOffsets = array.array("Q", indexDoc["rowOffsets"])
+    if sys.byteorder != "little":
+        rowOffsets.byteswap()
+    with open(indexFileName + ".tmp", "wb") as f:
+        f.write(indexPrefix.pack(indexMagic, indexVersion, len(metadata)))
+        f.write(metadata)
+        rowOffsets.tofile(f)
+    os.replace(indexFileName + ".tmp", indexFileName)
+
+
+# ----------------------------------------
+def loadIndex(fileName, fieldDelimiter=None, fileEncoding=None):
+    """the file's index if it has one that is still current, otherwise None"""
+    indexFileName = getIndexFileName(fileName)
+    if not os.path.isfile(indexFileName):
+        return None
+    try:
+        with open(indexFileName, "rb") as f:
+            magic, version, metadataSize = indexPrefix.unpack(f.read(indexPrefix.size))
+            if magic != indexMagic or version != indexVersion:
+                return None
+            indexDoc = json.loads(f.read(metadataSize))
+            rowOffsets = array.array("Q")
+            rowOffsets.frombytes(f.read())
+    except (IOError, ValueError, struct.error):
+        return None
+    if sys.byteorder != "little":
+        rowOffsets.byteswap()
+    indexDoc["rowOffsets"] = rowOffsets
+
+    # --a file that has changed since, or is now read another way, needs a new index
+    fileStat = os.stat(fileName)
+    if (
+        indexDoc["fileSize"] != fileStat.st_size
+        or indexDoc["fileModified"] != fileStat.st_mtime_ns
+        or (fieldDelimiter and indexDoc["fieldDelimiter"] != fieldDelimiter)
+        or indexDoc["fileEncoding"] != getEncodingName(fileEncoding)
+    ):
+        return None
+    return indexDoc
+
+
+# ----------------------------------------
+def getIndex(fileName, fieldDelimiter=None, fileEncoding=None):
+    """the file's current index, building and saving one if need be"""
+    indexDoc = loadIndex(fileName, fieldDelimiter, fileEncoding)
+    if indexDoc:
+        return indexDoc
+    print("")
+    print("Indexing %s ..." % fileName)
+    indexDoc = buildIndex(fileName, fieldDelimiter, fileEncoding)
+    if indexDoc:
+        try:
+            writeIndex(fileName, indexDoc)
+        except IOError as err:
+            print(" could not save %s, %s" % (getIndexFileName(fileName), err))
+        print(" %s rows indexed" % indexDoc["rowCount"])
+    return indexDoc
+
+
+# ----------------------------------------
+def getRowOffset(fileName, indexDoc, rowNum):
+    """the byte offset of a row, counting from 1 after the header, read forward from the row indexed before it"""
+    if rowNum > indexDoc["rowCount"]:
+        return indexDoc["fileSize"]
+    rowNum = max(rowNum, 1)
+    entryNum = (rowNum - 1) // indexDoc["indexInterval"]
+    rowOffset = indexDoc["rowOffsets"][entryNum]
+    skipCnt = rowNum - 1 - entryNum * indexDoc["indexInterval"]
+    if not skipCnt:
+        return rowOffset
+
+    quoteChar = csv_reader.getRecordQuote(indexDoc["fieldDelimiter"])
+    with open(fileName, "rb") as f:
+        f.seek(rowOffset)
+        for recordNum, rowOffset in enumerate(
+            getRecordEnds(f, rowOffset, quoteChar), 1
+        ):
+            if recordNum == skipCnt:
+                break
+    return rowOffset
+
+
+# ----------------------------------------
+def getRowRange(fileName, indexDoc, firstRow=None, lastRow=None):
+    """the byte range holding rows firstRow to lastRow"""
+    rangeStart = getRowOffset(fileName, indexDoc, firstRow or 1)
+    rangeEnd = (
+        getRowOffset(fileName, indexDoc, lastRow + 1)
+        if lastRow
+        else indexDoc["fileSize"]
+    )
+    return rangeStart, max(rangeStart, rangeEnd)
+
+
+# ----------------------------------------
+def getFileChunks(indexDoc, chunkSize, rangeStart, rangeEnd):
+    """split a byte range into chunks at the indexed rows, no reading needed"""
+    rowOffsets = indexDoc["rowOffsets"]
+    chunkList = []
+    chunkStart = rangeStart
+    for entryNum in range(
+        bisect.bisect_right(rowOffsets, rangeStart),
+        bisect.bisect_left(rowOffsets, rangeEnd),
+    ):
+        if rowOffsets[entryNum] - chunkStart >= chunkSize:
+            chunkList.append((chunkStart, rowOffsets[entryNum]))
+            chunkStart = rowOffsets[entryNum]
+    if chunkStart < rangeEnd or not chunkList:
+        chunkList.append((chunkStart, rangeEnd))
+    return chunkList
+
+
+# ----------------------------------------
+def openRowRange(currentFile, firstRow, lastRow):
+    """reopen a file whose header, if it has one, has been read to read just a range of its rows"""
+    indexDoc = getIndex(
+        currentFile["name"],
+        currentFile["fieldDelimiter"],
+        currentFile.get("fileEncoding"),
+    )
+    if not indexDoc:
+        return None
+    rangeStart, rangeEnd = getRowRange(currentFile["name"], indexDoc, firstRow, lastRow)
+
+    # --rows are counted as if the ones before the range had been read
+    currentFile["handle"].close()
+    currentFile["handle"] = csv_reader.mapped_input(
+        currentFile["name"], currentFile.get("fileEncoding"), rangeStart, rangeEnd
+    )
+    currentFile["rawHandle"] = currentFile["handle"]
+    currentFile["reader"] = csv_reader.getReader(
+        currentFile["handle"],
+        currentFile["csvDialect"],
+        currentFile["fieldDelimiter"],
+        currentFile.get("fixedWidth"),
+    )
+    currentFile["rowCnt"] += max(firstRow or 1, 1) - 1
+    currentFile["rangeStart"] = rangeStart
+    currentFile["rangeEnd"] = rangeEnd
+    return currentFile
+
+
+# ----------------------------------------
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-i", "--inputFileName", dest="inputFileName", help="the csv file to index"
+    )
+    parser.add_argument(
+        "-d",
+        "--delimiterChar",
+        dest="fieldDelimiter",
+        help="delimiter character, sniffed from the header if not supplied",
+    )
+    parser.add_argument(
+        "-e",
+        "--fileEncoding",
+        dest="fileEncoding",
+        help="the file's encoding, default is the system's",
+    )
+    parser.add_argument(
+        "-n",
+        "--indexInterval",
+        dest="indexInterval",
+        type=int,
+        default=defaultInterval,
+        help="index the offset of every this many rows, default is %s"
+        % defaultInterval,
+    )
+    args = parser.parse_args()
+
+    if not args.inputFileName or not os.path.isfile(args.inputFileName):
+        print("")
+        print("%s not found" % args.inputFileName)
+        sys.exit(1)
+
+    print("")
+    print("Indexing %s ..." % args.inputFileName)
+    indexDoc = buildIndex(
+        args.inputFileName, args.fieldDelimiter, args.fileEncoding, args.indexInterval
+    )
+    if not indexDoc:
+        sys.exit(1)
+    try:
+        writeIndex(args.inputFileName, indexDoc)
+    except IOError as err:
+        print("")
+        print("Could not write %s \n%s" % (getIndexFileName(args.inputFileName), err))
+        sys.exit(1)
+    print(
+        " %s rows with %s columns, every %s rows indexed in %s"
+        % (
+            indexDoc["rowCount"],
+            len(indexDoc["header"]),
+            indexDoc["indexInterval"],
+            getIndexFileName(args.inputFileName),
+        )
+    )
+    sys.exit(0)
@@ -2,15 +2,28 @@
 import os
 import sys
 import argparse
-import configparser
 import signal
 import time
-from datetime import datetime, timedelta
 import json
-import csv
 import glob
-from importlib.machinery import SourceFileLoader
 from csv_functions import csv_functions
+from csv_aggregator import csv_aggregator, sorted_aggregator
+from csv_run_report import csv_run_report
+from csv_profiler import csv_profiler
+import csv_mapping
+import csv_output
+import csv_parallel
+import csv_reader
+import csv_index
+import csv_compression
+
+try:
+    import orjson
+except:
+    orjson = None
+
+# --set when a run starts
+runReport = None
 
 
 # ----------------------------------------
@@ -30,231 +43,16 @@ def signal_handler(signal, frame):
     global shutDown
     print("USER INTERRUPT! Shutting down ... (please wait)")
     shutDown = True
+    csv_parallel.shutDown = True
     return
 
 
-# ----------------------------------------
-def getNextRow(fileInfo):
-    errCnt = 0
-    rowData = None
-    while not rowData:
-
-        # --quit for consecutive errors
-        if errCnt >= 10:
-            fileInfo["ERROR"] = "YES"
-            print()
-            print("Shutdown due to too many errors")
-            break
-
-        try:
-            line = next(fileInfo["reader"])
-        except StopIteration:
-            break
-        except:
-            print(" row %s: %s" % (fileInfo["rowCnt"], sys.exc_info()[0]))
-            fileInfo["skipCnt"] += 1
-            errCnt += 1
-            continue
-        fileInfo["rowCnt"] += 1
-        if line:  # --skip empty lines
-
-            # --csv reader will return a list (mult-char delimiter must be manually split)
-            if type(line) == list:
-                row = line
-            else:
-                row = [
-                    removeQuoteChar(x.strip())
-                    for x in line.split(fileInfo["delimiter"])
-                ]
-
-            # --turn into a dictionary if there is a header
-            if "header" in fileInfo:
-
-                # --column mismatch
-                if len(row) != len(fileInfo["header"]):
-                    print(
-                        " row %s has %s columns, expected %s"
-                        % (fileInfo["rowCnt"], len(row), len(fileInfo["header"]))
-                    )
-                    fileInfo["skipCnt"] += 1
-                    errCnt += 1
-                    continue
-
-                # --is it the header row
-                elif (
-                    str(row[0]).upper() == fileInfo["header"][0].upper()
-                    and str(row[len(row) - 1]).upper()
-                    == fileInfo["header"][len(fileInfo["header"]) - 1].upper()
-                ):
-                    fileInfo["skipCnt"] += 1
-                    if fileInfo["rowCnt"] != 1:
-                        print(" row %s contains the header" % fileInfo["rowCnt"])
-                        errCnt += 1
-                    continue
-
-                # --return a good row
-                else:
-                    rowData = dict(
-                        zip(fileInfo["header"], [str(x).strip() for x in row])
-                    )
-
-            else:  # --if not just return what should be the header row
-                fileInfo["skipCnt"] += 1
-                rowData = [str(x).strip() for x in row]
-
-        else:
-            print(" row %s is blank" % fileInfo["rowCnt"])
-            fileInfo["skipCnt"] += 1
-            continue
-
-    return fileInfo, rowData
-
-
-# ----------------------------------------
-def removeQuoteChar(s):
-    if len(s) > 2 and s[0] + s[-1] in ("''", '""'):
-        return s[1:-1]
-    return s
-
-
-# ----------------------------------------
-def getValue(rowData, expression):
-    try:
-        if expression in rowData:
-            # print('here')
-            rtnValue = rowData[expression]
-        else:
-            rtnValue = expression % rowData
-    except:
-        print("warning: could not map %s" % (expression,))
-        rtnValue = ""
-    return rtnValue
-
-
 # ----------------------------------------
 def processFile():
-    global shutDown
-
-    # --check if mapped via python class first
-    pythonMapperClass = None
-    if pythonModuleFile:
-        if not os.path.exists(pythonModuleFile):
-            print("%s does not exist" % mappingFileName)
-            return -1
-        pythonMapper = SourceFileLoader(
-            pythonModuleFile, pythonModuleFile
-        ).load_module()
-        pythonMapperClass = pythonMapper.mapper()
-
-        mappingDoc = {}
-        mappingDoc["input"] = {}
-        # mappingDoc['fileEncoding'] = fileEncoding
-
-    # --read the mapping file
-    else:
-        if not os.path.exists(mappingFileName):
-            print("%s does not exist" % mappingFileName)
-            return -1
-
-        try:
-            mappingDoc = json.load(open(mappingFileName, "r"))
-        except ValueError as err:
-            print()
-            print("mapping file error: %s in %s" % (err, mappingFileName))
-            return -1
-
-    # --command line overrides
-    if fileEncoding:
-        mappingDoc["input"]["fileEncoding"] = fileEncoding
-    if fieldDelimiter:
-        mappingDoc["input"]["fieldDelimiter"] = fieldDelimiter
-
-    # --initialize stats for python class mapper
-    if "outputs" not in mappingDoc:
-        mappingDoc["outputs"] = []
-    else:
-
-        # --validate all outputs
-        errorCnt = 0
-        for i in range(len(mappingDoc["outputs"])):
-            if "enabled" in mappingDoc["outputs"][i] and mappingDoc["outputs"][i][
-                "enabled"
-            ].upper().startswith("N"):
-                continue
-
-            mappingDoc["outputs"][i]["rowsWritten"] = 0
-            mappingDoc["outputs"][i]["rowsSkipped"] = 0
-            mappingDoc["outputs"][i]["ignoredList"] = []
-            mappingDoc["outputs"][i]["statistics"] = {}
-
-            # --ensure uniqueness of attributes, especially if using labels (usage types)
-            aggregate = False
-            labelAttrList = []
-            for i1 in range(len(mappingDoc["outputs"][i]["attributes"])):
-                if (
-                    mappingDoc["outputs"][i]["attributes"][i1]["attribute"]
-                    == "<ignore>"
-                ):
-                    if "mapping" in mappingDoc["outputs"][i]["attributes"][i1]:
-                        mappingDoc["outputs"][i]["ignoredList"].append(
-                            mappingDoc["outputs"][i]["attributes"][i1]["mapping"]
-                            .replace("%(", "")
-                            .replace(")s", "")
-                        )
-                    continue
-                mappingDoc["outputs"][i]["statistics"][
-                    mappingDoc["outputs"][i]["attributes"][i1]["attribute"]
-                ] = 0
-
-                if "label" in mappingDoc["outputs"][i]["attributes"][i1]:
-                    mappingDoc["outputs"][i]["attributes"][i1]["label_attribute"] = (
-                        mappingDoc["outputs"][i]["attributes"][i1]["label"].replace(
-                            "_", "-"
-                        )
-                        + "_"
-                    )
-                else:
-                    mappingDoc["outputs"][i]["attributes"][i1]["label_attribute"] = ""
-                mappingDoc["outputs"][i]["attributes"][i1][
-                    "label_attribute"
-                ] += mappingDoc["outputs"][i]["attributes"][i1]["attribute"]
-                if (
-                    mappingDoc["outputs"][i]["attributes"][i1]["label_attribute"]
-                    in labelAttrList
-                ):
-                    errorCnt += 1
-                    print(
-                        "attribute %s (%s) is duplicated for output %s!"
-                        % (
-                            i1,
-                            mappingDoc["outputs"][i]["attributes"][i1][
-                                "label_attribute"
-                            ],
-                            i,
-                        )
-                    )
-                else:
-                    labelAttrList.append(
-                        mappingDoc["outputs"][i]["attributes"][i1]["label_attribute"]
-                    )
-
-                if "subList" in mappingDoc["outputs"][i]["attributes"][i1]:
-                    aggregate = True
+    global shutDown, checkpointRows, runReport
 
-            mappingDoc["outputs"][i]["aggregate"] = aggregate
-        if errorCnt:
-            return -1
-
-    # --initialize aggregated record array
-    totalRowCnt = 0
-    aggregatedRecords = {}
-
-    # --open output file
-    try:
-        outputFileHandle = open(outputFileName, "w")
-    except IOError as err:
-        print("")
-        print("Could not write to %s \n%s" % (outputFileName, err))
+    mappingDoc, pythonMapperClass = csv_mapping.loadMappingDoc()
+    if not mappingDoc:
         return -1
 
     # --override mapping document with parameters
@@ -273,296 +71,202 @@ def processFile():
         print("")
         print("%s not found" % inputFileName)
         return 1
+    if (firstRow or lastRow) and len(fileList) > 1:
+        print("")
+        print("--firstRow and --lastRow can only be used with a single input file")
+        return 1
+    runReport = csv_run_report(
+        "csv_mapper", reportFileName, fileList, mappingDoc["stageTimes"]
+    )
 
-    # --for each input file
-    for fileName in fileList:
+    # --a resumed run must be the same run that was checkpointed
+    checkpointDoc = {}
+    checkpointDoc["mappingFileName"] = mappingFileName
+    checkpointDoc["pythonModuleFile"] = pythonModuleFile
+    checkpointDoc["fileList"] = fileList
+    checkpointDoc["outputFileName"] = outputFileName
+    checkpointDoc["shardCount"] = shardCount
+    checkpointDoc["maxShardMB"] = maxShardMB
+    checkpointDoc["maxShardRecords"] = maxShardRecords
+    resumeDoc = None
+    if resumeRun:
+        try:
+            resumeDoc = json.load(open(checkpointFileName, "r"))
+        except (IOError, ValueError) as err:
+            print("")
+            print("Could not read checkpoint %s \n%s" % (checkpointFileName, err))
+            return 1
+        for key in checkpointDoc:
+            if resumeDoc.get(key) != checkpointDoc[key]:
+                print("")
+                print("Cannot resume, the %s is not the one checkpointed" % key)
+                return 1
+        checkpointRows = checkpointRows or resumeDoc["checkpointRows"]
+        for fileName in fileList[0 : fileList.index(resumeDoc["fileName"])]:
+            runReport.skipInput(os.path.getsize(fileName))
+        fileList = fileList[fileList.index(resumeDoc["fileName"]) :]
         print("")
-        print("Processing %s ..." % fileName)
-        currentFile = {}
-        currentFile["name"] = fileName
-        currentFile["rowCnt"] = 0
-        currentFile["skipCnt"] = 0
-
-        # --open the file
-        if (
-            "fileEncoding" in mappingDoc["input"]
-            and mappingDoc["input"]["fileEncoding"]
+        print(
+            "Resuming from the %s checkpoint at row %s of %s"
+            % (resumeDoc["checkpointTime"], resumeDoc["rowCnt"], resumeDoc["fileName"])
+        )
+    checkpointDoc["checkpointRows"] = checkpointRows
+
+    # --records aggregated in memory cannot be checkpointed, only those still open on sorted input
+    if checkpointRows:
+        if not sortedByKey and any(
+            outputDoc.get("aggregate") for outputDoc in mappingDoc["outputs"]
         ):
-            currentFile["fileEncoding"] = mappingDoc["input"]["fileEncoding"]
-            currentFile["handle"] = open(
-                fileName, "r", encoding=mappingDoc["input"]["fileEncoding"]
+            print("")
+            print("This mapping aggregates records, which are only written at the end")
+            print("of the run, so a checkpoint could not hold them. Checkpoints can")
+            print(
+                "only be used for it with --sortedByKey, where each record is written"
             )
-        else:
-            currentFile["handle"] = open(fileName, "r")
-
-        # --set the dialect
-        if "fieldDelimiter" in mappingDoc["input"]:
-            currentFile["fieldDelimiter"] = mappingDoc["input"]["fieldDelimiter"]
-        else:
-            sniffer = csv.Sniffer().sniff(
-                currentFile["handle"].readline(), delimiters="|,\t"
+            print(
+                "as its key ends and the ones still open are saved in the checkpoint."
             )
-            currentFile["handle"].seek(0)
-            currentFile["fieldDelimiter"] = sniffer.delimiter
-            mappingDoc["input"]["fieldDelimiter"] = sniffer.delimiter
-        if mappingDoc["input"]["fieldDelimiter"].lower() in ("csv", "comma", ","):
-            currentFile["csvDialect"] = "excel"
-        elif mappingDoc["input"]["fieldDelimiter"].lower() in ("tab", "tsv", "\t"):
-            currentFile["csvDialect"] = "excel-tab"
-        elif mappingDoc["input"]["fieldDelimiter"].lower() in ("pipe", "|"):
-            csv.register_dialect("pipe", delimiter="|", quotechar='"')
-            currentFile["csvDialect"] = "pipe"
-        elif len(mappingDoc["input"]["fieldDelimiter"]) == 1:
-            csv.register_dialect("other", delimiter=delimiter, quotechar='"')
-            currentFile["csvDialect"] = "other"
-        elif len(mappingDoc["input"]["fieldDelimiter"]) > 1:
-            currentFile["csvDialect"] = "multi"
-        else:
-            currentFile["csvDialect"] = "excel"
+            return 1
+        if csv_reader.isWideEncoding(mappingDoc["input"].get("fileEncoding")):
+            print("")
+            print("Checkpoints cannot track the position in a utf-16 or utf-32 file")
+            return 1
 
-        # --set the reader (csv cannot be used for multi-char delimiters)
-        if currentFile["csvDialect"] != "multi":
-            currentFile["reader"] = csv.reader(
-                currentFile["handle"], dialect=currentFile["csvDialect"]
-            )
-        else:
-            currentFile["reader"] = currentFile["handle"]
+    # --initialize the aggregated records, they spill to disk past the memory limit
+    totalRowCnt = 0
+    runRowCnt = 0
+    if sortedByKey:
+        aggregator = sorted_aggregator()
+    else:
+        aggregator = csv_aggregator(aggregateMemoryMB, tempDir)
+    if resumeDoc:
+        totalRowCnt = resumeDoc["totalRowCnt"]
+        for uniqueKey, owner, jsonData in resumeDoc["openRecords"]:
+            aggregator.add(uniqueKey, jsonData, owner)
 
-        # --get the current file header row and use it if not one already
-        currentFile, currentHeaders = getNextRow(currentFile)
-        if not mappingDoc["input"]["columnHeaders"]:
-            mappingDoc["input"]["columnHeaders"] = [
-                str(x).replace(" ", "_") for x in currentHeaders
-            ]
-        currentFile["header"] = mappingDoc["input"]["columnHeaders"]
+    # --open output file, back to where it was at the checkpoint if resuming
+    try:
+        outputWriter = csv_output.output_writer(
+            outputFileName,
+            jsonLibrary=jsonLibrary,
+            compressionLevel=compressionLevel,
+            shardCount=shardCount,
+            maxShardMB=maxShardMB,
+            maxShardRecords=maxShardRecords,
+            resumeFiles=resumeDoc["outputFiles"] if resumeDoc else None,
+            stageTimes=mappingDoc["stageTimes"],
+        )
+    except IOError as err:
+        print("")
+        print("Could not write to %s \n%s" % (outputFileName, err))
+        return -1
+
+    # --hand the files off to worker processes
+    if workerCount > 1 and any(csv_compression.getCompression(x) for x in fileList):
+        print("")
+        print("compressed input cannot be split into chunks, mapping in one process")
+    elif workerCount > 1:
+        if csv_parallel.processFilesParallel(
+            fileList,
+            mappingDoc,
+            pythonMapperClass,
+            aggregator=aggregator,
+            outputWriter=outputWriter,
+            runReport=runReport,
+            workerCount=workerCount,
+            unorderedOutput=unorderedOutput,
+            sortedByKey=sortedByKey,
+            jsonLibrary=jsonLibrary,
+            checkpointDoc=checkpointDoc,
+            resumeDoc=resumeDoc,
+            checkpointRows=checkpointRows,
+            checkpointFileName=checkpointFileName,
+            firstRow=firstRow,
+            lastRow=lastRow,
+            profiler=profiler,
+        ):
+            shutDown = True
+        fileList = []
 
+    # --for each input file
+    for fileName in fileList:
+        print("")
+        print("Processing %s ..." % fileName)
+        currentFile = csv_mapping.openInputFile(fileName, mappingDoc, checkpointRows)
+        currentFile = csv_mapping.readHeader(currentFile, mappingDoc, pythonMapperClass)
+        fileStart = 0
+        fileEnd = os.path.getsize(fileName)
+        rangeRowCnt, rangeSkipCnt = 0, 0
+
+        # --just the rows asked for are read, found with the file's row index
+        if firstRow or lastRow:
+            if not csv_index.openRowRange(currentFile, firstRow, lastRow):
+                currentFile["handle"].close()
+                shutDown = True
+                break
+            fileStart = currentFile["rangeStart"]
+            fileEnd = currentFile["rangeEnd"]
+            runReport.skipInput(os.path.getsize(fileName) - (fileEnd - fileStart))
+            totalRowCnt = max(firstRow or 1, 1) - 1
+
+            # --the rows are numbered from the start of the file, but just the range is reported
+            rangeRowCnt, rangeSkipCnt = currentFile["rowCnt"], currentFile["skipCnt"]
+
+        if resumeDoc and fileName == resumeDoc["fileName"]:
+            currentFile["handle"].seek(resumeDoc["byteOffset"])
+            currentFile["rowCnt"] = resumeDoc["rowCnt"]
+            currentFile["skipCnt"] = resumeDoc["skipCnt"]
+            csv_mapping.restoreCheckpointStats(resumeDoc, mappingDoc)
+        nextCheckpointRow = currentFile["rowCnt"] + (checkpointRows or 0)
+        if resumeDoc and fileName == resumeDoc["fileName"]:
+            fileStart = currentFile["rawHandle"].tell()
+            runReport.skipInput(fileStart)
+
+        stageTimes = mappingDoc["stageTimes"]
         while True:
-            currentFile, rowData = getNextRow(currentFile)
+            if profiler:
+                profiler.nextRow()
+            startTime = time.perf_counter()
+            currentFile, rowData = csv_mapping.getNextRow(currentFile)
+            stageTime = time.perf_counter()
+            stageTimes["read"] += stageTime - startTime
             if not rowData:
                 break
 
             totalRowCnt += 1
-            rowData["ROW_ID"] = totalRowCnt
-
-            # --clean garbage values
-            for key in rowData:
-                rowData[key] = csv_functions.clean_value(key, rowData[key])
-
-            # --python mapper statistics
-            if pythonMapperClass:
-                mappedData = pythonMapperClass.map(rowData)
-                if not mappedData:
-                    currentFile["skipCnt"] += 1
-                    continue
-
-                jsonList = []
-                i = 0
-                for jsonData in (
-                    mappedData if type(mappedData) == list else [mappedData]
-                ):
-                    if i == len(mappingDoc["outputs"]):
-                        outputDict = {}
-                        outputDict["rowsWritten"] = 0
-                        outputDict["rowsSkipped"] = 0
-                        outputDict["ignoredList"] = []
-                        outputDict["statistics"] = {}
-                        mappingDoc["outputs"].append(outputDict)
-                    removeAttrList = []
-                    for attribute in jsonData:
-                        if not jsonData[attribute]:
-                            removeAttrList.append(attribute)
-                        else:
-                            if (
-                                type(jsonData[attribute]) != list
-                            ):  # --to help capture stats in sub-lists
-                                subList = [{attribute: jsonData[attribute]}]
-                            else:
-                                subList = jsonData[attribute]
-                            for record in subList:
-                                for attribute in record:
-                                    if (
-                                        attribute
-                                        not in mappingDoc["outputs"][i]["statistics"]
-                                    ):
-                                        mappingDoc["outputs"][i]["statistics"][
-                                            attribute
-                                        ] = 1
-                                    else:
-                                        mappingDoc["outputs"][i]["statistics"][
-                                            attribute
-                                        ] += 1
-                    for attribute in removeAttrList:
-                        del jsonData[attribute]
-                    if jsonData:
-                        jsonList.append(jsonData)
-                        outputDict["rowsWritten"] += 1
-                    i = i + 1
+            runRowCnt += 1
+            rowData = csv_mapping.cleanRow(rowData, currentFile, totalRowCnt)
+            stageTimes["clean"] += time.perf_counter() - stageTime
 
-            else:
+            jsonList = csv_mapping.mapRow(
+                rowData, mappingDoc, pythonMapperClass, aggregator
+            )
 
-                # --perform calculations
-                mappingErrors = 0
-                if "calculations" in mappingDoc:
-                    for calcDict in mappingDoc["calculations"]:
-                        newAttribute = list(calcDict.keys())[0]
-                        newExpression = list(calcDict.values())[0]
-                        try:
-                            newValue = eval(newExpression)
-                        except Exception as err:
-                            print("  error: %s [%s]" % (newAttribute, err))
-                            mappingErrors += 1
-                        else:
-                            if newAttribute == "<list>":
-                                if type(newValue) == list:
-                                    for newItem in newValue:
-                                        rowData.update(newItem)
-                                else:
-                                    print(
-                                        "  error: %s [%s]"
-                                        % (
-                                            newAttribute,
-                                            "expression did not return a list!",
-                                        )
-                                    )
-                                    mappingErrors += 1
-                            else:
-                                rowData[newAttribute] = newValue
-
-                # --process the record for each output
-                jsonList = []
-                for i in range(len(mappingDoc["outputs"])):
-                    if "enabled" in mappingDoc["outputs"][i] and mappingDoc["outputs"][
-                        i
-                    ]["enabled"].upper().startswith("N"):
-                        continue
-
-                    if "filter" in mappingDoc["outputs"][i]:
-                        try:
-                            skipRow = eval(mappingDoc["outputs"][i]["filter"])
-                        except Exception as err:
-                            skipRow = False
-                            print(
-                                " filter error: %s [%s]"
-                                % (mappingDoc["outputs"][i]["filter"], err)
-                            )
-                        if skipRow:
-                            mappingDoc["outputs"][i]["rowsSkipped"] += 1
-                            continue
-
-                    dataSource = getValue(
-                        rowData, mappingDoc["outputs"][i]["data_source"]
-                    )
-                    if "record_type" in mappingDoc["outputs"][i]:
-                        recordType = getValue(
-                            rowData, mappingDoc["outputs"][i]["record_type"]
-                        )
-                    else:
-                        recordType = dataSource
-
-                    entityKey = None
-                    recordID = None
-                    uniqueKey = None
-                    if "entity_key" in mappingDoc["outputs"][i]:
-                        entityKey = getValue(
-                            rowData, mappingDoc["outputs"][i]["entity_key"]
-                        )
-                        uniqueKey = dataSource + "|" + entityKey
-                    elif "record_id" in mappingDoc["outputs"][i]:
-                        recordID = getValue(
-                            rowData, mappingDoc["outputs"][i]["record_id"]
-                        )
-                        uniqueKey = dataSource + "|" + recordID
-
-                    rootValues = {}
-                    subListValues = {}
-                    for attrDict in mappingDoc["outputs"][i]["attributes"]:
-                        if attrDict["attribute"] == "<ignore>":
-                            continue
-
-                        attrValue = getValue(rowData, attrDict["mapping"])
-                        if attrValue:
-                            mappingDoc["outputs"][i]["statistics"][
-                                attrDict["attribute"]
-                            ] += 1
-                            if "subList" in attrDict:
-                                if attrDict["subList"] not in subListValues:
-                                    subListValues[attrDict["subList"]] = {}
-                                subListValues[attrDict["subList"]][
-                                    attrDict["label_attribute"]
-                                ] = attrValue
-                            else:
-                                rootValues[attrDict["label_attribute"]] = attrValue
-
-                    # --complete the json record
-                    jsonData = {}
-                    for subList in subListValues:
-                        jsonData[subList] = [subListValues[subList]]
-                    jsonData["DATA_SOURCE"] = dataSource
-                    jsonData["RECORD_TYPE"] = recordType
-                    if entityKey:
-                        jsonData["ENTITY_KEY"] = entityKey
-                    elif recordID:
-                        jsonData["RECORD_ID"] = recordID
-                    jsonData.update(rootValues)
-
-                    # --just output if not aggregating
-                    if not mappingDoc["outputs"][i]["aggregate"]:
-                        jsonList.append(jsonData)
-                        mappingDoc["outputs"][i]["rowsWritten"] += 1
-                    else:
-                        if uniqueKey not in aggregatedRecords:
-                            mappingDoc["outputs"][i]["rowsWritten"] += 1
-                            aggregatedRecords[uniqueKey] = jsonData
-                        else:
-                            # --update root attributes
-                            for attribute in jsonData:
-                                if type(jsonData[attribute]) != list:
-                                    # --append missing
-                                    if attribute not in aggregatedRecords[uniqueKey]:
-                                        aggregatedRecords[uniqueKey][attribute] = (
-                                            jsonData[attribute]
-                                        )
-                                    else:
-                                        if (
-                                            jsonData[attribute]
-                                            != aggregatedRecords[uniqueKey][attribute]
-                                        ):
-                                            print(
-                                                " %s update ignored ... [%s] vs [%s]"
-                                                % (
-                                                    attribute,
-                                                    jsonData[attribute],
-                                                    aggregatedRecords[uniqueKey][
-                                                        attribute
-                                                    ],
-                                                )
-                                            )
-                                            # --do not update for now... just not sure how!
-
-                            # --aggregate distinct subLists
-                            for subList in subListValues:
-                                subRecord = subListValues[subList]
-                                if subList not in aggregatedRecords[uniqueKey]:
-                                    aggregatedRecords[uniqueKey][subList] = []
-
-                                if (
-                                    subRecord
-                                    not in aggregatedRecords[uniqueKey][subList]
-                                ):
-                                    aggregatedRecords[uniqueKey][subList].append(
-                                        subRecord
-                                    )
-                            jsonData = aggregatedRecords[uniqueKey]
+            # --with sorted input a record is written as soon as its key changes
+            closedRecords = aggregator.popClosedRecords()
+            if closedRecords:
+                jsonList = jsonList or []
+                for uniqueKey, owner, jsonData in closedRecords:
+                    mappingDoc["outputs"][owner]["rowsWritten"] += 1
+                    jsonList.append(jsonData)
+            if aggregator.orderError:
+                print("")
+                print("%s at row %s" % (aggregator.orderError, currentFile["rowCnt"]))
+                print("sort the input by key or run without --sortedByKey")
+                shutDown = True
+
+            if jsonList is None:
+                currentFile["skipCnt"] += 1
+                continue
 
             for jsonData in jsonList:
                 try:
-                    outputFileHandle.write(json.dumps(jsonData) + "\n")
+                    outputWriter.write(jsonData)
                 except IOError as err:
                     print("")
                     print("Could no longer write to %s \n%s" % (outputFileName, err))
                     shutDown = True
                     break
-                # mappingDoc['outputs'][i]['rowsWritten'] += 1
                 if debugOn:
                     print(json.dumps(jsonData, indent=4))
                     pause()
@@ -573,31 +277,67 @@ def processFile():
             elif "ERROR" in currentFile:
                 break
 
-            if currentFile["rowCnt"] % 10000 == 0:
+            if checkpointRows and currentFile["rowCnt"] >= nextCheckpointRow:
+                checkpointDoc["fileName"] = fileName
+                checkpointDoc["byteOffset"] = currentFile["handle"].offset
+                checkpointDoc["rowCnt"] = currentFile["rowCnt"]
+                checkpointDoc["skipCnt"] = currentFile["skipCnt"]
+                checkpointDoc["totalRowCnt"] = totalRowCnt
+                try:
+                    csv_mapping.saveCheckpoint(
+                        checkpointFileName,
+                        checkpointDoc,
+                        mappingDoc,
+                        aggregator,
+                        outputWriter,
+                    )
+                except IOError as err:
+                    print("")
+                    print(
+                        "Could not write checkpoint %s \n%s" % (checkpointFileName, err)
+                    )
+                    shutDown = True
+                    break
+                nextCheckpointRow = currentFile["rowCnt"] + checkpointRows
+
+            if (currentFile["rowCnt"] - rangeRowCnt) % 10000 == 0:
+                runReport.setPosition(currentFile["rawHandle"].tell() - fileStart)
+                runReport.update(runRowCnt, outputWriter.getRecordCount())
                 print(
-                    " %s rows processed, %s rows skipped"
-                    % (currentFile["rowCnt"], currentFile["skipCnt"])
+                    " %s rows processed, %s rows skipped%s"
+                    % (
+                        currentFile["rowCnt"] - rangeRowCnt,
+                        currentFile["skipCnt"] - rangeSkipCnt,
+                        runReport.getProgress(),
+                    )
                 )
 
+        if profiler:
+            profiler.stop()
+        runReport.setPosition(currentFile["rawHandle"].tell() - fileStart)
+        runReport.update(runRowCnt, outputWriter.getRecordCount())
         currentFile["handle"].close()
         if shutDown:
             break
         else:
+            runReport.finishInput(fileEnd - fileStart)
             print(
                 " %s rows processed, %s rows skipped, complete!"
-                % (currentFile["rowCnt"], currentFile["skipCnt"])
+                % (
+                    currentFile["rowCnt"] - rangeRowCnt,
+                    currentFile["skipCnt"] - rangeSkipCnt,
+                )
             )
 
     # -write aggregated records to file
-    if aggregatedRecords:
+    if len(aggregator):
         print("writing aggregated records to output file ...")
         if not shutDown:
             rowCnt = 0
-            for uniqueKey in aggregatedRecords:
+            for owner, jsonData in aggregator.records():
+                mappingDoc["outputs"][owner]["rowsWritten"] += 1
                 try:
-                    outputFileHandle.write(
-                        json.dumps(aggregatedRecords[uniqueKey]) + "\n"
-                    )
+                    outputWriter.write(jsonData)
                 except IOError as err:
                     print("")
                     print("Could not longer write to %s \n%s" % (outputFileName, err))
@@ -611,7 +351,31 @@ def processFile():
                 print(" %s rows processed, complete!" % rowCnt)
 
     # --close all inputs and outputs
-    outputFileHandle.close()
+    aggregator.close()
+    try:
+        outputWriter.close()
+    except IOError as err:
+        print("")
+        print("Could not finish writing %s \n%s" % (outputFileName, err))
+        shutDown = True
+    if checkpointRows and not shutDown and os.path.exists(checkpointFileName):
+        os.remove(checkpointFileName)
+    if outputWriter.sharded and not shutDown:
+        print("")
+        print(
+            "%s output files listed in %s"
+            % (len(outputWriter.manifest), outputWriter.manifestFileName)
+        )
+    csv_mapping.foldStatistics(mappingDoc)
+
+    # --the rows were counted as they were read, the aggregated records are written since
+    runReport.update(runReport.rowCnt, outputWriter.getRecordCount())
+    if reportFileName:
+        try:
+            runReport.write("complete" if not shutDown else "aborted")
+        except IOError as err:
+            print("")
+            print("Could not write the run report %s \n%s" % (reportFileName, err))
 
     for i in range(len(mappingDoc["outputs"])):
         print()
@@ -720,7 +484,137 @@ if __name__ == "__main__":
         "-l",
         "--log_file",
         dest="logFileName",
-        help="optional statistics filename (json format).",
+        help="optional statistics filename (json format), a -report.json run report is written beside it",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        dest="workerCount",
+        type=int,
+        default=1,
+        help="number of worker processes to map the input files with, defaults to 1",
+    )
+    parser.add_argument(
+        "--unordered",
+        dest="unorderedOutput",
+        action="store_true",
+        default=False,
+        help="with --workers, write records as chunks finish rather than in input order",
+    )
+    parser.add_argument(
+        "--aggregateMemoryMB",
+        dest="aggregateMemoryMB",
+        type=int,
+        help="memory limit for aggregated (subList) records before they spill to disk",
+    )
+    parser.add_argument(
+        "--tempDir",
+        dest="tempDir",
+        help="directory for spilled aggregation files, defaults to the system temp",
+    )
+    parser.add_argument(
+        "--sortedByKey",
+        dest="sortedByKey",
+        action="store_true",
+        default=False,
+        help="input is sorted by record key, as text like LC_ALL=C sort, so aggregated records are written as each key ends",
+    )
+    parser.add_argument(
+        "--jsonLibrary",
+        dest="jsonLibrary",
+        choices=["json", "orjson"],
+        default="orjson" if orjson else "json",
+        help="library to write the json records with, defaults to orjson when installed",
+    )
+    parser.add_argument(
+        "--shards",
+        dest="shardCount",
+        type=int,
+        default=1,
+        help="number of output files to partition the records into by DATA_SOURCE|RECORD_ID",
+    )
+    parser.add_argument(
+        "--maxShardMB",
+        dest="maxShardMB",
+        type=int,
+        help="start a new output file once one reaches this many megabytes",
+    )
+    parser.add_argument(
+        "--maxShardRecords",
+        dest="maxShardRecords",
+        type=int,
+        help="start a new output file once one reaches this many records",
+    )
+    parser.add_argument(
+        "--checkpointRows",
+        dest="checkpointRows",
+        type=int,
+        help="save a checkpoint to resume from every this many rows",
+    )
+    parser.add_argument(
+        "--resume",
+        dest="resumeRun",
+        action="store_true",
+        default=False,
+        help="resume a run from its last checkpoint",
+    )
+    parser.add_argument(
+        "--firstRow",
+        dest="firstRow",
+        type=int,
+        help="start at this row after the header, found with the file's row index which is built if need be",
+    )
+    parser.add_argument(
+        "--lastRow",
+        dest="lastRow",
+        type=int,
+        help="stop after this row, found with the file's row index which is built if need be",
+    )
+    parser.add_argument(
+        "--compressionLevel",
+        dest="compressionLevel",
+        type=int,
+        help="level for an output file named .gz, .bz2, .xz or .zst, defaults to the codec's usual",
+    )
+    parser.add_argument(
+        "--decompressThread",
+        dest="decompressThread",
+        action="store_true",
+        default=False,
+        help="decompress compressed input in a separate thread",
+    )
+    parser.add_argument(
+        "--profile",
+        dest="profileFileName",
+        help="optional file to write a pstats profile of the mapping to, with a -summary.txt beside it",
+    )
+    parser.add_argument(
+        "--profileSample",
+        dest="profileSample",
+        type=int,
+        default=1,
+        help="profile only 1 in this many rows to keep the overhead down, default is every row",
+    )
+    parser.add_argument(
+        "--profileTop",
+        dest="profileTop",
+        type=int,
+        default=25,
+        help="the number of functions to list in the profile summary, default is 25",
+    )
+    parser.add_argument(
+        "--memoryMap",
+        dest="memoryMap",
+        action="store_true",
+        default=False,
+        help="read uncompressed input through a memory map, with -w each worker maps its own part of the file",
+    )
+    parser.add_argument(
+        "--noHeaderCheck",
+        dest="noHeaderCheck",
+        action="store_true",
+        default=False,
+        help="do not look for the header row repeated in the data, for files known to have it just once",
     )
     parser.add_argument(
         "-D",
@@ -738,7 +632,28 @@ if __name__ == "__main__":
     fileEncoding = args.fileEncoding
     outputFileName = args.outputFileName
     logFileName = args.logFileName
+    reportFileName = (
+        os.path.splitext(logFileName)[0] + "-report.json" if logFileName else None
+    )
     debugOn = args.debugOn
+    workerCount = args.workerCount if not debugOn else 1
+    unorderedOutput = args.unorderedOutput
+    aggregateMemoryMB = args.aggregateMemoryMB
+    tempDir = args.tempDir
+    sortedByKey = args.sortedByKey
+    jsonLibrary = args.jsonLibrary
+    compressionLevel = args.compressionLevel
+    shardCount = args.shardCount
+    maxShardMB = args.maxShardMB
+    maxShardRecords = args.maxShardRecords
+    checkpointRows = args.checkpointRows
+    resumeRun = args.resumeRun
+    firstRow = args.firstRow
+    lastRow = args.lastRow
+    decompressThread = args.decompressThread
+    profileFileName = args.profileFileName
+    headerCheck = not args.noHeaderCheck
+    memoryMap = args.memoryMap
 
     # --validations
     if not mappingFileName and not pythonModuleFile:
@@ -747,13 +662,68 @@ if __name__ == "__main__":
     if not outputFileName:
         print("an output file must be specified with -o")
         sys.exit(1)
+    checkpointFileName = outputFileName + ".checkpoint"
+    if (checkpointRows or resumeRun) and unorderedOutput:
+        print("checkpoints need the records in input order, they cannot be --unordered")
+        sys.exit(1)
+    if (checkpointRows or resumeRun) and csv_compression.getCompression(
+        outputFileName, checkContents=False
+    ):
+        print("checkpoints cannot be used with a compressed output file")
+        sys.exit(1)
+    if (firstRow or lastRow) and (checkpointRows or resumeRun):
+        print("a row range cannot be checkpointed, map the rows still to do instead")
+        sys.exit(1)
+    if shardCount < 1:
+        print("--shards must be at least 1")
+        sys.exit(1)
+    if jsonLibrary == "orjson" and not orjson:
+        print("orjson is not installed, pip install orjson or use --jsonLibrary json")
+        sys.exit(1)
+    if sortedByKey and unorderedOutput:
+        print(
+            "--sortedByKey needs the records in input order, it cannot be --unordered"
+        )
+        sys.exit(1)
 
     csv_functions = csv_functions()
     if not csv_functions.initialized:
         sys.exit(1)
+    optionParms = {}
+    optionParms["csv_functions"] = csv_functions
+    optionParms["mappingFileName"] = mappingFileName
+    optionParms["pythonModuleFile"] = pythonModuleFile
+    optionParms["fieldDelimiter"] = fieldDelimiter
+    optionParms["fileEncoding"] = fileEncoding
+    optionParms["headerCheck"] = headerCheck
+    optionParms["memoryMap"] = memoryMap
+    optionParms["decompressThread"] = decompressThread
+    csv_mapping.setOptions(optionParms)
+
+    # --calculations and filters show up in the profile by their mapping entry
+    profiler = None
+    if profileFileName:
+        profiler = csv_profiler(
+            profileFileName, args.profileSample, args.profileTop, [pythonModuleFile]
+        )
 
     result = processFile()
 
+    if profiler:
+        print("")
+        try:
+            summaryFileName = profiler.write()
+        except IOError as err:
+            print("Could not write profile %s \n%s" % (profileFileName, err))
+        else:
+            if summaryFileName:
+                print(
+                    "Profile written to %s, summary in %s"
+                    % (profileFileName, summaryFileName)
+                )
+            else:
+                print("No rows were profiled")
+
     if logFileName:
         print("")
         with open(logFileName, "w") as f:
@@ -0,0 +1,859 @@
+#! /usr/bin/env python3
+import os
+import sys
+import json
+import csv
+import builtins
+import locale
+import re
+import time
+from datetime import datetime, timedelta
+from importlib.machinery import SourceFileLoader
+from csv_row import csv_row, getColumnPositions
+import csv_reader
+import csv_compression
+
+stageNames = [
+    "read",
+    "clean",
+    "python_module",
+    "calculations",
+    "filters",
+    "projection",
+    "aggregate",
+    "serialize",
+    "write",
+]
+
+# --the mapper's options, set by setOptions in the main process and in each worker process
+csv_functions = None
+mappingFileName = None
+pythonModuleFile = None
+fieldDelimiter = None
+fileEncoding = None
+headerCheck = True
+memoryMap = False
+decompressThread = False
+
+
+# ----------------------------------------
+def setOptions(optionParms):
+    """the csv_functions and options the rows are read and mapped with"""
+    global csv_functions, mappingFileName, pythonModuleFile, fieldDelimiter
+    global fileEncoding, headerCheck, memoryMap, decompressThread
+
+    csv_functions = optionParms["csv_functions"]
+    mappingFileName = optionParms.get("mappingFileName")
+    pythonModuleFile = optionParms.get("pythonModuleFile")
+    fieldDelimiter = optionParms.get("fieldDelimiter")
+    fileEncoding = optionParms.get("fileEncoding")
+    headerCheck = optionParms.get("headerCheck", True)
+    memoryMap = optionParms.get("memoryMap", False)
+    decompressThread = optionParms.get("decompressThread", False)
+
+
+# =========================
+class offset_reader:
+    """feeds the csv reader lines from a binary stream, keeping the byte offset of the next one"""
+
+    # ----------------------------------------
+    def __init__(self, binaryHandle, fileEncoding):
+        self.binaryHandle = binaryHandle
+        self.fileEncoding = fileEncoding or locale.getpreferredencoding(False)
+        self.offset = 0
+
+    # ----------------------------------------
+    def __iter__(self):
+        return self
+
+    # ----------------------------------------
+    def __next__(self):
+        line = self.binaryHandle.readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line)
+
+        # --newlines are translated just as a text mode file would
+        if line.endswith(b"\r\n"):
+            line = line[0:-2] + b"\n"
+        return line.decode(self.fileEncoding)
+
+    # ----------------------------------------
+    def seek(self, offset):
+        """move to a record boundary, reading forward if the stream cannot seek"""
+        if self.binaryHandle.seekable():
+            self.binaryHandle.seek(offset)
+        else:
+            while self.offset < offset:
+                block = self.binaryHandle.read(min(1048576, offset - self.offset))
+                if not block:
+                    break
+                self.offset += len(block)
+        self.offset = offset
+
+    # ----------------------------------------
+    def close(self):
+        self.binaryHandle.close()
+
+
+# ----------------------------------------
+def getNextRow(fileInfo):
+    errCnt = 0
+    rowData = None
+    while not rowData:
+
+        # --quit for consecutive errors
+        if errCnt >= 10:
+            fileInfo["ERROR"] = "YES"
+            print()
+            print("Shutdown due to too many errors")
+            break
+
+        try:
+            row = next(fileInfo["reader"])
+        except StopIteration:
+            break
+        except:
+            print(" row %s: %s" % (fileInfo["rowCnt"], sys.exc_info()[0]))
+            fileInfo["skipCnt"] += 1
+            errCnt += 1
+            continue
+        fileInfo["rowCnt"] += 1
+        if row:  # --skip empty lines
+
+            # --a json line is already a dictionary, it is used as is without a header
+            if fileInfo["csvDialect"] == "json":
+                if type(row) != dict:
+                    print(" row %s is not a json object" % fileInfo["rowCnt"])
+                    fileInfo["skipCnt"] += 1
+                    errCnt += 1
+                    continue
+                rowData = csv_row(fileInfo["columnPositions"], [], row)
+
+            # --turn into a dictionary if there is a header
+            elif "header" in fileInfo:
+
+                # --column mismatch
+                if len(row) != len(fileInfo["header"]):
+                    print(
+                        " row %s has %s columns, expected %s"
+                        % (fileInfo["rowCnt"], len(row), len(fileInfo["header"]))
+                    )
+                    fileInfo["skipCnt"] += 1
+                    errCnt += 1
+                    continue
+
+                # --is it the header row, the length is compared first as it rarely matches
+                elif (
+                    fileInfo["headerCheck"]
+                    and len(row[0]) == len(fileInfo["headerCheck"][0])
+                    and row[0].upper() == fileInfo["headerCheck"][0]
+                    and row[-1].upper() == fileInfo["headerCheck"][1]
+                ):
+                    fileInfo["skipCnt"] += 1
+                    if fileInfo["rowCnt"] != 1:
+                        print(" row %s contains the header" % fileInfo["rowCnt"])
+                        errCnt += 1
+                    continue
+
+                # --return a good row, its values are stripped when it is cleaned
+                else:
+                    rowData = csv_row(fileInfo["columnPositions"], row)
+
+            else:  # --if not just return what should be the header row
+                fileInfo["skipCnt"] += 1
+                rowData = [str(x).strip() for x in row]
+
+        else:
+            print(" row %s is blank" % fileInfo["rowCnt"])
+            fileInfo["skipCnt"] += 1
+            continue
+
+    return fileInfo, rowData
+
+
+# ----------------------------------------
+def setFileHeader(fileInfo, columnHeaders):
+    """set the header the rows of a file are read with"""
+    fileInfo["header"] = columnHeaders
+    fileInfo["columnPositions"] = getColumnPositions(columnHeaders)
+    fileInfo["headerCheck"] = (
+        (str(columnHeaders[0]).upper(), str(columnHeaders[-1]).upper())
+        if headerCheck and columnHeaders and fileInfo["csvDialect"] != "fixed"
+        else None
+    )
+    return fileInfo
+
+
+# ----------------------------------------
+def cleanRow(rowData, fileInfo, rowId):
+    """clean garbage values from a row's columns and give it its ROW_ID"""
+    rowData.columnValues = [
+        csv_functions.clean_value(columnName, columnValue)
+        for columnName, columnValue in zip(fileInfo["header"], rowData.columnValues)
+    ]
+
+    # --a json line's top level values are cleaned in place, nested ones are left as they are
+    if fileInfo["csvDialect"] == "json":
+        jsonData = rowData.addedValues
+        for columnName in jsonData:
+            if type(jsonData[columnName]) == str:
+                jsonData[columnName] = csv_functions.clean_value(
+                    columnName, jsonData[columnName]
+                )
+            elif jsonData[columnName] is None:
+                jsonData[columnName] = ""
+    rowData["ROW_ID"] = str(rowId)
+    return rowData
+
+
+# ----------------------------------------
+def getValue(rowData, expression):
+    try:
+        if expression in rowData:
+            # print('here')
+            rtnValue = rowData[expression]
+        else:
+            rtnValue = expression % rowData
+    except:
+        print("warning: could not map %s" % (expression,))
+        rtnValue = ""
+    return rtnValue
+
+
+# ----------------------------------------
+def compileValueGetter(expression, knownColumns, columnPositions):
+    """classify a mapping once and return the accessor that replaces getValue() for it"""
+    # --knownColumns is every rowData key, or None if a <list> calculation can add others
+    # --columnPositions are the file's columns, which are read from the row by position
+
+    # --"%(column)s" is nearly every mapping, formatting it is just str() of the column
+    if (
+        type(expression) == str
+        and expression.startswith("%(")
+        and expression.endswith(")s")
+        and expression.find(")", 2) == len(expression) - 2
+        and "%" not in expression[2:]
+    ):
+        columnName = expression[2:-2]
+        if columnName in columnPositions:
+            columnPosition = columnPositions[columnName]
+
+            def getPositionValue(rowData):
+                rtnValue = rowData.columnValues[columnPosition]
+                return rtnValue if type(rtnValue) == str else str(rtnValue)
+
+            return getPositionValue
+
+        # --a json line can leave out any of its keys, so a missing one is just empty
+        if not columnPositions:
+
+            def getJsonValue(rowData):
+                rtnValue = rowData.get(columnName, "")
+                return rtnValue if type(rtnValue) == str else str(rtnValue)
+
+            return getJsonValue
+
+        def getNamedValue(rowData):
+            try:
+                rtnValue = rowData[columnName]
+            except KeyError:
+                print("warning: could not map %s" % (expression,))
+                return ""
+            return rtnValue if type(rtnValue) == str else str(rtnValue)
+
+        return getNamedValue
+
+    # --no format specifiers, so it is either a column name or a literal
+    if type(expression) == str and "%" not in expression:
+        if expression in columnPositions:
+            columnPosition = columnPositions[expression]
+            return lambda rowData: rowData.columnValues[columnPosition]
+        if knownColumns is not None and expression not in knownColumns:
+            return lambda rowData: expression
+        return lambda rowData: rowData.get(expression, expression)
+
+    # --a real format template (or something odd) goes through getValue
+    return lambda rowData: getValue(rowData, expression)
+
+
+# ----------------------------------------
+def compileProjectionPlan(mappingDoc, columnHeaders):
+    """build the accessors and position-indexed statistics for each enabled output"""
+
+    # --the columns every row will have, unless a <list> calculation can add its own
+    # --or there is no header as json lines can have any keys
+    columnPositions = getColumnPositions(columnHeaders)
+    knownColumns = set(columnPositions) if columnHeaders else None
+    for newAttribute, calcCode in mappingDoc["calculationList"]:
+        if knownColumns is None or newAttribute == "<list>":
+            knownColumns = None
+            break
+        knownColumns.add(newAttribute)
+    if knownColumns is not None:
+        knownColumns.add("ROW_ID")
+
+    mappingDoc["enabledOutputs"] = []
+    for i in range(len(mappingDoc["outputs"])):
+        outputDoc = mappingDoc["outputs"][i]
+        if "enabled" in outputDoc and outputDoc["enabled"].upper().startswith("N"):
+            continue
+        mappingDoc["enabledOutputs"].append(i)
+
+        for key in ("data_source", "record_type", "entity_key", "record_id"):
+            if key in outputDoc:
+                outputDoc[key + "_getter"] = compileValueGetter(
+                    outputDoc[key], knownColumns, columnPositions
+                )
+
+        # --attributes sharing a name (different labels) share a statistics slot
+        statSlots = {}
+        outputDoc["attributeList"] = []
+        for attrDict in outputDoc["attributes"]:
+            if attrDict["attribute"] == "<ignore>":
+                continue
+            if attrDict["attribute"] not in statSlots:
+                statSlots[attrDict["attribute"]] = len(statSlots)
+            outputDoc["attributeList"].append(
+                (
+                    compileValueGetter(
+                        attrDict["mapping"], knownColumns, columnPositions
+                    ),
+                    statSlots[attrDict["attribute"]],
+                    attrDict["subList"] if "subList" in attrDict else None,
+                    attrDict["label_attribute"],
+                )
+            )
+        outputDoc["statSlots"] = statSlots
+        outputDoc["statCounts"] = [0] * len(statSlots)
+
+
+# ----------------------------------------
+def getMappingLineNumber(mappingText, expression):
+    """find the line of the mapping file an expression was read from"""
+    for ensureAscii in (True, False):
+        charPos = mappingText.find(json.dumps(expression, ensure_ascii=ensureAscii))
+        if charPos >= 0:
+            return mappingText.count("\n", 0, charPos) + 1
+    return None
+
+
+# ----------------------------------------
+def compileExpression(expression, location, mappingText):
+    """compile a calculation or filter expression once so it is not re-parsed per row"""
+    lineNumber = getMappingLineNumber(mappingText, expression)
+    if lineNumber:
+        location += " at line %s of %s" % (lineNumber, mappingFileName)
+    try:
+        return compile(expression, "<%s>" % location, "eval")
+    except (SyntaxError, ValueError, TypeError) as err:
+        print(
+            "%s does not compile: %s [%s]"
+            % (location, expression, getattr(err, "msg", err))
+        )
+    return None
+
+
+# ----------------------------------------
+def compileMappingPlan(mappingDoc, mappingText):
+    """compile the calculations and output filters, returns the error count"""
+    errorCnt = 0
+
+    mappingDoc["calculationList"] = []
+    for i in range(len(mappingDoc.get("calculations", []))):
+        calcDict = mappingDoc["calculations"][i]
+        newAttribute = list(calcDict.keys())[0]
+        newExpression = list(calcDict.values())[0]
+        calcCode = compileExpression(
+            newExpression, "calculation %s (%s)" % (i, newAttribute), mappingText
+        )
+        if not calcCode:
+            errorCnt += 1
+        mappingDoc["calculationList"].append((newAttribute, calcCode))
+
+    for i in range(len(mappingDoc["outputs"])):
+        if "enabled" in mappingDoc["outputs"][i] and mappingDoc["outputs"][i][
+            "enabled"
+        ].upper().startswith("N"):
+            continue
+        if "filter" in mappingDoc["outputs"][i]:
+            filterCode = compileExpression(
+                mappingDoc["outputs"][i]["filter"],
+                "filter for output %s" % i,
+                mappingText,
+            )
+            if not filterCode:
+                errorCnt += 1
+            mappingDoc["outputs"][i]["filterCode"] = filterCode
+
+    # --the only names calculations and filters can see besides the builtins
+    mappingDoc["evalNamespace"] = {
+        "__builtins__": builtins,
+        "csv_functions": csv_functions,
+        "datetime": datetime,
+        "timedelta": timedelta,
+        "json": json,
+        "rowData": None,
+    }
+
+    return errorCnt
+
+
+# ----------------------------------------
+def isRowIdUsed(mappingDoc, mappingText, pythonMapperClass):
+    """see if the mapping can see the ROW_ID, either by name or by using the whole row"""
+    if pythonMapperClass or "ROW_ID" in mappingText:
+        return True
+    expressionList = [
+        list(calcDict.values())[0] for calcDict in mappingDoc.get("calculations", [])
+    ]
+    expressionList += [
+        outputDoc["filter"]
+        for outputDoc in mappingDoc["outputs"]
+        if "filter" in outputDoc
+    ]
+    for expression in expressionList:
+        if re.search(r"\browData\b(?!\s*\[)", expression):
+            return True
+    return False
+
+
+# ----------------------------------------
+def loadMappingDoc():
+    """load the python module or mapping file and prepare its outputs for mapping"""
+
+    # --check if mapped via python class first
+    pythonMapperClass = None
+    if pythonModuleFile:
+        if not os.path.exists(pythonModuleFile):
+            print("%s does not exist" % mappingFileName)
+            return None, None
+        pythonMapper = SourceFileLoader(
+            pythonModuleFile, pythonModuleFile
+        ).load_module()
+        pythonMapperClass = pythonMapper.mapper()
+        with open(pythonModuleFile, "r") as f:
+            mappingText = f.read()
+
+        mappingDoc = {}
+        mappingDoc["input"] = {}
+        # mappingDoc['fileEncoding'] = fileEncoding
+
+    # --read the mapping file
+    else:
+        if not os.path.exists(mappingFileName):
+            print("%s does not exist" % mappingFileName)
+            return None, None
+
+        try:
+            with open(mappingFileName, "r") as f:
+                mappingText = f.read()
+            mappingDoc = json.loads(mappingText)
+        except ValueError as err:
+            print()
+            print("mapping file error: %s in %s" % (err, mappingFileName))
+            return None, None
+
+    # --command line overrides
+    if fileEncoding:
+        mappingDoc["input"]["fileEncoding"] = fileEncoding
+    if fieldDelimiter:
+        mappingDoc["input"]["fieldDelimiter"] = fieldDelimiter
+
+    # --a fixed width layout names the columns, there is no header row or delimiter
+    if "fixedWidth" in mappingDoc["input"]:
+        errorList = csv_reader.checkFixedWidth(mappingDoc["input"]["fixedWidth"])
+        if errorList:
+            print()
+            for errorMessage in errorList:
+                print("mapping file error: %s in %s" % (errorMessage, mappingFileName))
+            return None, None
+        mappingDoc["input"]["fieldDelimiter"] = "FIXED"
+        mappingDoc["input"]["columnHeaders"] = [
+            columnDict["column"] for columnDict in mappingDoc["input"]["fixedWidth"]
+        ]
+
+    # --initialize stats for python class mapper
+    if "outputs" not in mappingDoc:
+        mappingDoc["outputs"] = []
+    else:
+
+        # --validate all outputs
+        errorCnt = 0
+        for i in range(len(mappingDoc["outputs"])):
+            if "enabled" in mappingDoc["outputs"][i] and mappingDoc["outputs"][i][
+                "enabled"
+            ].upper().startswith("N"):
+                continue
+
+            mappingDoc["outputs"][i]["rowsWritten"] = 0
+            mappingDoc["outputs"][i]["rowsSkipped"] = 0
+            mappingDoc["outputs"][i]["ignoredList"] = []
+            mappingDoc["outputs"][i]["statistics"] = {}
+
+            # --ensure uniqueness of attributes, especially if using labels (usage types)
+            aggregate = False
+            labelAttrList = []
+            for i1 in range(len(mappingDoc["outputs"][i]["attributes"])):
+                if (
+                    mappingDoc["outputs"][i]["attributes"][i1]["attribute"]
+                    == "<ignore>"
+                ):
+                    if "mapping" in mappingDoc["outputs"][i]["attributes"][i1]:
+                        mappingDoc["outputs"][i]["ignoredList"].append(
+                            mappingDoc["outputs"][i]["attributes"][i1]["mapping"]
+                            .replace("%(", "")
+                            .replace(")s", "")
+                        )
+                    continue
+                mappingDoc["outputs"][i]["statistics"][
+                    mappingDoc["outputs"][i]["attributes"][i1]["attribute"]
+                ] = 0
+
+                if "label" in mappingDoc["outputs"][i]["attributes"][i1]:
+                    mappingDoc["outputs"][i]["attributes"][i1]["label_attribute"] = (
+                        mappingDoc["outputs"][i]["attributes"][i1]["label"].replace(
+                            "_", "-"
+                        )
+                        + "_"
+                    )
+                else:
+                    mappingDoc["outputs"][i]["attributes"][i1]["label_attribute"] = ""
+                mappingDoc["outputs"][i]["attributes"][i1][
+                    "label_attribute"
+                ] += mappingDoc["outputs"][i]["attributes"][i1]["attribute"]
+                if (
+                    mappingDoc["outputs"][i]["attributes"][i1]["label_attribute"]
+                    in labelAttrList
+                ):
+                    errorCnt += 1
+                    print(
+                        "attribute %s (%s) is duplicated for output %s!"
+                        % (
+                            i1,
+                            mappingDoc["outputs"][i]["attributes"][i1][
+                                "label_attribute"
+                            ],
+                            i,
+                        )
+                    )
+                else:
+                    labelAttrList.append(
+                        mappingDoc["outputs"][i]["attributes"][i1]["label_attribute"]
+                    )
+
+                if "subList" in mappingDoc["outputs"][i]["attributes"][i1]:
+                    aggregate = True
+
+            mappingDoc["outputs"][i]["aggregate"] = aggregate
+        if errorCnt:
+            return None, None
+
+    # --compile calculations and filters, reporting bad expressions once here rather than on every row
+    if not pythonMapperClass and compileMappingPlan(mappingDoc, mappingText):
+        return None, None
+
+    # --row ids are numbered across all files, so parallel workers need to know if they are used
+    mappingDoc["usesRowId"] = isRowIdUsed(mappingDoc, mappingText, pythonMapperClass)
+
+    # --seconds spent in each stage of the mapping for the run report
+    mappingDoc["stageTimes"] = dict.fromkeys(stageNames, 0.0)
+
+    return mappingDoc, pythonMapperClass
+
+
+# ----------------------------------------
+def setInputDialect(currentFile, mappingDoc):
+    """set the csv dialect for a file, sniffing the delimiter if one was not supplied"""
+    if "fieldDelimiter" in mappingDoc["input"]:
+        currentFile["fieldDelimiter"] = mappingDoc["input"]["fieldDelimiter"]
+    else:
+        # --sniffed from its own handle as a decompressing one may not rewind
+        with csv_compression.openInput(
+            currentFile["name"], currentFile.get("fileEncoding")
+        ) as sniffHandle:
+            sniffer = csv.Sniffer().sniff(sniffHandle.readline(), delimiters="|,\t")
+        currentFile["fieldDelimiter"] = sniffer.delimiter
+        mappingDoc["input"]["fieldDelimiter"] = sniffer.delimiter
+    currentFile["csvDialect"] = csv_reader.getDialect(
+        mappingDoc["input"]["fieldDelimiter"]
+    )
+    currentFile["fixedWidth"] = mappingDoc["input"].get("fixedWidth")
+    return currentFile
+
+
+# ----------------------------------------
+def setInputReader(currentFile):
+    """set the reader, multi-char delimiters have their own as csv cannot split on them"""
+    currentFile["reader"] = csv_reader.getReader(
+        currentFile["handle"],
+        currentFile["csvDialect"],
+        currentFile["fieldDelimiter"],
+        currentFile["fixedWidth"],
+    )
+    return currentFile
+
+
+# ----------------------------------------
+def openInputFile(fileName, mappingDoc, checkpointRows=None):
+    """open an input file and set its dialect and reader, one that keeps its byte offset if checkpointed"""
+    currentFile = {}
+    currentFile["name"] = fileName
+    currentFile["rowCnt"] = 0
+    currentFile["skipCnt"] = 0
+
+    # --open the file, decompressing it if need be
+    if "fileEncoding" in mappingDoc["input"] and mappingDoc["input"]["fileEncoding"]:
+        currentFile["fileEncoding"] = mappingDoc["input"]["fileEncoding"]
+
+    # --an uncompressed file can be read through a memory map, which also tells how far
+    # --through the raw bytes the run is, otherwise the unbuffered file under it does
+    if (
+        memoryMap
+        and not checkpointRows
+        and csv_reader.canMapFile(fileName, currentFile.get("fileEncoding"))
+    ):
+        currentFile["handle"] = csv_reader.mapped_input(
+            fileName, currentFile.get("fileEncoding")
+        )
+        currentFile["rawHandle"] = currentFile["handle"]
+    elif checkpointRows:
+        currentFile["rawHandle"] = open(fileName, "rb", buffering=0)
+        currentFile["handle"] = offset_reader(
+            csv_compression.openBinaryInput(
+                fileName, decompressThread, currentFile["rawHandle"]
+            ),
+            currentFile.get("fileEncoding"),
+        )
+    else:
+        currentFile["rawHandle"] = open(fileName, "rb", buffering=0)
+        currentFile["handle"] = csv_compression.openInput(
+            fileName,
+            currentFile.get("fileEncoding"),
+            decompressThread,
+            currentFile["rawHandle"],
+        )
+
+    currentFile = setInputDialect(currentFile, mappingDoc)
+    return setInputReader(currentFile)
+
+
+# ----------------------------------------
+def readHeader(currentFile, mappingDoc, pythonMapperClass):
+    """get the current file header row and use it if not one already, json lines have none"""
+    if currentFile["csvDialect"] == "json":
+        currentFile = setFileHeader(currentFile, [])
+
+    # --nor does a fixed width file, its columns are named by the layout
+    elif currentFile["csvDialect"] == "fixed":
+        currentFile = setFileHeader(currentFile, mappingDoc["input"]["columnHeaders"])
+    else:
+        currentFile, currentHeaders = getNextRow(currentFile)
+        if not mappingDoc["input"]["columnHeaders"]:
+            mappingDoc["input"]["columnHeaders"] = [
+                str(x).replace(" ", "_") for x in currentHeaders
+            ]
+        currentFile = setFileHeader(currentFile, mappingDoc["input"]["columnHeaders"])
+
+    # --the header is fixed now, so the attribute accessors can be built
+    if not pythonMapperClass and "enabledOutputs" not in mappingDoc:
+        compileProjectionPlan(mappingDoc, currentFile["header"])
+    return currentFile
+
+
+# ----------------------------------------
+def mapRow(rowData, mappingDoc, pythonMapperClass, aggregator):
+    """map a cleaned row, returns the json records to write now or None if the python mapper skipped it"""
+
+    stageTimes = mappingDoc["stageTimes"]
+    startTime = time.perf_counter()
+
+    # --python mapper statistics
+    if pythonMapperClass:
+        mappedData = pythonMapperClass.map(rowData.toDict())
+        stageTimes["python_module"] += time.perf_counter() - startTime
+        if not mappedData:
+            return None
+
+        jsonList = []
+        i = 0
+        for jsonData in mappedData if type(mappedData) == list else [mappedData]:
+            if i == len(mappingDoc["outputs"]):
+                outputDict = {}
+                outputDict["rowsWritten"] = 0
+                outputDict["rowsSkipped"] = 0
+                outputDict["ignoredList"] = []
+                outputDict["statistics"] = {}
+                mappingDoc["outputs"].append(outputDict)
+            statistics = mappingDoc["outputs"][i]["statistics"]
+            removeAttrList = []
+            for attribute in jsonData:
+                if not jsonData[attribute]:
+                    removeAttrList.append(attribute)
+                else:
+                    if (
+                        type(jsonData[attribute]) != list
+                    ):  # --to help capture stats in sub-lists
+                        subList = [{attribute: jsonData[attribute]}]
+                    else:
+                        subList = jsonData[attribute]
+                    for record in subList:
+                        for attribute in record:
+                            if attribute not in statistics:
+                                statistics[attribute] = 1
+                            else:
+                                statistics[attribute] += 1
+            for attribute in removeAttrList:
+                del jsonData[attribute]
+            if jsonData:
+                jsonList.append(jsonData)
+                mappingDoc["outputs"][i]["rowsWritten"] += 1
+            i = i + 1
+        return jsonList
+
+    # --perform calculations
+    evalNamespace = mappingDoc["evalNamespace"]
+    evalNamespace["rowData"] = rowData
+    for newAttribute, calcCode in mappingDoc["calculationList"]:
+        try:
+            newValue = eval(calcCode, evalNamespace)
+        except Exception as err:
+            print("  error: %s [%s]" % (newAttribute, err))
+        else:
+            if newAttribute == "<list>":
+                if type(newValue) == list:
+                    for newItem in newValue:
+                        rowData.update(newItem)
+                else:
+                    print(
+                        "  error: %s [%s]"
+                        % (newAttribute, "expression did not return a list!")
+                    )
+            else:
+                rowData[newAttribute] = newValue
+    stageTime = time.perf_counter()
+    stageTimes["calculations"] += stageTime - startTime
+
+    # --process the record for each output
+    jsonList = []
+    for i in mappingDoc["enabledOutputs"]:
+        outputDoc = mappingDoc["outputs"][i]
+
+        if "filterCode" in outputDoc:
+            try:
+                skipRow = eval(outputDoc["filterCode"], evalNamespace)
+            except Exception as err:
+                skipRow = False
+                print(" filter error: %s [%s]" % (outputDoc["filter"], err))
+            startTime = stageTime
+            stageTime = time.perf_counter()
+            stageTimes["filters"] += stageTime - startTime
+            if skipRow:
+                outputDoc["rowsSkipped"] += 1
+                continue
+
+        dataSource = outputDoc["data_source_getter"](rowData)
+        if "record_type_getter" in outputDoc:
+            recordType = outputDoc["record_type_getter"](rowData)
+        else:
+            recordType = dataSource
+
+        entityKey = None
+        recordID = None
+        uniqueKey = None
+        if "entity_key_getter" in outputDoc:
+            entityKey = outputDoc["entity_key_getter"](rowData)
+            uniqueKey = dataSource + "|" + entityKey
+        elif "record_id_getter" in outputDoc:
+            recordID = outputDoc["record_id_getter"](rowData)
+            uniqueKey = dataSource + "|" + recordID
+
+        rootValues = {}
+        subListValues = {}
+        statCounts = outputDoc["statCounts"]
+        for getter, statSlot, subList, labelAttribute in outputDoc["attributeList"]:
+            attrValue = getter(rowData)
+            if attrValue:
+                statCounts[statSlot] += 1
+                if subList is not None:
+                    if subList not in subListValues:
+                        subListValues[subList] = {}
+                    subListValues[subList][labelAttribute] = attrValue
+                else:
+                    rootValues[labelAttribute] = attrValue
+
+        # --complete the json record
+        jsonData = {}
+        for subList in subListValues:
+            jsonData[subList] = [subListValues[subList]]
+        jsonData["DATA_SOURCE"] = dataSource
+        jsonData["RECORD_TYPE"] = recordType
+        if entityKey:
+            jsonData["ENTITY_KEY"] = entityKey
+        elif recordID:
+            jsonData["RECORD_ID"] = recordID
+        jsonData.update(rootValues)
+
+        startTime = stageTime
+        stageTime = time.perf_counter()
+        stageTimes["projection"] += stageTime - startTime
+
+        # --just output if not aggregating
+        if not outputDoc["aggregate"]:
+            jsonList.append(jsonData)
+            outputDoc["rowsWritten"] += 1
+        else:
+            aggregator.add(uniqueKey, jsonData, i)
+            startTime = stageTime
+            stageTime = time.perf_counter()
+            stageTimes["aggregate"] += stageTime - startTime
+
+    return jsonList
+
+
+# ----------------------------------------
+def foldStatistics(mappingDoc):
+    """move the position-indexed counters back to the statistics by attribute name"""
+    for outputDoc in mappingDoc["outputs"]:
+        if "statSlots" in outputDoc:
+            for attribute, statSlot in outputDoc["statSlots"].items():
+                outputDoc["statistics"][attribute] = outputDoc["statCounts"][statSlot]
+
+
+# ----------------------------------------
+def saveCheckpoint(
+    checkpointFileName, checkpointDoc, mappingDoc, aggregator, outputWriter
+):
+    """flush the output and record how far the run has got so it can be resumed from there"""
+    checkpointDoc["outputFiles"] = outputWriter.checkpoint()
+    checkpointDoc["outputs"] = [
+        {
+            key: outputDoc[key]
+            for key in ("rowsWritten", "rowsSkipped", "statCounts", "statistics")
+            if key in outputDoc
+        }
+        for outputDoc in mappingDoc["outputs"]
+    ]
+    checkpointDoc["statPack"] = csv_functions.statPack
+    checkpointDoc["openRecords"] = list(aggregator.items())
+    checkpointDoc["checkpointTime"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    # --replaced in one step so a crash while writing cannot leave half a checkpoint
+    with open(checkpointFileName + ".tmp", "w") as f:
+        json.dump(checkpointDoc, f)
+    os.replace(checkpointFileName + ".tmp", checkpointFileName)
+
+
+# ----------------------------------------
+def restoreCheckpointStats(resumeDoc, mappingDoc):
+    """put back the statistics counted before the checkpoint"""
+    for i in range(len(resumeDoc["outputs"])):
+        if i == len(mappingDoc["outputs"]):
+            outputDict = {}
+            outputDict["rowsWritten"] = 0
+            outputDict["rowsSkipped"] = 0
+            outputDict["ignoredList"] = []
+            outputDict["statistics"] = {}
+            mappingDoc["outputs"].append(outputDict)
+        mappingDoc["outputs"][i].update(resumeDoc["outputs"][i])
+    csv_functions.statPack = resumeDoc["statPack"]
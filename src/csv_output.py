@@ -0,0 +1,224 @@
+#! /usr/bin/env python3
+import os
+import json
+import time
+import zlib
+import csv_compression
+
+try:
+    import orjson
+except:
+    orjson = None
+
+
+# ----------------------------------------
+def getRecordEncoder(jsonLibrary):
+    """returns a function that turns a record into a line of utf-8 json"""
+    stdlibEncoder = json.JSONEncoder()
+
+    def encodeStdlib(jsonData):
+        return (stdlibEncoder.encode(jsonData) + "\n").encode("utf-8")
+
+    if jsonLibrary != "orjson":
+        return encodeStdlib
+
+    def encodeOrjson(jsonData):
+        try:
+            return orjson.dumps(jsonData, option=orjson.OPT_APPEND_NEWLINE)
+        except TypeError:  # --non-string keys, huge integers and the like
+            return encodeStdlib(jsonData)
+
+    return encodeOrjson
+
+
+# ----------------------------------------
+def getOutputShard(jsonData, outputLine, shardCount):
+    """a stable shard for a record so every record for the same key lands in the same file"""
+    if "RECORD_ID" in jsonData:
+        shardKey = "%s|%s" % (jsonData.get("DATA_SOURCE", ""), jsonData["RECORD_ID"])
+    elif "ENTITY_KEY" in jsonData:
+        shardKey = "%s|%s" % (jsonData.get("DATA_SOURCE", ""), jsonData["ENTITY_KEY"])
+    else:
+        return zlib.crc32(outputLine) % shardCount
+    return zlib.crc32(shardKey.encode("utf-8")) % shardCount
+
+
+# =========================
+class output_writer:  # pylint: disable=too-many-instance-attributes
+    """buffers encoded records and writes them to the output file, or its shards, in large blocks"""
+
+    # ----------------------------------------
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        outputFileName,
+        *,
+        jsonLibrary=None,
+        compressionLevel=None,
+        shardCount=1,
+        maxShardMB=None,
+        maxShardRecords=None,
+        resumeFiles=None,
+        stageTimes=None,
+        bufferSize=1048576,
+    ):
+        self.outputFileName = outputFileName
+        self.stageTimes = stageTimes or dict.fromkeys(["serialize", "write"], 0.0)
+        self.compressionLevel = compressionLevel
+        self.encodeRecord = getRecordEncoder(jsonLibrary)
+        self.bufferSize = bufferSize
+
+        # --shard files are named after the output file, records.json.gz becomes records-003-0001.json.gz
+        self.shardCount = shardCount
+        self.maxShardBytes = maxShardMB * 1048576 if maxShardMB else None
+        self.maxShardRecords = maxShardRecords
+        self.sharded = shardCount > 1 or bool(maxShardMB or maxShardRecords)
+        self.outputDir, outputBaseName = os.path.split(outputFileName)
+        if outputBaseName.find(".") > 0:
+            outputBaseName, self.outputExtension = outputBaseName.split(".", 1)
+            self.outputExtension = "." + self.outputExtension
+        else:
+            self.outputExtension = ""
+        self.outputStem = os.path.join(self.outputDir, outputBaseName)
+        self.manifestFileName = self.outputStem + ".manifest.json"
+
+        # --a resumed run carries on from the files as they were at the checkpoint
+        self.manifest = [dict(x) for x in resumeFiles] if resumeFiles else []
+        self.shards = []
+        for shard in range(shardCount):
+            shardInfo = {"shard": shard, "part": 0, "buffer": [], "bufferedBytes": 0}
+            self.shards.append(shardInfo)
+            if resumeFiles:
+                self.resumeShardFile(shardInfo)
+            else:
+                self.openShardFile(shardInfo)
+
+    # ----------------------------------------
+    def getShardFileName(self, shard, part):
+        if not self.sharded:
+            return self.outputFileName
+        return "%s-%03d-%04d%s" % (self.outputStem, shard, part, self.outputExtension)
+
+    # ----------------------------------------
+    def openShardFile(self, shardInfo):
+        """open the next part of a shard and add it to the manifest"""
+        shardInfo["part"] += 1
+        fileName = self.getShardFileName(shardInfo["shard"], shardInfo["part"])
+        shardInfo["handle"] = csv_compression.openOutput(
+            fileName, self.compressionLevel
+        )
+
+        # --bytes are counted before any compression
+        shardInfo["fileInfo"] = {
+            "fileName": os.path.basename(fileName),
+            "shard": shardInfo["shard"],
+            "part": shardInfo["part"],
+            "records": 0,
+            "bytes": 0,
+        }
+        self.manifest.append(shardInfo["fileInfo"])
+
+    # ----------------------------------------
+    def resumeShardFile(self, shardInfo):
+        """reopen a shard's last file at its checkpoint size, dropping anything written since"""
+        shardInfo["fileInfo"] = [
+            x for x in self.manifest if x["shard"] == shardInfo["shard"]
+        ][-1]
+        shardInfo["part"] = shardInfo["fileInfo"]["part"]
+
+        nextPart = shardInfo["part"] + 1
+        while self.sharded and os.path.exists(
+            self.getShardFileName(shardInfo["shard"], nextPart)
+        ):
+            os.remove(self.getShardFileName(shardInfo["shard"], nextPart))
+            nextPart += 1
+
+        fileName = os.path.join(self.outputDir, shardInfo["fileInfo"]["fileName"])
+        with open(fileName, "r+b") as f:
+            f.truncate(shardInfo["fileInfo"]["bytes"])
+        shardInfo["handle"] = open(fileName, "ab")
+
+    # ----------------------------------------
+    def write(self, jsonData):
+        startTime = time.perf_counter()
+        outputLine = self.encodeRecord(jsonData)
+        self.stageTimes["serialize"] += time.perf_counter() - startTime
+        if self.shardCount > 1:
+            self.writeLines(
+                getOutputShard(jsonData, outputLine, self.shardCount), [outputLine]
+            )
+        else:
+            self.writeLines(0, [outputLine])
+
+    # ----------------------------------------
+    def writeLines(self, shard, outputLines):
+        """add encoded records to a shard's buffer, moving on to its next file when one is full"""
+        shardInfo = self.shards[shard]
+        fileInfo = shardInfo["fileInfo"]
+        for outputLine in outputLines:
+            if fileInfo["records"] and (
+                (self.maxShardRecords and fileInfo["records"] >= self.maxShardRecords)
+                or (self.maxShardBytes and fileInfo["bytes"] >= self.maxShardBytes)
+            ):
+                self.flush(shardInfo)
+                shardInfo["handle"].close()
+                self.openShardFile(shardInfo)
+                fileInfo = shardInfo["fileInfo"]
+            shardInfo["buffer"].append(outputLine)
+            shardInfo["bufferedBytes"] += len(outputLine)
+            fileInfo["records"] += 1
+            fileInfo["bytes"] += len(outputLine)
+        if shardInfo["bufferedBytes"] >= self.bufferSize:
+            self.flush(shardInfo)
+
+    # ----------------------------------------
+    def writeBytes(self, outputBytes):
+        """add a block of encoded records when the output is not sharded"""
+        shardInfo = self.shards[0]
+        shardInfo["buffer"].append(outputBytes)
+        shardInfo["bufferedBytes"] += len(outputBytes)
+        shardInfo["fileInfo"]["records"] += outputBytes.count(b"\n")
+        shardInfo["fileInfo"]["bytes"] += len(outputBytes)
+        if shardInfo["bufferedBytes"] >= self.bufferSize:
+            self.flush(shardInfo)
+
+    # ----------------------------------------
+    def flush(self, shardInfo):
+        if shardInfo["buffer"]:
+            startTime = time.perf_counter()
+            shardInfo["handle"].write(b"".join(shardInfo["buffer"]))
+            shardInfo["buffer"] = []
+            shardInfo["bufferedBytes"] = 0
+            self.stageTimes["write"] += time.perf_counter() - startTime
+
+    # ----------------------------------------
+    def getRecordCount(self):
+        return sum(x["records"] for x in self.manifest)
+
+    # ----------------------------------------
+    def checkpoint(self):
+        """write out everything buffered, returns the files and their sizes to resume from"""
+        for shardInfo in self.shards:
+            self.flush(shardInfo)
+            shardInfo["handle"].flush()
+            os.fsync(shardInfo["handle"].fileno())
+        return [dict(x) for x in self.manifest]
+
+    # ----------------------------------------
+    def close(self):
+        """flush and close every file, then list them in the manifest if sharded"""
+        try:
+            for shardInfo in self.shards:
+                self.flush(shardInfo)
+        finally:
+            for shardInfo in self.shards:
+                shardInfo["handle"].close()
+
+        if self.sharded:
+            manifestDoc = {}
+            manifestDoc["outputFileName"] = self.outputFileName
+            manifestDoc["shardCount"] = self.shardCount
+            manifestDoc["shardKey"] = "DATA_SOURCE|RECORD_ID"
+            manifestDoc["records"] = sum(x["records"] for x in self.manifest)
+            manifestDoc["files"] = self.manifest
+            with open(self.manifestFileName, "w") as f:
+                json.dump(manifestDoc, f, indent=4)
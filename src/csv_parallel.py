@@ -0,0 +1,507 @@
+#! /usr/bin/env python3
+import os
+import signal
+import time
+import io
+import collections
+import concurrent.futures
+from csv_aggregator import csv_aggregator, sorted_aggregator
+from csv_profiler import csv_profiler
+import csv_functions as csv_functions_module
+import csv_mapping
+import csv_output
+import csv_reader
+import csv_index
+
+# --set in each worker process by initMappingWorker
+workerMapping = None
+sortedByKey = False
+encodeRecord = None
+outputShards = None
+profileSample = None
+
+# --set by the mapper when it is interrupted, so no more chunks are handed out
+shutDown = False
+
+
+# ----------------------------------------
+def openFileChunk(chunkInfo):
+    """open a byte range of an input file as if it were the whole file"""
+    currentFile = {}
+    currentFile["name"] = chunkInfo["fileName"]
+    currentFile["rowCnt"] = 0
+    currentFile["skipCnt"] = 0
+    currentFile["fieldDelimiter"] = chunkInfo["fieldDelimiter"]
+    currentFile["csvDialect"] = chunkInfo["csvDialect"]
+    currentFile["fixedWidth"] = chunkInfo["fixedWidth"]
+
+    # --mapped, the worker reads its range straight from the page cache a block at a time
+    if csv_mapping.memoryMap:
+        currentFile["handle"] = csv_reader.mapped_input(
+            chunkInfo["fileName"],
+            chunkInfo["fileEncoding"],
+            chunkInfo["chunkStart"],
+            chunkInfo["chunkEnd"],
+        )
+    else:
+        with open(chunkInfo["fileName"], "rb") as f:
+            f.seek(chunkInfo["chunkStart"])
+            chunkBytes = f.read(chunkInfo["chunkEnd"] - chunkInfo["chunkStart"])
+        currentFile["handle"] = io.TextIOWrapper(
+            io.BytesIO(chunkBytes), encoding=chunkInfo["fileEncoding"]
+        )
+    csv_reader.getDialect(chunkInfo["fieldDelimiter"])
+    currentFile = csv_mapping.setInputReader(currentFile)
+
+    # --the first chunk of a csv file starts with its header row
+    if chunkInfo["chunkStart"] == 0 and chunkInfo["csvDialect"] not in (
+        "json",
+        "fixed",
+    ):
+        currentFile, currentHeaders = csv_mapping.getNextRow(currentFile)
+    return csv_mapping.setFileHeader(currentFile, chunkInfo["header"])
+
+
+# ----------------------------------------
+def initMappingWorker(workerParms):
+    """load the mapping plan into a worker process"""
+    global sortedByKey, workerMapping, encodeRecord, outputShards, profileSample
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    csv_mapping.setOptions(
+        dict(workerParms, csv_functions=csv_functions_module.csv_functions())
+    )
+    sortedByKey = workerParms["sortedByKey"]
+    encodeRecord = csv_output.getRecordEncoder(workerParms["jsonLibrary"])
+    outputShards = workerParms["outputShards"]
+    profileSample = workerParms["profileSample"]
+    workerMapping = csv_mapping.loadMappingDoc()
+
+
+# ----------------------------------------
+def countChunkRows(chunkInfo):
+    """count the good rows in a chunk so row ids can be numbered as if run serially"""
+    currentFile = openFileChunk(chunkInfo)
+    rowCnt = 0
+    while True:
+        currentFile, rowData = csv_mapping.getNextRow(currentFile)
+        if not rowData or "ERROR" in currentFile:
+            break
+        rowCnt += 1
+    currentFile["handle"].close()
+    return rowCnt
+
+
+# ----------------------------------------
+def mapChunk(chunkInfo):
+    """map a chunk in a worker process, returns its output and statistics for merging"""
+    mappingDoc, pythonMapperClass = workerMapping
+    if not pythonMapperClass and "enabledOutputs" not in mappingDoc:
+        csv_mapping.compileProjectionPlan(mappingDoc, chunkInfo["header"])
+
+    # --statistics are returned per chunk so start them over
+    csv_mapping.csv_functions.statPack = {}
+    if pythonMapperClass:
+        mappingDoc["outputs"] = []
+    for outputDoc in mappingDoc["outputs"]:
+        if "rowsWritten" in outputDoc:
+            outputDoc["rowsWritten"] = 0
+            outputDoc["rowsSkipped"] = 0
+            outputDoc["statCounts"] = [0] * len(outputDoc["statSlots"])
+    stageTimes = mappingDoc["stageTimes"] = dict.fromkeys(csv_mapping.stageNames, 0.0)
+    aggregator = sorted_aggregator() if sortedByKey else csv_aggregator()
+    aggregatedList = []
+    chunkProfiler = csv_profiler(None, profileSample) if profileSample else None
+
+    currentFile = openFileChunk(chunkInfo)
+    totalRowCnt = chunkInfo["firstRowId"] - 1
+    outputLines = [[] for i in range(outputShards)] if outputShards else []
+    while True:
+        if chunkProfiler:
+            chunkProfiler.nextRow()
+        startTime = time.perf_counter()
+        currentFile, rowData = csv_mapping.getNextRow(currentFile)
+        stageTime = time.perf_counter()
+        stageTimes["read"] += stageTime - startTime
+        if not rowData:
+            break
+
+        totalRowCnt += 1
+        rowData = csv_mapping.cleanRow(rowData, currentFile, totalRowCnt)
+        stageTimes["clean"] += time.perf_counter() - stageTime
+
+        jsonList = csv_mapping.mapRow(
+            rowData, mappingDoc, pythonMapperClass, aggregator
+        )
+
+        # --closed records go back with the open ones as a key may continue in the next chunk
+        aggregatedList.extend(aggregator.popClosedRecords())
+        if aggregator.orderError:
+            break
+
+        if jsonList is None:
+            currentFile["skipCnt"] += 1
+            continue
+        startTime = time.perf_counter()
+        for jsonData in jsonList:
+            outputLine = encodeRecord(jsonData)
+            if outputShards:
+                outputLines[
+                    csv_output.getOutputShard(jsonData, outputLine, outputShards)
+                ].append(outputLine)
+            else:
+                outputLines.append(outputLine)
+        stageTimes["serialize"] += time.perf_counter() - startTime
+
+        if "ERROR" in currentFile:
+            break
+    currentFile["handle"].close()
+
+    csv_mapping.foldStatistics(mappingDoc)
+    chunkResult = {}
+    chunkResult["chunkNum"] = chunkInfo["chunkNum"]
+    chunkResult["rowCnt"] = currentFile["rowCnt"]
+    chunkResult["skipCnt"] = currentFile["skipCnt"]
+    chunkResult["error"] = "ERROR" in currentFile
+    chunkResult["outputBytes"] = b"".join(outputLines) if not outputShards else None
+    chunkResult["outputShards"] = outputLines if outputShards else None
+    chunkResult["outputs"] = [
+        {
+            "rowsWritten": outputDoc.get("rowsWritten", 0),
+            "rowsSkipped": outputDoc.get("rowsSkipped", 0),
+            "statistics": outputDoc.get("statistics", {}),
+        }
+        for outputDoc in mappingDoc["outputs"]
+    ]
+    chunkResult["aggregated"] = aggregatedList + list(aggregator.items())
+    chunkResult["orderError"] = aggregator.orderError
+    chunkResult["statPack"] = csv_mapping.csv_functions.statPack
+    chunkResult["stageTimes"] = stageTimes
+    chunkResult["profile"] = chunkProfiler.getStats() if chunkProfiler else None
+    return chunkResult
+
+
+# ----------------------------------------
+def mergeChunkResult(chunkResult, mappingDoc, aggregator, profiler):
+    """add a worker's chunk statistics and aggregated records to the run totals"""
+    for i in range(len(chunkResult["outputs"])):
+        chunkOutput = chunkResult["outputs"][i]
+        if i == len(mappingDoc["outputs"]):
+            outputDict = {}
+            outputDict["rowsWritten"] = 0
+            outputDict["rowsSkipped"] = 0
+            outputDict["ignoredList"] = []
+            outputDict["statistics"] = {}
+            mappingDoc["outputs"].append(outputDict)
+        outputDoc = mappingDoc["outputs"][i]
+        if "rowsWritten" not in outputDoc:  # --disabled
+            continue
+
+        outputDoc["rowsWritten"] += chunkOutput["rowsWritten"]
+        outputDoc["rowsSkipped"] += chunkOutput["rowsSkipped"]
+        for attribute in chunkOutput["statistics"]:
+            if "statSlots" in outputDoc:
+                outputDoc["statCounts"][
+                    outputDoc["statSlots"][attribute]
+                ] += chunkOutput["statistics"][attribute]
+            elif attribute not in outputDoc["statistics"]:
+                outputDoc["statistics"][attribute] = chunkOutput["statistics"][
+                    attribute
+                ]
+            else:
+                outputDoc["statistics"][attribute] += chunkOutput["statistics"][
+                    attribute
+                ]
+
+    for uniqueKey, i, jsonData in chunkResult["aggregated"]:
+        aggregator.add(uniqueKey, jsonData, i)
+
+    csv_mapping.csv_functions.mergeStatPack(chunkResult["statPack"])
+    for stageName in chunkResult["stageTimes"]:
+        mappingDoc["stageTimes"][stageName] += chunkResult["stageTimes"][stageName]
+    if chunkResult["profile"]:
+        profiler.addStats(chunkResult["profile"])
+
+
+# ----------------------------------------
+def processFilesParallel(  # pylint: disable=too-many-arguments
+    fileList,
+    mappingDoc,
+    pythonMapperClass,
+    *,
+    aggregator,
+    outputWriter,
+    runReport,
+    workerCount,
+    unorderedOutput=False,
+    sortedByKey=False,
+    jsonLibrary=None,
+    checkpointDoc=None,
+    resumeDoc=None,
+    checkpointRows=None,
+    checkpointFileName=None,
+    firstRow=None,
+    lastRow=None,
+    profiler=None,
+):
+    """map the input files in byte-range chunks across a pool of worker processes"""
+    global shutDown
+
+    # --split each file into chunks aligned to record boundaries
+    chunkList = []
+    fileStats = {}
+    for fileName in fileList:
+        print("")
+        print("Splitting %s ..." % fileName)
+        currentFile = csv_mapping.openInputFile(fileName, mappingDoc)
+        currentFile = csv_mapping.readHeader(currentFile, mappingDoc, pythonMapperClass)
+        currentFile["handle"].close()
+
+        chunkSize = min(
+            max(os.path.getsize(fileName) // (workerCount * 4), 1048576), 67108864
+        )
+        fileStats[fileName] = {
+            "rowCnt": 0,
+            "skipCnt": 0,
+            "rangeRowCnt": 0,
+            "rangeSkipCnt": 0,
+        }
+        rangeStart = 0
+        rangeEnd = os.path.getsize(fileName)
+        if resumeDoc and fileName == resumeDoc["fileName"]:
+            rangeStart = resumeDoc["byteOffset"]
+            runReport.skipInput(rangeStart)
+            fileStats[fileName]["rowCnt"] = resumeDoc["rowCnt"]
+            fileStats[fileName]["skipCnt"] = resumeDoc["skipCnt"]
+
+        # --a row range, or a file already indexed, is split at its indexed rows without reading it
+        if firstRow or lastRow:
+            indexDoc = csv_index.getIndex(
+                fileName, currentFile["fieldDelimiter"], currentFile.get("fileEncoding")
+            )
+            if not indexDoc:
+                shutDown = True
+                return -1
+            rangeStart, rangeEnd = csv_index.getRowRange(
+                fileName, indexDoc, firstRow, lastRow
+            )
+            runReport.skipInput(os.path.getsize(fileName) - (rangeEnd - rangeStart))
+            fileStats[fileName]["rowCnt"] = (
+                currentFile["rowCnt"] + max(firstRow or 1, 1) - 1
+            )
+            fileStats[fileName]["skipCnt"] = currentFile["skipCnt"]
+
+            # --the rows are numbered from the start of the file, but just the range is reported
+            fileStats[fileName]["rangeRowCnt"] = fileStats[fileName]["rowCnt"]
+            fileStats[fileName]["rangeSkipCnt"] = fileStats[fileName]["skipCnt"]
+        else:
+            indexDoc = csv_index.loadIndex(
+                fileName, currentFile["fieldDelimiter"], currentFile.get("fileEncoding")
+            )
+        if indexDoc:
+            fileChunks = csv_index.getFileChunks(
+                indexDoc, chunkSize, rangeStart, rangeEnd
+            )
+        else:
+            fileChunks = csv_reader.getFileChunks(
+                fileName, currentFile, chunkSize, rangeStart
+            )
+        for chunkStart, chunkEnd in fileChunks:
+            chunkInfo = {}
+            chunkInfo["chunkNum"] = len(chunkList)
+            chunkInfo["fileName"] = fileName
+            chunkInfo["chunkStart"] = chunkStart
+            chunkInfo["chunkEnd"] = chunkEnd
+            chunkInfo["fileEncoding"] = currentFile.get("fileEncoding")
+            chunkInfo["fieldDelimiter"] = currentFile["fieldDelimiter"]
+            chunkInfo["csvDialect"] = currentFile["csvDialect"]
+            chunkInfo["fixedWidth"] = currentFile["fixedWidth"]
+            chunkInfo["header"] = currentFile["header"]
+            chunkInfo["firstRowId"] = 1
+            chunkList.append(chunkInfo)
+        fileStats[fileName]["chunks"] = len(fileChunks)
+        print(" %s chunks" % len(fileChunks))
+
+    # --the statistics are put back once the headers have set up the counters
+    if resumeDoc:
+        csv_mapping.restoreCheckpointStats(resumeDoc, mappingDoc)
+
+    workerParms = {}
+    workerParms["mappingFileName"] = csv_mapping.mappingFileName
+    workerParms["pythonModuleFile"] = csv_mapping.pythonModuleFile
+    workerParms["fieldDelimiter"] = csv_mapping.fieldDelimiter
+    workerParms["fileEncoding"] = csv_mapping.fileEncoding
+    workerParms["sortedByKey"] = sortedByKey
+    workerParms["jsonLibrary"] = jsonLibrary
+    workerParms["outputShards"] = (
+        outputWriter.shardCount if outputWriter.sharded else None
+    )
+    workerParms["profileSample"] = profiler.sampleRate if profiler else None
+    workerParms["headerCheck"] = csv_mapping.headerCheck
+    workerParms["memoryMap"] = csv_mapping.memoryMap
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workerCount,
+        initializer=initMappingWorker,
+        initargs=(workerParms,),
+    ) as executor:
+
+        # --row ids continue across chunks and files so count each chunk's rows first
+        if mappingDoc["usesRowId"]:
+            print("")
+            print("Counting rows for ROW_ID ...")
+            totalRowCnt = resumeDoc["totalRowCnt"] if resumeDoc else 0
+            if firstRow:
+                totalRowCnt = firstRow - 1
+            for chunkInfo, rowCnt in zip(
+                chunkList, executor.map(countChunkRows, chunkList)
+            ):
+                chunkInfo["firstRowId"] = totalRowCnt + 1
+                chunkInfo["rowIdCnt"] = rowCnt
+                totalRowCnt += rowCnt
+
+        # --keep a bounded number of chunks in flight so results cannot pile up in memory
+        print("")
+        print(
+            "Mapping %s chunks with %s workers (%s output) ..."
+            % (
+                len(chunkList),
+                workerCount,
+                "unordered" if unorderedOutput else "ordered",
+            )
+        )
+        pendingChunks = collections.deque()
+        nextChunk = 0
+        errorFiles = set()
+        checkpointRowCnt = 0
+        runRowCnt = 0
+        runReport.workerCount = workerCount
+        while nextChunk < len(chunkList) or pendingChunks:
+            while (
+                nextChunk < len(chunkList)
+                and len(pendingChunks) < workerCount * 2
+                and not shutDown
+            ):
+                pendingChunks.append(executor.submit(mapChunk, chunkList[nextChunk]))
+                nextChunk += 1
+            if not pendingChunks:
+                break
+
+            if unorderedOutput:
+                doneChunks, notDone = concurrent.futures.wait(
+                    pendingChunks, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                doneChunks = list(doneChunks)
+                for future in doneChunks:
+                    pendingChunks.remove(future)
+            else:
+                doneChunks = [pendingChunks.popleft()]
+
+            for future in doneChunks:
+                chunkResult = future.result()
+                chunkInfo = chunkList[chunkResult["chunkNum"]]
+                fileName = chunkInfo["fileName"]
+
+                # --a file stops at its first chunk with too many errors, just like a serial run
+                if fileName in errorFiles:
+                    continue
+                if chunkResult["error"]:
+                    errorFiles.add(fileName)
+
+                try:
+                    if chunkResult["outputShards"]:
+                        for shard in range(len(chunkResult["outputShards"])):
+                            outputWriter.writeLines(
+                                shard, chunkResult["outputShards"][shard]
+                            )
+                    else:
+                        outputWriter.writeBytes(chunkResult["outputBytes"])
+                except IOError as err:
+                    print("")
+                    print(
+                        "Could no longer write to %s \n%s"
+                        % (outputWriter.outputFileName, err)
+                    )
+                    shutDown = True
+                    break
+                mergeChunkResult(chunkResult, mappingDoc, aggregator, profiler)
+
+                # --with sorted input the records closed so far can be written now
+                for uniqueKey, owner, jsonData in aggregator.popClosedRecords():
+                    mappingDoc["outputs"][owner]["rowsWritten"] += 1
+                    try:
+                        outputWriter.write(jsonData)
+                    except IOError as err:
+                        print("")
+                        print(
+                            "Could no longer write to %s \n%s"
+                            % (outputWriter.outputFileName, err)
+                        )
+                        shutDown = True
+                        break
+                orderError = chunkResult["orderError"] or aggregator.orderError
+                if orderError:
+                    print("")
+                    print("%s in %s" % (orderError, fileName))
+                    print("sort the input by key or run without --sortedByKey")
+                    shutDown = True
+
+                fileStats[fileName]["chunks"] -= 1
+                fileStats[fileName]["rowCnt"] += chunkResult["rowCnt"]
+                fileStats[fileName]["skipCnt"] += chunkResult["skipCnt"]
+                runRowCnt += chunkResult["rowCnt"]
+                runReport.finishInput(chunkInfo["chunkEnd"] - chunkInfo["chunkStart"])
+                runReport.update(runRowCnt, outputWriter.getRecordCount())
+
+                # --chunks are merged in order, so the end of this one is a safe restart point
+                checkpointRowCnt += chunkResult["rowCnt"]
+                if (
+                    checkpointRows
+                    and checkpointRowCnt >= checkpointRows
+                    and fileName not in errorFiles
+                    and not shutDown
+                ):
+                    checkpointDoc["fileName"] = fileName
+                    checkpointDoc["byteOffset"] = chunkInfo["chunkEnd"]
+                    checkpointDoc["rowCnt"] = fileStats[fileName]["rowCnt"]
+                    checkpointDoc["skipCnt"] = fileStats[fileName]["skipCnt"]
+                    checkpointDoc["totalRowCnt"] = (
+                        chunkInfo["firstRowId"] - 1 + (chunkInfo.get("rowIdCnt", 0))
+                    )
+                    try:
+                        csv_mapping.saveCheckpoint(
+                            checkpointFileName,
+                            checkpointDoc,
+                            mappingDoc,
+                            aggregator,
+                            outputWriter,
+                        )
+                    except IOError as err:
+                        print("")
+                        print(
+                            "Could not write checkpoint %s \n%s"
+                            % (checkpointFileName, err)
+                        )
+                        shutDown = True
+                    checkpointRowCnt = 0
+                print(
+                    " %s rows processed, %s rows skipped%s"
+                    % (
+                        fileStats[fileName]["rowCnt"]
+                        - fileStats[fileName]["rangeRowCnt"],
+                        fileStats[fileName]["skipCnt"]
+                        - fileStats[fileName]["rangeSkipCnt"],
+                        (
+                            ", %s complete!" % fileName
+                            if fileStats[fileName]["chunks"] == 0
+                            or fileName in errorFiles
+                            else runReport.getProgress()
+                        ),
+                    )
+                )
+
+            if shutDown:
+                for future in pendingChunks:
+                    future.cancel()
+                break
+
+    return 0 if not shutDown else -1
@@ -0,0 +1,143 @@
+#! /usr/bin/env python3
+import os
+import io
+import cProfile
+import pstats
+
+
+# =========================
+class profile_stats:  # pylint: disable=too-few-public-methods
+    """profile statistics from a worker in the form pstats can load"""
+
+    # --pstats only needs create_stats and the stats it fills in, so this has no other methods
+
+    # ----------------------------------------
+    def __init__(self, stats):
+        self.stats = stats
+
+    # ----------------------------------------
+    def create_stats(self):
+        pass
+
+
+# =========================
+class csv_profiler:  # pylint: disable=too-many-instance-attributes
+
+    # ----------------------------------------
+    def __init__(self, profileFileName, sampleRate=1, topCount=25, sourceFiles=None):
+        self.profileFileName = profileFileName
+        self.summaryFileName = (
+            os.path.splitext(profileFileName)[0] + "-summary.txt"
+            if profileFileName
+            else None
+        )
+        self.sampleRate = max(sampleRate or 1, 1)
+        self.topCount = topCount
+        self.sourceFiles = [os.path.abspath(x) for x in sourceFiles or [] if x]
+
+        self.profiler = cProfile.Profile()
+        self.active = False
+        self.rowCnt = 0
+        self.sampledRows = 0
+        self.workerStats = []
+
+    # ----------------------------------------
+    def nextRow(self):
+        """called before each row is read, only every sampleRate'th row is profiled"""
+        self.rowCnt += 1
+        if self.rowCnt % self.sampleRate == 0:
+            if not self.active:
+                self.profiler.enable()
+                self.active = True
+            self.sampledRows += 1
+        elif self.active:
+            self.profiler.disable()
+            self.active = False
+
+    # ----------------------------------------
+    def stop(self):
+        if self.active:
+            self.profiler.disable()
+            self.active = False
+
+    # ----------------------------------------
+    def getStats(self):
+        """the raw statistics, for a worker to hand back to the main process"""
+        self.stop()
+        self.profiler.create_stats()
+        return {"stats": self.profiler.stats, "sampledRows": self.sampledRows}
+
+    # ----------------------------------------
+    def addStats(self, workerStats):
+        if workerStats["stats"]:
+            self.workerStats.append(profile_stats(workerStats["stats"]))
+        self.sampledRows += workerStats["sampledRows"]
+
+    # ----------------------------------------
+    def isMappingEntry(self, fileName):
+        """calculations and filters are compiled as <calculation ...> and <filter ...>"""
+        if fileName.startswith("<calculation") or fileName.startswith("<filter"):
+            return True
+        return os.path.abspath(fileName) in self.sourceFiles
+
+    # ----------------------------------------
+    def getSummary(self, profileStats):
+        summaryLines = []
+        summaryLines.append(
+            "%s rows profiled, 1 in every %s, %.3f seconds"
+            % (self.sampledRows, self.sampleRate, profileStats.total_tt)
+        )
+        summaryLines.append("")
+
+        # --the mapping's own calculations, filters and python module functions
+        entryList = []
+        for funcKey, funcStats in profileStats.stats.items():
+            if self.isMappingEntry(funcKey[0]):
+                entryList.append((funcStats[3], funcStats[2], funcStats[1], funcKey))
+        if entryList:
+            summaryLines.append("MAPPING ENTRIES BY CUMULATIVE TIME:")
+            summaryLines.append(
+                "  %12s %12s %12s %12s  %s"
+                % ("cumtime", "tottime", "calls", "usec/call", "entry")
+            )
+            for entryStats in sorted(entryList, reverse=True)[0 : self.topCount]:
+                cumTime, totTime, callCnt, funcKey = entryStats
+                summaryLines.append(
+                    "  %12.3f %12.3f %12d %12.2f  %s"
+                    % (
+                        cumTime,
+                        totTime,
+                        callCnt,
+                        cumTime / callCnt * 1000000 if callCnt else 0,
+                        pstats.func_std_string(funcKey),
+                    )
+                )
+            summaryLines.append("")
+
+        for sortKey in ("tottime", "cumulative"):
+            statsText = io.StringIO()
+            profileStats.stream = statsText
+            profileStats.sort_stats(sortKey).print_stats(self.topCount)
+            summaryLines.append("TOP %s BY %s:" % (self.topCount, sortKey.upper()))
+            summaryLines.extend(
+                [x for x in statsText.getvalue().splitlines() if x.strip()][1:]
+            )
+            summaryLines.append("")
+        return "\n".join(summaryLines)
+
+    # ----------------------------------------
+    def write(self):
+        """write the pstats file and the summary beside it, returns the summary file name if any rows were profiled"""
+        self.stop()
+        self.profiler.create_stats()
+        statsList = self.workerStats
+        if self.profiler.stats:
+            statsList = [profile_stats(self.profiler.stats)] + statsList
+        if not statsList:
+            return None
+
+        profileStats = pstats.Stats(*statsList)
+        profileStats.dump_stats(self.profileFileName)
+        with open(self.summaryFileName, "w") as f:
+            f.write(self.getSummary(profileStats))
+        return self.summaryFileName
@@ -0,0 +1,414 @@
+#! /usr/bin/env python3
+import os
+import csv
+import codecs
+import io
+import itertools
+import json
+import locale
+import mmap
+import operator
+import re
+import csv_compression
+
+try:
+    import orjson
+except:
+    orjson = None
+
+# --json lines are decoded with orjson when it is installed as it is much faster
+jsonDecoder = orjson.loads if orjson else json.loads
+
+# --multi-character delimiters are swapped for this before the csv module splits the line
+splitChar = "\x1f"
+spareSplitChars = "\x1e\x1d\x1c" + "".join(chr(x) for x in range(0xE000, 0xF900))
+
+
+# ----------------------------------------
+def isWideEncoding(fileEncoding):
+    """newlines cannot be found in the raw bytes of utf-16 or utf-32"""
+    encodingName = codecs.lookup(
+        fileEncoding or locale.getpreferredencoding(False)
+    ).name
+    return encodingName.startswith("utf-16") or encodingName.startswith("utf-32")
+
+
+# ----------------------------------------
+def canMapFile(fileName, fileEncoding):
+    """only an uncompressed file with a byte-sized newline can be read through a memory map"""
+    return (
+        os.path.isfile(fileName)
+        and os.path.getsize(fileName) > 0
+        and not csv_compression.getCompression(fileName)
+        and not isWideEncoding(fileEncoding)
+    )
+
+
+# ----------------------------------------
+def getDialect(fieldDelimiter):
+    """the csv dialect for a delimiter, registering it if need be, multi for ones longer than a character"""
+    if fieldDelimiter.lower() in ("json", "jsonl"):
+        return "json"
+    elif fieldDelimiter.lower() == "fixed":
+        return "fixed"
+    elif fieldDelimiter.lower() in ("csv", "comma", ","):
+        return "excel"
+    elif fieldDelimiter.lower() in ("tab", "tsv", "\t"):
+        return "excel-tab"
+    elif fieldDelimiter.lower() in ("pipe", "|"):
+        csv.register_dialect("pipe", delimiter="|", quotechar='"')
+        return "pipe"
+    elif len(fieldDelimiter) == 1:
+        csv.register_dialect("other", delimiter=fieldDelimiter, quotechar='"')
+        return "other"
+    elif len(fieldDelimiter) > 1:
+        return "multi"
+    return "excel"
+
+
+# ----------------------------------------
+def getRecordQuote(fieldDelimiter):
+    """the quote byte to follow when finding where records end in the raw bytes, if any"""
+    # --json lines have their newlines escaped and their quotes are not csv quotes,
+    # --fixed width columns are not quoted at all
+    if fieldDelimiter.lower() in ("json", "jsonl", "fixed") or '"' in fieldDelimiter:
+        return None
+    return b'"'
+
+
+# ----------------------------------------
+def getFileChunks(fileName, currentFile, chunkSize, firstChunkStart=0):
+    """split a file into byte ranges that start and end on record boundaries"""
+    # --a newline only ends a record outside of a quoted field, so quotes are counted
+    # --along the way which assumes any field containing a quote is itself quoted
+    fileSize = os.path.getsize(fileName)
+
+    # --newlines cannot be found in the raw bytes of wide encodings
+    if isWideEncoding(currentFile.get("fileEncoding")):
+        return [(0, fileSize)]
+
+    quoteChar = getRecordQuote(currentFile["fieldDelimiter"])
+    chunkList = []
+    with open(fileName, "rb") as f:
+        chunkStart = firstChunkStart
+        while chunkStart < fileSize:
+            if chunkStart + chunkSize >= fileSize:
+                chunkList.append((chunkStart, fileSize))
+                break
+
+            # --an odd number of quotes up to here means we are inside a quoted field
+            quoteCnt = 0
+            if quoteChar:
+                f.seek(chunkStart)
+                for blockStart in range(chunkStart, chunkStart + chunkSize, 1048576):
+                    quoteCnt += f.read(
+                        min(1048576, chunkStart + chunkSize - blockStart)
+                    ).count(quoteChar)
+            blockStart = chunkStart + chunkSize
+            f.seek(blockStart)
+            chunkEnd = None
+            while not chunkEnd:
+                block = f.read(1048576)
+                if not block:
+                    chunkEnd = fileSize
+                    break
+                blockPos = 0
+                while True:
+                    newlinePos = block.find(b"\n", blockPos)
+                    if newlinePos < 0:
+                        if quoteChar:
+                            quoteCnt += block.count(quoteChar, blockPos)
+                        break
+                    if quoteChar:
+                        quoteCnt += block.count(quoteChar, blockPos, newlinePos)
+                    if quoteCnt % 2 == 0:
+                        chunkEnd = blockStart + newlinePos + 1
+                        break
+                    blockPos = newlinePos + 1
+                blockStart += len(block)
+            chunkList.append((chunkStart, chunkEnd))
+            chunkStart = chunkEnd
+    return chunkList
+
+
+# ----------------------------------------
+def checkFixedWidth(fixedWidth):
+    """the problems with a fixed width layout, an empty list if there are none"""
+    if type(fixedWidth) != list or not fixedWidth:
+        return ["fixedWidth must be a list of the columns"]
+    errorList = []
+    for i, columnDict in enumerate(fixedWidth):
+        if type(columnDict) != dict or not columnDict.get("column"):
+            errorList.append("fixedWidth column %s has no column name" % i)
+        elif type(columnDict.get("offset")) != int or columnDict["offset"] < 0:
+            errorList.append("fixedWidth column %s needs an offset of 0 or more" % i)
+        elif type(columnDict.get("length")) != int or columnDict["length"] < 1:
+            errorList.append("fixedWidth column %s needs a length of 1 or more" % i)
+    return errorList
+
+
+# ----------------------------------------
+def getFixedWidthSlicer(fixedWidth):
+    """cuts a line into the columns of a fixed width layout, all of them in one call"""
+    columnSlices = [
+        slice(columnDict["offset"], columnDict["offset"] + columnDict["length"])
+        for columnDict in fixedWidth
+    ]
+    if len(columnSlices) == 1:
+        columnSlice = columnSlices[0]
+        return lambda line: (line[columnSlice],)
+    return operator.itemgetter(*columnSlices)
+
+
+# ----------------------------------------
+def removeQuoteChar(s):
+    if len(s) > 2 and s[0] + s[-1] in ("''", '""'):
+        return s[1:-1]
+    return s
+
+
+# ----------------------------------------
+def cleanFields(row):
+    """padding around a multi-character delimiter is not part of the value, nor are the quotes the csv module left on"""
+    return [removeQuoteChar(x.strip()) for x in row]
+
+
+# ----------------------------------------
+def getReader(fileHandle, csvDialect, fieldDelimiter, fixedWidth=None):
+    """a reader that returns each row as a list, whatever the delimiter, or json lines decoded"""
+    # --a line that is not valid json raises its error for just that row as the rest are read
+    if csvDialect == "json":
+        return map(jsonDecoder, filter(str.strip, fileHandle))
+
+    # --fixed width columns are sliced from each line, their padding is removed as they are cleaned
+    elif csvDialect == "fixed":
+        return map(getFixedWidthSlicer(fixedWidth), filter(str.strip, fileHandle))
+    elif csvDialect == "multi":
+        return iter(multi_delimiter_reader(fileHandle, fieldDelimiter))
+    return csv.reader(fileHandle, dialect=csvDialect)
+
+
+# =========================
+class multi_delimiter_reader:
+    """a csv reader for delimiters longer than one character such as ~|~ or ||"""
+
+    # --the file is read in blocks of whole records and each block has its delimiters swapped
+    # --for a character it does not contain, so the csv module can do the splitting and quote
+    # --handling, quoted fields can contain the delimiter, quotes and newlines
+
+    # ----------------------------------------
+    def __init__(self, fileHandle, fieldDelimiter, quoteChar='"', blockSize=65536):
+        self.fileHandle = fileHandle
+        self.fieldDelimiter = fieldDelimiter
+        self.quoteChar = quoteChar if quoteChar not in fieldDelimiter else None
+        self.blockSize = blockSize
+
+        # --finds a field in an unquoted block that starts or ends with padding or starts
+        # --with a quote, the newlines are left out as they end the rows
+        self.fieldEdgeFinder = re.compile(
+            r"(?:^|%s)(?:[^\S\n]|['\"])|[^\S\n](?:$|%s)"
+            % ((re.escape(fieldDelimiter),) * 2),
+            re.MULTILINE,
+        )
+
+        # --a handle that can only give lines, such as one tracking checkpoint offsets,
+        # --is read a record at a time so its position stays on the current row
+        self.readBlocks = hasattr(fileHandle, "read")
+
+    # ----------------------------------------
+    def __iter__(self):
+        """the rows of every block chained together, so no python code runs per row"""
+        return itertools.chain.from_iterable(self.getBlockRows())
+
+    # ----------------------------------------
+    def readLine(self):
+        if self.readBlocks:
+            return self.fileHandle.readline()
+        return next(self.fileHandle, "")
+
+    # ----------------------------------------
+    def readBlock(self):
+        """read whole records, so a block never ends inside a quoted field"""
+        if self.readBlocks:
+            block = self.fileHandle.read(self.blockSize)
+            lineList = [block, self.fileHandle.readline()] if block else []
+        else:
+            lineList = [next(self.fileHandle, "")]
+        block = "".join(lineList)
+
+        # --an odd number of quotes means the last record carries on to the next line,
+        # --a quote that is never closed stops being followed at the csv field size limit
+        if self.quoteChar and self.quoteChar in block:
+            quoteCnt = block.count(self.quoteChar)
+            addedSize = 0
+            while quoteCnt % 2 and addedSize < csv.field_size_limit():
+                line = self.readLine()
+                if not line:
+                    break
+                quoteCnt += line.count(self.quoteChar)
+                addedSize += len(line)
+                lineList.append(line)
+            block = "".join(lineList)
+        return block
+
+    # ----------------------------------------
+    def getBlockReader(self, block, blockSplitChar):
+        blockHandle = io.StringIO(block.replace(self.fieldDelimiter, blockSplitChar))
+        if self.quoteChar:
+            return csv.reader(
+                blockHandle, delimiter=blockSplitChar, quotechar=self.quoteChar
+            )
+        return csv.reader(blockHandle, delimiter=blockSplitChar, quoting=csv.QUOTE_NONE)
+
+    # ----------------------------------------
+    def splitBlock(self, block):
+        """the rows of a block, cleaned if any of their fields need it"""
+        # --the usual split character is only passed over if it is in the data
+        blockSplitChar = splitChar
+        if splitChar in block:
+            for blockSplitChar in spareSplitChars:
+                if blockSplitChar not in block:
+                    break
+            else:
+                raise csv.Error("no character is free to split the rows on")
+
+        # --the delimiters inside quoted fields have to be put back
+        def restoreDelimiter(row):
+            return [
+                (
+                    x.replace(blockSplitChar, self.fieldDelimiter)
+                    if blockSplitChar in x
+                    else x
+                )
+                for x in row
+            ]
+
+        # --without quotes every delimiter splits a field, so the rows need no checking
+        # --and an error in one is raised for just that row as the rest are read
+        blockReader = self.getBlockReader(block, blockSplitChar)
+        if not self.quoteChar or self.quoteChar not in block:
+            if self.fieldEdgeFinder.search(block):
+                return map(cleanFields, blockReader)
+            return blockReader
+
+        # --otherwise the whole block is split at once to count them, a bad row in it
+        # --means going a row at a time
+        try:
+            blockRows = list(blockReader)
+        except csv.Error:
+            return map(
+                cleanFields,
+                map(restoreDelimiter, self.getBlockReader(block, blockSplitChar)),
+            )
+
+        # --any delimiters that did not split a field were inside quotes
+        splitCnt = sum(map(len, blockRows)) - len(blockRows) + blockRows.count([])
+        if splitCnt != block.count(self.fieldDelimiter):
+            blockRows = [
+                restoreDelimiter(row) if blockSplitChar in "".join(row) else row
+                for row in blockRows
+            ]
+
+        # --the quotes are off now, so the fields are joined back up to look for the edges
+        # --of any of them, such as the spaces just inside a quoted one, the ends are looked
+        # --for from the back of the text as searches starting at a split go the quickest
+        fieldText = "".join(
+            [
+                blockSplitChar,
+                blockSplitChar.join(map(blockSplitChar.join, blockRows)),
+                blockSplitChar,
+            ]
+        )
+        edgeFinder = re.compile(
+            r"%s(?:[^\S%s]|['\"])" % ((re.escape(blockSplitChar),) * 2)
+        )
+        if edgeFinder.search(fieldText) or edgeFinder.search(fieldText[::-1]):
+            return map(cleanFields, blockRows)
+        return blockRows
+
+    # ----------------------------------------
+    def getBlockRows(self):
+        """split each block into its rows"""
+        # --fields are stripped and have their quotes removed as they always have been, so a
+        # --quoted field's own leading or trailing spaces are stripped too, a block is only
+        # --passed over when that would not change any of its fields
+        while True:
+            block = self.readBlock()
+            if not block:
+                return
+            yield self.splitBlock(block)
+
+
+# =========================
+class mapped_input:
+    """an uncompressed file, or byte range of one, read through a memory map"""
+
+    # --the record boundaries are found in the raw bytes and each block of whole lines is
+    # --decoded in one call, the lines of every block are chained together for the csv reader
+
+    # ----------------------------------------
+    def __init__(
+        self,
+        fileName,
+        fileEncoding=None,
+        startOffset=0,
+        endOffset=None,
+        blockSize=1048576,
+    ):
+        self.fileEncoding = fileEncoding or locale.getpreferredencoding(False)
+        with open(fileName, "rb") as f:
+            self.fileMap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.offset = startOffset
+        self.endOffset = len(self.fileMap) if endOffset is None else endOffset
+        self.blockSize = blockSize
+
+    # ----------------------------------------
+    def __iter__(self):
+        return itertools.chain.from_iterable(map(io.StringIO, self.getBlocks()))
+
+    # ----------------------------------------
+    def __enter__(self):
+        return self
+
+    # ----------------------------------------
+    def __exit__(self, excType, excValue, excTraceback):
+        self.close()
+
+    # ----------------------------------------
+    def getBlocks(self):
+        while True:
+            block = self.read(self.blockSize)
+            if not block:
+                return
+            yield block
+
+    # ----------------------------------------
+    def decode(self, blockEnd):
+        """decode up to blockEnd, translating newlines just as a text mode file would"""
+        block = self.fileMap[self.offset : blockEnd].decode(self.fileEncoding)
+        self.offset = blockEnd
+        if "\r" in block:
+            block = block.replace("\r\n", "\n").replace("\r", "\n")
+        return block
+
+    # ----------------------------------------
+    def read(self, size):
+        """the next size bytes carried on to the end of their last line"""
+        blockEnd = min(self.offset + size, self.endOffset)
+        if blockEnd < self.endOffset:
+            newlinePos = self.fileMap.find(b"\n", blockEnd - 1, self.endOffset)
+            blockEnd = newlinePos + 1 if newlinePos >= 0 else self.endOffset
+        return self.decode(blockEnd)
+
+    # ----------------------------------------
+    def readline(self):
+        newlinePos = self.fileMap.find(b"\n", self.offset, self.endOffset)
+        return self.decode(newlinePos + 1 if newlinePos >= 0 else self.endOffset)
+
+    # ----------------------------------------
+    def tell(self):
+        return self.offset
+
+    # ----------------------------------------
+    def close(self):
+        self.fileMap.close()
@@ -0,0 +1,81 @@
+#! /usr/bin/env python3
+from collections.abc import MutableMapping
+
+
+# ----------------------------------------
+def getColumnPositions(columnHeaders):
+    """the position of each column, shared by every row read with the header"""
+    columnPositions = {}
+    for i, columnHeader in enumerate(columnHeaders):
+        columnPositions[columnHeader] = i
+    return columnPositions
+
+
+# =========================
+class csv_row(MutableMapping):
+    """a row's values by position with the header's column positions, used like a dictionary"""
+
+    # --columns added after the row is read, such as ROW_ID and calculations, go in addedValues
+    # --and a json line has no positions, its decoded object is used as the addedValues as is
+    __slots__ = ("columnPositions", "columnValues", "addedValues")
+
+    # ----------------------------------------
+    def __init__(self, columnPositions, columnValues, addedValues=None):
+        self.columnPositions = columnPositions
+        self.columnValues = columnValues
+        self.addedValues = {} if addedValues is None else addedValues
+
+    # ----------------------------------------
+    def __getitem__(self, key):
+        if key in self.columnPositions:
+            return self.columnValues[self.columnPositions[key]]
+        return self.addedValues[key]
+
+    # ----------------------------------------
+    def __setitem__(self, key, value):
+        if key in self.columnPositions:
+            self.columnValues[self.columnPositions[key]] = value
+        else:
+            self.addedValues[key] = value
+
+    # ----------------------------------------
+    def __delitem__(self, key):
+        """a column from the file is removed from a copy of the positions so other rows keep it"""
+        if key in self.columnPositions:
+            self.columnPositions = dict(self.columnPositions)
+            del self.columnPositions[key]
+        else:
+            del self.addedValues[key]
+
+    # ----------------------------------------
+    def __contains__(self, key):
+        return key in self.columnPositions or key in self.addedValues
+
+    # ----------------------------------------
+    def __iter__(self):
+        yield from self.columnPositions
+        yield from self.addedValues
+
+    # ----------------------------------------
+    def __len__(self):
+        return len(self.columnPositions) + len(self.addedValues)
+
+    # ----------------------------------------
+    def __repr__(self):
+        return repr(self.toDict())
+
+    # ----------------------------------------
+    def get(self, key, default=None):
+        if key in self.columnPositions:
+            return self.columnValues[self.columnPositions[key]]
+        return self.addedValues.get(key, default)
+
+    # ----------------------------------------
+    def toDict(self):
+        """a plain dictionary of the row, for python modules and anything that needs a real dict"""
+        rowDict = {
+            columnName: self.columnValues[position]
+            for columnName, position in self.columnPositions.items()
+        }
+        rowDict.update(self.addedValues)
+        return rowDict
@@ -0,0 +1,135 @@
+#! /usr/bin/env python3
+import os
+import sys
+import json
+import time
+from datetime import datetime, timedelta
+
+try:
+    import resource
+except:
+    resource = None
+
+
+# =========================
+class csv_run_report:  # pylint: disable=too-many-instance-attributes
+
+    # --the report file is rewritten at most this often while running
+    updateSeconds = 30
+
+    # ----------------------------------------
+    def __init__(self, toolName, reportFileName, fileList, stageTimes):
+        self.toolName = toolName
+        self.reportFileName = reportFileName
+        self.fileList = fileList
+        self.inputBytes = sum(os.path.getsize(x) for x in fileList)
+        self.stageTimes = stageTimes
+        self.workerCount = 1
+
+        self.startTime = time.time()
+        self.lastUpdate = self.startTime
+        self.rowCnt = 0
+        self.recordCnt = 0
+
+        # --bytes skipped by a resume count toward the percent done but not the rate
+        self.skippedBytes = 0
+        self.finishedBytes = 0
+        self.currentBytes = 0
+
+    # ----------------------------------------
+    def skipInput(self, byteCnt):
+        self.skippedBytes += byteCnt
+
+    # ----------------------------------------
+    def setPosition(self, currentBytes):
+        """how far through the current file, in its raw (possibly compressed) bytes"""
+        self.currentBytes = currentBytes
+
+    # ----------------------------------------
+    def finishInput(self, byteCnt):
+        """a file or chunk of one is done"""
+        self.finishedBytes += byteCnt
+        self.currentBytes = 0
+
+    # ----------------------------------------
+    def update(self, rowCnt, recordCnt):
+        """note the rows read by this run and records written so far, rewriting the report file every so often"""
+        self.rowCnt = rowCnt
+        self.recordCnt = recordCnt
+        if self.reportFileName and time.time() - self.lastUpdate >= self.updateSeconds:
+            self.write("running")
+
+    # ----------------------------------------
+    def getProgress(self):
+        """the rate, percent done and time remaining for the progress messages"""
+        runReport = self.getReport("running")
+        progress = ", %s rows/sec" % runReport["rowsPerSecond"]
+        if self.inputBytes:
+            progress += ", %s%% done" % runReport["percentComplete"]
+        if runReport["etaSeconds"] is not None:
+            progress += ", eta %s" % timedelta(seconds=runReport["etaSeconds"])
+        return progress
+
+    # ----------------------------------------
+    def getPeakRss(self, who):
+        """peak resident memory in MB for this process or the largest of its finished workers"""
+        if not resource:
+            return None
+        peakRss = resource.getrusage(who).ru_maxrss
+        peakRss = peakRss / 1048576 if sys.platform == "darwin" else peakRss / 1024
+        return round(peakRss, 1)
+
+    # ----------------------------------------
+    def getReport(self, status):
+        elapsedSeconds = max(time.time() - self.startTime, 0.001)
+        consumedBytes = self.finishedBytes + self.currentBytes
+        bytesPerSecond = consumedBytes / elapsedSeconds
+        remainingBytes = self.inputBytes - self.skippedBytes - consumedBytes
+
+        runReport = {}
+        runReport["tool"] = self.toolName
+        runReport["status"] = status
+        runReport["startTime"] = datetime.fromtimestamp(self.startTime).strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
+        runReport["updateTime"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        runReport["elapsedSeconds"] = round(elapsedSeconds, 3)
+        runReport["workers"] = self.workerCount
+        runReport["inputFiles"] = self.fileList
+        runReport["inputBytes"] = self.inputBytes
+        runReport["bytesConsumed"] = self.skippedBytes + consumedBytes
+        runReport["percentComplete"] = (
+            round((self.skippedBytes + consumedBytes) / self.inputBytes * 100, 1)
+            if self.inputBytes and status != "complete"
+            else 100.0
+        )
+        runReport["etaSeconds"] = (
+            round(remainingBytes / bytesPerSecond)
+            if status == "running" and bytesPerSecond
+            else None
+        )
+        runReport["rowsRead"] = self.rowCnt
+        runReport["recordsWritten"] = self.recordCnt
+        runReport["rowsPerSecond"] = round(self.rowCnt / elapsedSeconds)
+        runReport["bytesPerSecond"] = round(bytesPerSecond)
+        if resource:
+            runReport["peakRssMB"] = self.getPeakRss(resource.RUSAGE_SELF)
+            runReport["workerPeakRssMB"] = self.getPeakRss(resource.RUSAGE_CHILDREN)
+
+        # --with workers the stage times are summed across them so can add up to more than the elapsed time
+        stageTotal = sum(self.stageTimes.values()) or 1
+        runReport["stages"] = {}
+        for stageName, stageSeconds in self.stageTimes.items():
+            runReport["stages"][stageName] = {
+                "seconds": round(stageSeconds, 3),
+                "percent": round(stageSeconds / stageTotal * 100, 1),
+            }
+        return runReport
+
+    # ----------------------------------------
+    def write(self, status):
+        """write the report, replacing the file in one step so it can be read at any time"""
+        self.lastUpdate = time.time()
+        with open(self.reportFileName + ".tmp", "w") as f:
+            json.dump(self.getReport(status), f, indent=4)
+        os.replace(self.reportFileName + ".tmp", self.reportFileName)
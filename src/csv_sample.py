@@ -0,0 +1,306 @@
+#! /usr/bin/env python3
+import csv
+import io
+import itertools
+import locale
+import math
+import mmap
+import random
+import csv_reader
+import csv_index
+
+sampleMethods = ("first", "random", "reservoir", "seek")
+
+
+# ----------------------------------------
+def getSampleSize(sampleText):
+    """a sample of so many rows or a percent such as 5%, returns rows, percent and any error"""
+    sampleText = str(sampleText).strip()
+    try:
+        if sampleText.endswith("%"):
+            samplePercent = float(sampleText[:-1])
+            if not 0 < samplePercent <= 100:
+                return (
+                    None,
+                    None,
+                    "a sample percent must be more than 0 and at most 100",
+                )
+            return None, samplePercent, None
+        sampleRows = int(sampleText)
+    except ValueError:
+        return None, None, "%s is not a number of rows or a percent" % sampleText
+    if sampleRows < 1:
+        return None, None, "a sample must be at least 1 row"
+    return sampleRows, None, None
+
+
+# ----------------------------------------
+def checkSampleMethod(sampleMethod, sampleRows, samplePercent, sampleTolerance):
+    """the problem with a way of sampling, None if there is not one"""
+    if sampleMethod == "random" and not samplePercent:
+        return "random sampling needs a percent, use reservoir sampling for a number of rows"
+    if sampleMethod == "reservoir" and not sampleRows:
+        return "reservoir sampling needs a number of rows, use random sampling for a percent"
+    if sampleMethod == "reservoir" and sampleTolerance:
+        return "reservoir sampling reads every row so cannot stop early"
+    if sampleMethod and not (sampleRows or samplePercent):
+        return "a sample method needs a sample size"
+    return None
+
+
+# ----------------------------------------
+def getDataStart(fileName, csvDialect, fieldDelimiter):
+    """the byte offset of the first row after the header, if the file has one"""
+    if csvDialect in ("json", "fixed"):
+        return 0
+    with open(fileName, "rb") as f:
+        recordEnds = csv_index.getRecordEnds(
+            f, 0, csv_reader.getRecordQuote(fieldDelimiter)
+        )
+        return next(recordEnds, 0)
+
+
+# ----------------------------------------
+def readRows(reader):
+    """the rows of a reader, passing over any it cannot read"""
+    while True:
+        try:
+            yield next(reader)
+        except StopIteration:
+            return
+        except (csv.Error, ValueError):
+            continue
+
+
+# ----------------------------------------
+def getReservoir(reader, sampleRows, rng):
+    """an even sample of sampleRows rows from the whole of a reader, in file order"""
+    # --algorithm L, the rows between the ones kept are skipped by islice with no python code run for them
+    rowIter = readRows(reader)
+    reservoir = list(enumerate(itertools.islice(rowIter, sampleRows)))
+    if len(reservoir) == sampleRows:
+        rowNum = sampleRows - 1
+        keepWeight = math.exp(math.log(rng.random()) / sampleRows)
+        while True:
+            skipCnt = int(math.log(rng.random()) / math.log(1 - keepWeight))
+            row = next(itertools.islice(rowIter, skipCnt, None), None)
+            if row is None:
+                break
+            rowNum += skipCnt + 1
+            reservoir[rng.randrange(sampleRows)] = (rowNum, row)
+            keepWeight *= math.exp(math.log(rng.random()) / sampleRows)
+    reservoir.sort(key=lambda x: x[0])
+    return iter([row for rowNum, row in reservoir])
+
+
+# ----------------------------------------
+def getSampleReader(  # pylint: disable=too-many-arguments
+    currentFile, fileEnd, *, sampleMethod, sampleRows=None, samplePercent=None, rng=None
+):
+    """wrap a file's reader so it only returns the rows sampled from it"""
+    reader = currentFile["reader"]
+    rng = rng or random.Random()
+    if sampleMethod == "random":
+        sampleFraction = samplePercent / 100
+        return filter(lambda row: rng.random() < sampleFraction, reader)
+    elif sampleMethod == "reservoir":
+        return getReservoir(reader, sampleRows, rng)
+    elif sampleRows:
+        return itertools.islice(reader, sampleRows)
+
+    # --the first percent of a file is measured in its raw bytes, compressed or not
+    rawHandle = currentFile["rawHandle"]
+    readStart = rawHandle.tell()
+    readEnd = readStart + (fileEnd - readStart) * samplePercent / 100
+    return itertools.takewhile(lambda row: rawHandle.tell() <= readEnd, reader)
+
+
+# =========================
+class seek_sampler:  # pylint: disable=too-many-instance-attributes
+    """rows read from windows at random offsets through a file, each starting on a record"""
+
+    # --the rows between startOffset and endOffset are split into as many even strata as there
+    # --are windows and each window is put at a random spot in its own, so they never overlap,
+    # --the strata are visited in random order so the rows sampled so far always span the file
+
+    # ----------------------------------------
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        currentFile,
+        startOffset,
+        endOffset,
+        *,
+        sampleRows=None,
+        samplePercent=None,
+        rng=None,
+        windowSize=65536,
+    ):
+        # --how the rows in each window are decoded and split
+        self.fileEncoding = currentFile.get(
+            "fileEncoding"
+        ) or locale.getpreferredencoding(False)
+        self.csvDialect = currentFile["csvDialect"]
+        self.fieldDelimiter = currentFile["fieldDelimiter"]
+        self.fixedWidth = currentFile.get("fixedWidth")
+        self.columnCount = len(currentFile["header"])
+        self.quoteChar = csv_reader.getRecordQuote(currentFile["fieldDelimiter"])
+        with open(currentFile["name"], "rb") as f:
+            self.fileMap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.startOffset = startOffset
+        self.endOffset = endOffset
+        self.sampleRows = sampleRows
+        self.samplePercent = samplePercent
+        self.rng = rng or random.Random()
+        self.windowSize = windowSize
+        self.bytesRead = 0
+
+    # ----------------------------------------
+    def __iter__(self):
+        rowIter = itertools.chain.from_iterable(self.getWindowRows())
+        if self.sampleRows:
+            return itertools.islice(rowIter, self.sampleRows)
+        return rowIter
+
+    # ----------------------------------------
+    def getWindowCount(self):
+        """enough windows for the sample, the number of rows in one is guessed from the first"""
+        if self.samplePercent:
+            sampleBytes = (self.endOffset - self.startOffset) * self.samplePercent / 100
+            return math.ceil(sampleBytes / self.windowSize)
+        windowRows = len(
+            self.getRows(self.startOffset, self.getWindowEnd(self.startOffset))[0]
+        )
+        return math.ceil(self.sampleRows / max(windowRows, 1) * 1.1)
+
+    # ----------------------------------------
+    def getWindowRows(self):
+        dataSize = self.endOffset - self.startOffset
+        windowCount = self.getWindowCount()
+
+        # --a sample as big as the file is just read straight through
+        if windowCount * self.windowSize >= dataSize:
+            windowStart = self.startOffset
+            while windowStart < self.endOffset:
+                windowEnd = self.getWindowEnd(windowStart)
+                yield self.getRows(windowStart, windowEnd)[0]
+                self.bytesRead += windowEnd - windowStart
+                windowStart = windowEnd
+            return
+
+        stratumSize = dataSize / windowCount
+        stratumList = list(range(windowCount))
+        self.rng.shuffle(stratumList)
+        for stratumNum in stratumList:
+            stratumStart = self.startOffset + int(stratumNum * stratumSize)
+            windowStart = stratumStart + self.rng.randrange(
+                max(int(stratumSize) - self.windowSize, 1)
+            )
+            rowList, windowEnd = self.readWindow(windowStart)
+            self.bytesRead += windowEnd - windowStart
+            yield rowList
+
+    # ----------------------------------------
+    def getWindowEnd(self, windowStart):
+        """the end of the line windowSize bytes on, carried on past any newlines in quotes"""
+        windowEnd = min(windowStart + self.windowSize, self.endOffset)
+        newlinePos = self.fileMap.find(b"\n", windowEnd - 1, self.endOffset)
+        windowEnd = newlinePos + 1 if newlinePos >= 0 else self.endOffset
+        if self.quoteChar:
+            return self.getQuoteEnd(windowStart, windowEnd)
+        return windowEnd
+
+    # ----------------------------------------
+    def getQuoteEnd(self, lineStart, lineEnd, inQuotes=False):
+        """the first line end from lineEnd on that is not inside quotes"""
+        inQuotes ^= self.fileMap[lineStart:lineEnd].count(self.quoteChar) % 2 == 1
+        scanLimit = lineEnd + csv.field_size_limit()
+        while inQuotes and lineEnd < min(self.endOffset, scanLimit):
+            lineStart = lineEnd
+            newlinePos = self.fileMap.find(b"\n", lineStart, self.endOffset)
+            lineEnd = newlinePos + 1 if newlinePos >= 0 else self.endOffset
+            inQuotes ^= self.fileMap[lineStart:lineEnd].count(self.quoteChar) % 2 == 1
+        return lineEnd
+
+    # ----------------------------------------
+    def getRows(self, windowStart, windowEnd):
+        """the rows in a window and how many of them could not be read or have the wrong number of columns"""
+        block = self.fileMap[windowStart:windowEnd].decode(self.fileEncoding, "replace")
+        if "\r" in block:
+            block = block.replace("\r\n", "\n").replace("\r", "\n")
+        rowList = list(
+            readRows(
+                csv_reader.getReader(
+                    io.StringIO(block),
+                    self.csvDialect,
+                    self.fieldDelimiter,
+                    self.fixedWidth,
+                )
+            )
+        )
+        badCnt = 0
+        if self.csvDialect != "json":
+            badCnt = sum(1 for row in rowList if len(row) != self.columnCount)
+        return rowList, badCnt
+
+    # ----------------------------------------
+    def readWindow(self, windowStart):
+        """the rows of a window moved on to the start of the next record"""
+        # --the line after the one landed in starts a record unless the landing was inside
+        # --a quoted field with newlines in it, then it is the line after the closing quote,
+        # --whichever reads with the fewest bad rows is taken
+        if windowStart > self.startOffset:
+            newlinePos = self.fileMap.find(b"\n", windowStart - 1, self.endOffset)
+            windowStart = newlinePos + 1 if newlinePos >= 0 else self.endOffset
+        windowEnd = self.getWindowEnd(windowStart)
+        rowList, badCnt = self.getRows(windowStart, windowEnd)
+        if badCnt and self.quoteChar and windowStart > self.startOffset:
+            quoteStart = self.getQuoteEnd(windowStart, windowStart, True)
+            quoteEnd = self.getWindowEnd(quoteStart)
+            quoteRowList, quoteBadCnt = self.getRows(quoteStart, quoteEnd)
+            if quoteBadCnt < badCnt:
+                return quoteRowList, quoteEnd
+        return rowList, windowEnd
+
+    # ----------------------------------------
+    def tell(self):
+        """how far through the file the sample would be if read straight through"""
+        return self.startOffset + self.bytesRead
+
+    # ----------------------------------------
+    def close(self):
+        self.fileMap.close()
+
+
+# =========================
+class sample_convergence:
+    """decides when the percent populated and unique of every column have stopped moving"""
+
+    # ----------------------------------------
+    def __init__(self, tolerance, stableChecks=2):
+        self.tolerance = tolerance
+        self.stableChecks = stableChecks
+        self.lastPercents = None
+        self.stableCnt = 0
+
+    # ----------------------------------------
+    def restart(self):
+        """a new file has to settle on its own before it can be stopped early"""
+        self.stableCnt = 0
+
+    # ----------------------------------------
+    def isConverged(self, columnPercents):
+        """columnPercents has each column's percent populated and unique, checked every so many rows"""
+        if self.lastPercents is not None and all(
+            abs(
+                columnPercents[columnName][i]
+                - self.lastPercents.get(columnName, (0, 0))[i]
+            )
+            <= self.tolerance
+            for columnName in columnPercents
+            for i in (0, 1)
+        ):
+            self.stableCnt += 1
+        else:
+            self.stableCnt = 0
+        self.lastPercents = columnPercents
+        return self.stableCnt >= self.stableChecks
@@ -0,0 +1,155 @@
+#! /usr/bin/env python3
+import base64
+import itertools
+import math
+import zlib
+
+# --values are hashed with crc32 and a murmur3 finalizer so every process gets the same hash
+# --for a value, which python's own hash does not promise, and sketches can be merged
+hashBits = 32
+hashMask = (1 << hashBits) - 1
+
+
+# ----------------------------------------
+def getValueHash(value):
+    """a well mixed 32 bit hash of a string"""
+    valueHash = zlib.crc32(value.encode("utf-8", "surrogatepass"))
+    valueHash ^= valueHash >> 16
+    valueHash = (valueHash * 0x85EBCA6B) & hashMask
+    valueHash ^= valueHash >> 13
+    valueHash = (valueHash * 0xC2B2AE35) & hashMask
+    return valueHash ^ (valueHash >> 16)
+
+
+# =========================
+class hyperloglog:
+    """an estimate of how many distinct values there are in a fixed 2**precision bytes"""
+
+    # ----------------------------------------
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registerCount = 1 << precision
+        self.registers = bytearray(self.registerCount)
+        self.rankBits = hashBits - precision
+
+    # ----------------------------------------
+    def add(self, value):
+        valueHash = getValueHash(value)
+        register = valueHash >> self.rankBits
+        rank = self.rankBits - (valueHash & ((1 << self.rankBits) - 1)).bit_length() + 1
+        if rank > self.registers[register]:
+            self.registers[register] = rank
+
+    # ----------------------------------------
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    # ----------------------------------------
+    def merge(self, other):
+        """combine another sketch of the same precision into this one"""
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    # ----------------------------------------
+    def count(self):
+        registerCount = self.registerCount
+        alpha = 0.7213 / (1 + 1.079 / registerCount)
+        estimate = (
+            alpha
+            * registerCount
+            * registerCount
+            / sum(math.ldexp(1.0, -x) for x in self.registers)
+        )
+
+        # --small counts are better estimated from the empty registers, large ones are
+        # --corrected for values sharing a 32 bit hash
+        emptyRegisters = self.registers.count(0)
+        if estimate <= 2.5 * registerCount and emptyRegisters:
+            estimate = registerCount * math.log(registerCount / emptyRegisters)
+        elif estimate > (1 << hashBits) / 30:
+            estimate = -(1 << hashBits) * math.log(1 - estimate / (1 << hashBits))
+        return int(round(estimate))
+
+    # ----------------------------------------
+    def getStandardError(self):
+        """the relative standard error of the count"""
+        return 1.04 / math.sqrt(self.registerCount)
+
+
+# =========================
+class column_sketch:
+    """the distinct count and top values of a column with too many values to count exactly"""
+
+    # --the column's value counts are kept in its own dictionary, which is trimmed in place
+    # --to its busiest values the way misra-gries does, subtracting the count of the first
+    # --value dropped from all of them, so each count is low by at most maxUndercount which
+    # --is never more than rows / (sketchSize / 2 + 1)
+
+    # ----------------------------------------
+    def __init__(self, sketchSize, precision=14):
+        self.sketchSize = sketchSize
+        self.distinctValues = hyperloglog(precision)
+        self.maxUndercount = 0
+
+        # --values are only added to a dictionary's end, so the ones after this many are new
+        self.sketchedCnt = 0
+
+    # ----------------------------------------
+    def reduce(self, valueCounts):
+        """add the values counted since the last call to the distinct count and trim the counts"""
+        self.distinctValues.update(
+            value
+            for value in itertools.islice(valueCounts, self.sketchedCnt, None)
+            if value != "null"
+        )
+
+        if len(valueCounts) - 1 > self.sketchSize:
+            countList = sorted(
+                (valueCounts[value] for value in valueCounts if value != "null"),
+                reverse=True,
+            )
+            dropCount = countList[self.sketchSize // 2]
+            keptCounts = {
+                value: valueCounts[value] - dropCount
+                for value in valueCounts
+                if valueCounts[value] > dropCount and value != "null"
+            }
+            nullCount = valueCounts["null"]
+            valueCounts.clear()
+            valueCounts["null"] = nullCount
+            valueCounts.update(keptCounts)
+            self.maxUndercount += dropCount
+        self.sketchedCnt = len(valueCounts)
+
+    # ----------------------------------------
+    def merge(self, other):
+        """combine the sketch of another part of the column, its counts are merged on their own"""
+        self.distinctValues.merge(other.distinctValues)
+        self.maxUndercount += other.maxUndercount
+
+    # ----------------------------------------
+    def getState(self):
+        """the sketch as a dictionary that can be saved as json"""
+        sketchState = {}
+        sketchState["registers"] = base64.b64encode(
+            self.distinctValues.registers
+        ).decode("ascii")
+        sketchState["maxUndercount"] = self.maxUndercount
+        return sketchState
+
+    # ----------------------------------------
+    def setState(self, sketchState):
+        """put back a sketch saved by getState, its counts are put back on their own"""
+        self.distinctValues.registers = bytearray(
+            base64.b64decode(sketchState["registers"])
+        )
+        self.maxUndercount = sketchState["maxUndercount"]
+
+    # ----------------------------------------
+    def getUniqueCount(self):
+        return self.distinctValues.count()
+
+    # ----------------------------------------
+    def getUniqueError(self):
+        """the percent the unique count is within 19 times out of 20"""
+        return round(self.distinctValues.getStandardError() * 2 * 100, 2)
@@ -0,0 +1,125 @@
+#! /usr/bin/env python3
+import os
+import json
+from csv_sketch import column_sketch
+
+stateVersion = 1
+
+# --the input settings saved with the statistics, a run has to read files the same way to use them
+stateInputKeys = ("fieldDelimiter", "fileEncoding", "csvDialect", "fixedWidth")
+
+
+# ----------------------------------------
+def getFileKey(fileName):
+    return os.path.abspath(fileName)
+
+
+# ----------------------------------------
+def newState(sketchSize):
+    stateDoc = {}
+    stateDoc["stateVersion"] = stateVersion
+    stateDoc["sketchSize"] = sketchSize
+    stateDoc["input"] = {}
+    stateDoc["files"] = {}
+    return stateDoc
+
+
+# ----------------------------------------
+def checkState(stateDoc, inputDoc, sketchSize):
+    """why the saved statistics cannot be added to this run's, None if they can"""
+    if stateDoc.get("stateVersion") != stateVersion:
+        return "it was saved by another version"
+    if stateDoc.get("sketchSize") != sketchSize:
+        return "it was saved with a different --sketchSize or without --sketch"
+    for key in ("fieldDelimiter", "fileEncoding"):
+        if inputDoc.get(key) and inputDoc[key] != stateDoc["input"].get(key):
+            return "it was saved with a different %s" % key
+    if inputDoc.get("fixedWidth") != stateDoc["input"].get("fixedWidth"):
+        return "it was saved with a different fixed width layout"
+    return None
+
+
+# ----------------------------------------
+def loadState(stateFileName, inputDoc, sketchSize):
+    """the saved state if it was made the same way as this run, otherwise an empty one"""
+    if not os.path.exists(stateFileName):
+        return newState(sketchSize)
+    try:
+        with open(stateFileName, "r", encoding="utf-8") as f:
+            stateDoc = json.load(f)
+        errorMessage = checkState(stateDoc, inputDoc, sketchSize)
+    except (IOError, ValueError, KeyError, AttributeError) as err:
+        errorMessage = err
+    if errorMessage:
+        print("")
+        print("state file %s not used, %s" % (stateFileName, errorMessage))
+        return newState(sketchSize)
+
+    # --the settings sniffed or found by the last run apply to the files it read
+    for key in stateInputKeys:
+        if not inputDoc.get(key) and stateDoc["input"].get(key):
+            inputDoc[key] = stateDoc["input"][key]
+    return stateDoc
+
+
+# ----------------------------------------
+def getFileStat(fileName):
+    fileStat = os.stat(fileName)
+    return {"fileSize": fileStat.st_size, "fileModified": fileStat.st_mtime_ns}
+
+
+# ----------------------------------------
+def getFileResult(stateDoc, fileName):
+    """a file's saved statistics if it is the same size and age as when they were saved, otherwise None"""
+    fileState = stateDoc["files"].get(getFileKey(fileName))
+    if not fileState:
+        return None
+    fileStat = getFileStat(fileName)
+    if (
+        fileState["fileSize"] != fileStat["fileSize"]
+        or fileState["fileModified"] != fileStat["fileModified"]
+    ):
+        return None
+
+    fileResult = {}
+    fileResult["analyzedCnt"] = fileState["analyzedCnt"]
+    fileResult["header"] = fileState["header"]
+    fileResult["statPack"] = fileState["statPack"]
+    fileResult["preStatPack"] = {}
+    fileResult["sketchPack"] = {}
+    for columnName, sketchState in fileState["sketchPack"].items():
+        fileResult["sketchPack"][columnName] = column_sketch(stateDoc["sketchSize"])
+        fileResult["sketchPack"][columnName].setState(sketchState)
+    fileResult["testRecord"] = fileState["testRecord"]
+    return fileResult
+
+
+# ----------------------------------------
+def writeState(stateFileName, stateDoc, inputDoc, fileResults, fileStats):
+    """save the statistics of each file read, replacing the state file in one step"""
+    # --fileResults has every file of this run that was finished, fileStats has the size and
+    # --age of each one read by this run, taken before it was read so a file appended to
+    # --while being read is read again next time
+    stateDoc["input"] = {key: inputDoc.get(key) for key in stateInputKeys}
+    fileStates = {}
+    for fileName in fileResults:
+        fileKey = getFileKey(fileName)
+        if fileName not in fileStats:
+            fileStates[fileKey] = stateDoc["files"][fileKey]
+            continue
+        fileResult = fileResults[fileName]
+        fileState = dict(fileStats[fileName])
+        fileState["analyzedCnt"] = fileResult["analyzedCnt"]
+        fileState["header"] = fileResult["header"]
+        fileState["statPack"] = fileResult["statPack"]
+        fileState["sketchPack"] = {
+            columnName: columnSketch.getState()
+            for columnName, columnSketch in fileResult["sketchPack"].items()
+        }
+        fileState["testRecord"] = fileResult["testRecord"]
+        fileStates[fileKey] = fileState
+    stateDoc["files"] = fileStates
+
+    with open(stateFileName + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(stateDoc, f)
+    os.replace(stateFileName + ".tmp", stateFileName)
@@ -0,0 +1,687 @@
+#! /usr/bin/env python3
+import os
+import csv
+import signal
+import sys
+import time
+import io
+import collections
+import concurrent.futures
+import zlib
+import csv_compression
+import csv_reader
+import csv_index
+import csv_unique
+from csv_profiler import csv_profiler
+from csv_sketch import column_sketch
+
+# --the analyzer's options, set by setOptions in the main process and in each worker process
+sketchSize = None
+memoryMap = False
+decompressThread = False
+profileSample = None
+keySpillDir = None
+
+# --set by the analyzer when it is interrupted, so no more chunks are handed out
+shutDown = False
+
+
+# ----------------------------------------
+def getNextRow(fileInfo):
+    errCnt = 0
+    csv_data = None
+    while not csv_data:
+
+        # --quit for consecutive errors
+        if errCnt >= 10:
+            fileInfo["ERROR"] = "YES"
+            print()
+            print("Shutdown due to too many errors")
+            break
+
+        try:
+            line = next(fileInfo["reader"])
+        except StopIteration:
+            break
+        except:
+            print(" row %s: %s" % (fileInfo["rowCnt"], sys.exc_info()[0]))
+            fileInfo["skipCnt"] += 1
+            errCnt += 1
+            continue
+        fileInfo["rowCnt"] += 1
+        if line:  # --skip empty lines
+
+            if fileInfo["csvDialect"] == "json":
+                if type(line) != dict:
+                    print(" row %s is not a json object" % fileInfo["rowCnt"])
+                    fileInfo["skipCnt"] += 1
+                    errCnt += 1
+                    continue
+                csv_data = line
+                for attr in csv_data:
+                    if (
+                        type(csv_data[attr]) not in (list, dict)
+                        and attr not in fileInfo["header"]
+                    ):
+                        fileInfo["header"].append(attr)
+
+                return fileInfo, csv_data
+
+            row = line
+
+            # --turn into a dictionary if there is a header
+            if "header" in fileInfo:
+
+                # --column mismatch
+                if len(row) != len(fileInfo["header"]):
+                    print(
+                        " row %s has %s columns, expected %s"
+                        % (fileInfo["rowCnt"], len(row), len(fileInfo["header"]))
+                    )
+                    fileInfo["skipCnt"] += 1
+                    errCnt += 1
+                    continue
+
+                # --is it the header row
+                elif (
+                    str(row[0]).upper() == fileInfo["header"][0].upper()
+                    and str(row[len(row) - 1]).upper()
+                    == fileInfo["header"][len(fileInfo["header"]) - 1].upper()
+                ):
+                    fileInfo["skipCnt"] += 1
+                    if fileInfo["rowCnt"] != 1:
+                        print(" row %s contains the header" % fileInfo["rowCnt"])
+                        errCnt += 1
+                    continue
+
+                # --return a good row
+                else:
+                    csv_data = dict(
+                        zip(fileInfo["header"], [str(x).strip() for x in row])
+                    )
+
+            else:  # --if not just return what should be the header row
+                fileInfo["skipCnt"] += 1
+                csv_data = [str(x).strip() for x in row]
+
+        else:
+            print(" row %s is blank" % fileInfo["rowCnt"])
+            fileInfo["skipCnt"] += 1
+            continue
+
+    return fileInfo, csv_data
+
+
+# ----------------------------------------
+def analyzeRow(rowData, columnHeaders, statPack, mappingDoc):
+    """count the null and distinct values of each column in a row"""
+    for columnName in columnHeaders:
+
+        if columnName not in rowData:  # --may not be if json
+            statPack[columnName]["null"] += 1
+            continue
+        if columnName not in statPack:  # --may not be if json
+            statPack[columnName] = {"null": 0}
+        if columnName not in mappingDoc["input"]["columnHeaders"]:
+            mappingDoc["input"]["columnHeaders"].append(
+                columnName
+            )  # --may not be if json
+
+        columnValue = str(rowData[columnName]).strip()
+        if not columnValue or columnValue.strip().upper() in (
+            "NONE",
+            "NULL",
+            "\\N",
+        ):
+            statPack[columnName]["null"] += 1
+            continue
+
+        if columnValue in statPack[columnName]:
+            statPack[columnName][columnValue] += 1
+        else:
+            statPack[columnName][columnValue] = 1
+
+
+# ----------------------------------------
+def sketchStatPack(statPack, sketchPack):
+    """sketch the columns with more distinct values than the sketch size, trimming their counts"""
+    for columnName in statPack:
+        if columnName in sketchPack or len(statPack[columnName]) - 1 > sketchSize:
+            if columnName not in sketchPack:
+                sketchPack[columnName] = column_sketch(sketchSize)
+            sketchPack[columnName].reduce(statPack[columnName])
+
+
+# ----------------------------------------
+def addKeyCheckers(keyCheckers, keyList, spillDir, spillTag=0):
+    """start checking each key that is not being checked already"""
+    for keyColumns in keyList:
+        keyName = "+".join(keyColumns)
+        if keyName not in keyCheckers:
+            keyCheckers[keyName] = csv_unique.key_checker(
+                keyColumns,
+                os.path.join(
+                    spillDir, "key-%08x" % zlib.crc32(keyName.encode("utf-8"))
+                ),
+                spillTag,
+            )
+
+
+# ----------------------------------------
+def addUniqueColumns(keyCheckers, statPack, totalRowCnt, spillDir, spillTag=0):
+    """check every column with a different value in each row so far, starting from its counts"""
+    for columnName in statPack:
+        if (
+            columnName in keyCheckers
+            or statPack[columnName]["null"]
+            or len(statPack[columnName]) - 1 != totalRowCnt
+        ):
+            continue
+        addKeyCheckers(keyCheckers, [[columnName]], spillDir, spillTag)
+        for columnValue in statPack[columnName]:
+            if columnValue != "null":
+                keyCheckers[columnName].add({columnName: columnValue})
+
+
+# ----------------------------------------
+def openInputFile(fileName, mappingDoc):
+    """open a file with the reader for its dialect and read its header, if it has one"""
+    currentFile = {}
+    currentFile["name"] = fileName
+    currentFile["rowCnt"] = 0
+    currentFile["skipCnt"] = 0
+
+    # --open the file, decompressing it if need be
+    if mappingDoc["input"]["fileEncoding"]:
+        currentFile["fileEncoding"] = mappingDoc["input"]["fileEncoding"]
+    if memoryMap and csv_reader.canMapFile(fileName, currentFile.get("fileEncoding")):
+        currentFile["handle"] = csv_reader.mapped_input(
+            fileName, currentFile.get("fileEncoding")
+        )
+        currentFile["rawHandle"] = currentFile["handle"]
+    else:
+        currentFile["rawHandle"] = open(fileName, "rb", buffering=0)
+        currentFile["handle"] = csv_compression.openInput(
+            fileName,
+            currentFile.get("fileEncoding"),
+            decompressThread,
+            currentFile["rawHandle"],
+        )
+
+    # --set the dialect
+    currentFile["fieldDelimiter"] = mappingDoc["input"]["fieldDelimiter"]
+    if not mappingDoc["input"]["fieldDelimiter"]:
+        with csv_compression.openInput(
+            fileName, currentFile.get("fileEncoding")
+        ) as sniffHandle:
+            sniffer = csv.Sniffer().sniff(sniffHandle.readline(), delimiters="|,\t")
+        currentFile["fieldDelimiter"] = sniffer.delimiter
+        mappingDoc["input"]["fieldDelimiter"] = sniffer.delimiter
+
+    # --set the reader, json lines come back decoded
+    currentFile["csvDialect"] = csv_reader.getDialect(
+        mappingDoc["input"]["fieldDelimiter"]
+    )
+    currentFile["fixedWidth"] = mappingDoc["input"].get("fixedWidth")
+    currentFile["reader"] = csv_reader.getReader(
+        currentFile["handle"],
+        currentFile["csvDialect"],
+        currentFile["fieldDelimiter"],
+        currentFile["fixedWidth"],
+    )
+    mappingDoc["input"]["csvDialect"] = currentFile["csvDialect"]
+
+    # --get the current file header row and use it if not one already, json lines
+    # --have none so their columns are added as they are found, and fixed width
+    # --columns are named by the layout
+    if currentFile["csvDialect"] not in ("json", "fixed"):
+        currentFile, currentHeaders = getNextRow(currentFile)
+        if not mappingDoc["input"]["columnHeaders"]:
+            mappingDoc["input"]["columnHeaders"] = [
+                str(x).replace(" ", "_") for x in currentHeaders
+            ]
+    currentFile["header"] = mappingDoc["input"]["columnHeaders"]
+    return currentFile
+
+
+# ----------------------------------------
+def initStatPack(statPack, columnHeaders):
+    """start the counts of each column, returns how many have no name"""
+    colNum = 0
+    errCnt = 0
+    for columnName in columnHeaders:
+        colNum += 1
+        if not columnName:
+            print(" column %s header is blank!" % colNum)
+            errCnt += 1
+        if columnName not in statPack:
+            statPack[columnName] = {"null": 0}
+    if errCnt:
+        print()
+        print("Row 1 does not contain a valid column header!")
+    return errCnt
+
+
+# ----------------------------------------
+def openFileChunk(chunkInfo):
+    """open a byte range of an input file as if it were the whole file"""
+    currentFile = {}
+    currentFile["name"] = chunkInfo["fileName"]
+    currentFile["rowCnt"] = 0
+    currentFile["skipCnt"] = 0
+    currentFile["fieldDelimiter"] = chunkInfo["fieldDelimiter"]
+    currentFile["csvDialect"] = chunkInfo["csvDialect"]
+    currentFile["fixedWidth"] = chunkInfo["fixedWidth"]
+
+    # --a compressed file cannot be split so is a single chunk read from the start
+    if csv_compression.getCompression(chunkInfo["fileName"]):
+        currentFile["handle"] = csv_compression.openInput(
+            chunkInfo["fileName"], chunkInfo["fileEncoding"], decompressThread
+        )
+    elif memoryMap and csv_reader.canMapFile(
+        chunkInfo["fileName"], chunkInfo["fileEncoding"]
+    ):
+        currentFile["handle"] = csv_reader.mapped_input(
+            chunkInfo["fileName"],
+            chunkInfo["fileEncoding"],
+            chunkInfo["chunkStart"],
+            chunkInfo["chunkEnd"],
+        )
+    else:
+        with open(chunkInfo["fileName"], "rb") as f:
+            f.seek(chunkInfo["chunkStart"])
+            chunkBytes = f.read(chunkInfo["chunkEnd"] - chunkInfo["chunkStart"])
+        currentFile["handle"] = io.TextIOWrapper(
+            io.BytesIO(chunkBytes), encoding=chunkInfo["fileEncoding"]
+        )
+    csv_reader.getDialect(chunkInfo["fieldDelimiter"])
+    currentFile["reader"] = csv_reader.getReader(
+        currentFile["handle"],
+        currentFile["csvDialect"],
+        currentFile["fieldDelimiter"],
+        currentFile["fixedWidth"],
+    )
+
+    # --the first chunk of a csv file starts with its header row
+    if chunkInfo["chunkStart"] == 0 and chunkInfo["csvDialect"] not in (
+        "json",
+        "fixed",
+    ):
+        currentFile, currentHeaders = getNextRow(currentFile)
+    currentFile["header"] = chunkInfo["header"]
+    return currentFile
+
+
+# ----------------------------------------
+def setOptions(optionParms):
+    """the options the statistics are gathered with"""
+    global sketchSize, memoryMap, decompressThread, profileSample, keySpillDir
+
+    sketchSize = optionParms.get("sketchSize")
+    memoryMap = optionParms.get("memoryMap", False)
+    decompressThread = optionParms.get("decompressThread", False)
+    profileSample = optionParms.get("profileSample")
+    keySpillDir = optionParms.get("keySpillDir")
+
+
+# ----------------------------------------
+def initAnalyzerWorker(workerParms):
+    """set up a worker process with the options of the main one"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    setOptions(workerParms)
+
+
+# ----------------------------------------
+def analyzeChunk(chunkInfo):
+    """analyze a chunk in a worker process, returns its statistics for merging"""
+    currentFile = openFileChunk(chunkInfo)
+    columnHeaders = currentFile["header"]
+    mappingDoc = {"input": {"columnHeaders": columnHeaders}}
+    statPack = {columnName: {"null": 0} for columnName in columnHeaders}
+    sketchPack = {}
+    stageTimes = dict.fromkeys(["read", "analyze"], 0.0)
+    chunkProfiler = csv_profiler(None, profileSample) if profileSample else None
+
+    # --a json column first seen part way through this chunk may already be known from
+    # --the chunks before it, so the rows before it are counted apart for the merge
+    columnStarts = dict.fromkeys(columnHeaders, 0)
+    preStatPack = {}
+    analyzedCnt = 0
+    testRecord = None
+
+    # --each chunk spills its own key values, they are read back together at the end
+    keyCheckers = {}
+    addKeyCheckers(
+        keyCheckers, chunkInfo["keyList"], keySpillDir, chunkInfo["chunkNum"]
+    )
+    keysChosen = not (sketchSize and keySpillDir)
+    while True:
+        if chunkProfiler:
+            chunkProfiler.nextRow()
+        startTime = time.perf_counter()
+        currentFile, rowData = getNextRow(currentFile)
+        stageTime = time.perf_counter()
+        stageTimes["read"] += stageTime - startTime
+        if not rowData:
+            break
+
+        if len(columnHeaders) > len(columnStarts):
+            for columnName in columnHeaders[len(columnStarts) :]:
+                columnStarts[columnName] = analyzedCnt
+        analyzedCnt += 1
+        if not testRecord:
+            testRecord = rowData
+
+        analyzeRow(rowData, columnHeaders, statPack, mappingDoc)
+        if currentFile["csvDialect"] == "json":
+            unseenColumns = [x for x in rowData if x not in statPack]
+            if unseenColumns:
+                analyzeRow(
+                    rowData,
+                    unseenColumns,
+                    preStatPack,
+                    {"input": {"columnHeaders": unseenColumns}},
+                )
+        for keyChecker in keyCheckers.values():
+            keyChecker.add(rowData)
+        if sketchSize and analyzedCnt % 10000 == 0:
+            if not keysChosen:
+                addUniqueColumns(
+                    keyCheckers,
+                    statPack,
+                    analyzedCnt,
+                    keySpillDir,
+                    chunkInfo["chunkNum"],
+                )
+                keysChosen = True
+            sketchStatPack(statPack, sketchPack)
+        stageTimes["analyze"] += time.perf_counter() - stageTime
+
+        if "ERROR" in currentFile:
+            break
+    if chunkProfiler:
+        chunkProfiler.stop()
+    currentFile["handle"].close()
+    if sketchSize:
+        if not keysChosen:
+            addUniqueColumns(
+                keyCheckers, statPack, analyzedCnt, keySpillDir, chunkInfo["chunkNum"]
+            )
+        sketchStatPack(statPack, sketchPack)
+
+    chunkResult = {}
+    chunkResult["chunkNum"] = chunkInfo["chunkNum"]
+    chunkResult["rowCnt"] = currentFile["rowCnt"]
+    chunkResult["error"] = "ERROR" in currentFile
+    chunkResult["analyzedCnt"] = analyzedCnt
+    chunkResult["header"] = columnHeaders
+    chunkResult["columnStarts"] = columnStarts
+    chunkResult["statPack"] = statPack
+    chunkResult["preStatPack"] = preStatPack
+    chunkResult["sketchPack"] = sketchPack
+    chunkResult["testRecord"] = testRecord
+    chunkResult["keyResults"] = {
+        keyName: keyChecker.getResult() for keyName, keyChecker in keyCheckers.items()
+    }
+    chunkResult["stageTimes"] = stageTimes
+    chunkResult["profile"] = chunkProfiler.getStats() if chunkProfiler else None
+    return chunkResult
+
+
+# ----------------------------------------
+def mergeValueCounts(valueCounts, chunkCounts):
+    for columnValue, valueCount in chunkCounts.items():
+        if columnValue in valueCounts:
+            valueCounts[columnValue] += valueCount
+        else:
+            valueCounts[columnValue] = valueCount
+
+
+# ----------------------------------------
+def mergeChunkResult(chunkResult, mappingDoc, statPack, sketchPack):
+    """add a worker's chunk statistics to the run totals"""
+    # --chunks are merged in order so each column's values stay in the order they were
+    # --first seen, which is the order the top values are tied in, just like a serial run
+    columnHeaders = mappingDoc["input"]["columnHeaders"]
+    for columnName in columnHeaders:
+        preRowCnt = chunkResult["columnStarts"].get(
+            columnName, chunkResult["analyzedCnt"]
+        )
+        if preRowCnt:
+            preCounts = chunkResult["preStatPack"].get(columnName, {"null": 0})
+            statPack[columnName]["null"] += preRowCnt - sum(preCounts.values())
+            mergeValueCounts(statPack[columnName], preCounts)
+        mergeValueCounts(
+            statPack[columnName], chunkResult["statPack"].get(columnName, {})
+        )
+    for columnName in chunkResult["header"]:
+        if columnName not in statPack:
+            columnHeaders.append(columnName)
+            statPack[columnName] = {"null": 0}
+            mergeValueCounts(statPack[columnName], chunkResult["statPack"][columnName])
+
+    # --sketches combine, then the merged counts are trimmed again
+    for columnName, chunkSketch in chunkResult["sketchPack"].items():
+        if columnName not in sketchPack:
+            sketchPack[columnName] = column_sketch(sketchSize)
+        sketchPack[columnName].merge(chunkSketch)
+    if sketchSize:
+        sketchStatPack(statPack, sketchPack)
+
+
+# ----------------------------------------
+def newFileResult():
+    """the statistics of one input file, kept apart with --state so it can be replaced on its own"""
+    fileResult = {}
+    fileResult["analyzedCnt"] = 0
+    fileResult["header"] = []
+    fileResult["statPack"] = {}
+    fileResult["preStatPack"] = {}
+    fileResult["sketchPack"] = {}
+    fileResult["testRecord"] = None
+    return fileResult
+
+
+# ----------------------------------------
+def mergeFileResults(fileList, fileResults, mappingDoc, statPack, sketchPack):
+    """add up the statistics of each file in order, returns the rows analyzed and a test record"""
+    totalRowCnt = 0
+    testRecord = None
+    for fileName in fileList:
+        if fileName not in fileResults:
+            continue
+        fileResult = fileResults[fileName]
+        fileResult["columnStarts"] = dict.fromkeys(fileResult["header"], 0)
+        mergeChunkResult(fileResult, mappingDoc, statPack, sketchPack)
+        totalRowCnt += fileResult["analyzedCnt"]
+        if not testRecord:
+            testRecord = fileResult["testRecord"]
+    return totalRowCnt, testRecord
+
+
+# ----------------------------------------
+def analyzeFilesParallel(  # pylint: disable=too-many-arguments
+    fileList,
+    mappingDoc,
+    statPack,
+    sketchPack,
+    keyCheckers,
+    *,
+    spillDir,
+    stageTimes,
+    runReport,
+    workerCount,
+    fileResults=None,
+    firstRow=None,
+    lastRow=None,
+    profiler=None,
+):
+    """analyze the input files in byte-range chunks across a pool of worker processes, returns the rows analyzed and a test record"""
+    # --split each file into chunks aligned to record boundaries
+    chunkList = []
+    fileStats = {}
+    for fileName in fileList:
+        print("")
+        print("Splitting %s ..." % fileName)
+        currentFile = openInputFile(fileName, mappingDoc)
+        currentFile["handle"].close()
+        if not statPack and initStatPack(
+            statPack, mappingDoc["input"]["columnHeaders"]
+        ):
+            return None
+
+        fileSize = os.path.getsize(fileName)
+        chunkSize = min(max(fileSize // (workerCount * 4), 1048576), 67108864)
+        fileStats[fileName] = {"rowCnt": 0}
+
+        # --a row range, or a file already indexed, is split at its indexed rows without reading it
+        if firstRow or lastRow:
+            indexDoc = csv_index.getIndex(
+                fileName, currentFile["fieldDelimiter"], currentFile.get("fileEncoding")
+            )
+            if not indexDoc:
+                print("")
+                print("Could not find the rows asked for in %s" % fileName)
+                return None
+            rangeStart, rangeEnd = csv_index.getRowRange(
+                fileName, indexDoc, firstRow, lastRow
+            )
+            runReport.skipInput(fileSize - (rangeEnd - rangeStart))
+            fileChunks = csv_index.getFileChunks(
+                indexDoc, chunkSize, rangeStart, rangeEnd
+            )
+        elif csv_compression.getCompression(fileName):
+            fileChunks = [(0, fileSize)]
+        else:
+            indexDoc = csv_index.loadIndex(
+                fileName, currentFile["fieldDelimiter"], currentFile.get("fileEncoding")
+            )
+            if indexDoc:
+                fileChunks = csv_index.getFileChunks(indexDoc, chunkSize, 0, fileSize)
+            else:
+                fileChunks = csv_reader.getFileChunks(fileName, currentFile, chunkSize)
+        for chunkStart, chunkEnd in fileChunks:
+            chunkInfo = {}
+            chunkInfo["chunkNum"] = len(chunkList)
+            chunkInfo["fileName"] = fileName
+            chunkInfo["chunkStart"] = chunkStart
+            chunkInfo["chunkEnd"] = chunkEnd
+            chunkInfo["fileEncoding"] = currentFile.get("fileEncoding")
+            chunkInfo["fieldDelimiter"] = currentFile["fieldDelimiter"]
+            chunkInfo["csvDialect"] = currentFile["csvDialect"]
+            chunkInfo["fixedWidth"] = currentFile["fixedWidth"]
+            chunkInfo["header"] = list(currentFile["header"])
+            chunkInfo["keyList"] = [x.keyColumns for x in keyCheckers.values()]
+            chunkList.append(chunkInfo)
+        fileStats[fileName]["chunks"] = len(fileChunks)
+        print(" %s chunks" % len(fileChunks))
+
+    workerParms = {}
+    workerParms["sketchSize"] = sketchSize
+    workerParms["memoryMap"] = memoryMap
+    workerParms["decompressThread"] = decompressThread
+    workerParms["profileSample"] = profiler.sampleRate if profiler else None
+    workerParms["keySpillDir"] = spillDir
+    keysChosen = not (sketchSize and spillDir)
+    totalRowCnt = 0
+    testRecord = None
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workerCount,
+        initializer=initAnalyzerWorker,
+        initargs=(workerParms,),
+    ) as executor:
+
+        # --keep a bounded number of chunks in flight so results cannot pile up in memory
+        print("")
+        print("Analyzing %s chunks with %s workers ..." % (len(chunkList), workerCount))
+        pendingChunks = collections.deque()
+        nextChunk = 0
+        errorFiles = set()
+        runReport.workerCount = workerCount
+        while nextChunk < len(chunkList) or pendingChunks:
+            while (
+                nextChunk < len(chunkList)
+                and len(pendingChunks) < workerCount * 2
+                and not shutDown
+            ):
+                pendingChunks.append(
+                    executor.submit(analyzeChunk, chunkList[nextChunk])
+                )
+                nextChunk += 1
+            if not pendingChunks:
+                break
+
+            chunkResult = pendingChunks.popleft().result()
+            chunkInfo = chunkList[chunkResult["chunkNum"]]
+            fileName = chunkInfo["fileName"]
+
+            # --a file stops at its first chunk with too many errors, just like a serial run
+            if fileName not in errorFiles:
+                if chunkResult["error"]:
+                    errorFiles.add(fileName)
+                if fileResults is None:
+                    mergeChunkResult(chunkResult, mappingDoc, statPack, sketchPack)
+                else:
+                    if fileName not in fileResults:
+                        fileResults[fileName] = newFileResult()
+                    fileResult = fileResults[fileName]
+                    mergeChunkResult(
+                        chunkResult,
+                        {"input": {"columnHeaders": fileResult["header"]}},
+                        fileResult["statPack"],
+                        fileResult["sketchPack"],
+                    )
+                    fileResult["analyzedCnt"] += chunkResult["analyzedCnt"]
+                    if not fileResult["testRecord"]:
+                        fileResult["testRecord"] = chunkResult["testRecord"]
+
+                # --with sketches, the columns the first chunk found unique are checked in all of them
+                if chunkResult["analyzedCnt"]:
+                    if not keysChosen:
+                        addKeyCheckers(
+                            keyCheckers,
+                            [
+                                x["keyColumns"]
+                                for x in chunkResult["keyResults"].values()
+                            ],
+                            spillDir,
+                        )
+                        keysChosen = True
+                    for keyName, keyChecker in keyCheckers.items():
+                        keyChecker.merge(chunkResult["keyResults"].get(keyName))
+                if not testRecord:
+                    testRecord = chunkResult["testRecord"]
+                for stageName in chunkResult["stageTimes"]:
+                    stageTimes[stageName] += chunkResult["stageTimes"][stageName]
+                if chunkResult["profile"]:
+                    profiler.addStats(chunkResult["profile"])
+
+                fileStats[fileName]["chunks"] -= 1
+                fileStats[fileName]["rowCnt"] += chunkResult["rowCnt"]
+                totalRowCnt += chunkResult["analyzedCnt"]
+                runReport.finishInput(chunkInfo["chunkEnd"] - chunkInfo["chunkStart"])
+                runReport.update(totalRowCnt, 0)
+                print(
+                    " %s records processed%s"
+                    % (
+                        fileStats[fileName]["rowCnt"],
+                        (
+                            ", %s complete!" % fileName
+                            if fileStats[fileName]["chunks"] == 0
+                            or fileName in errorFiles
+                            else runReport.getProgress()
+                        ),
+                    )
+                )
+
+            if shutDown:
+                for future in pendingChunks:
+                    future.cancel()
+                break
+
+    # --a file not finished when the run was stopped is read again next time
+    if fileResults is not None:
+        for fileName in fileStats:
+            if fileStats[fileName]["chunks"] and fileName not in errorFiles:
+                fileResults.pop(fileName, None)
+    return totalRowCnt, testRecord
@@ -0,0 +1,238 @@
+#! /usr/bin/env python3
+import os
+import glob
+import json
+import zlib
+
+
+# ----------------------------------------
+def getKeyList(keyText):
+    """the key columns in a list such as id,first_name+last_name, columns joined by + are checked together"""
+    keyList = []
+    for keyName in keyText.split(","):
+        keyColumns = [x.strip() for x in keyName.split("+") if x.strip()]
+        if keyColumns and keyColumns not in keyList:
+            keyList.append(keyColumns)
+    return keyList
+
+
+# ----------------------------------------
+def isNullValue(columnValue):
+    """the values the analyzer counts as null"""
+    return not columnValue or columnValue.upper() in ("NONE", "NULL", "\\N")
+
+
+# =========================
+class key_checker:  # pylint: disable=too-many-instance-attributes
+    """decides exactly whether a column, or columns together, have a different value in every row"""
+
+    # --a bloom filter says when a value has surely not been seen, so a value it says may
+    # --have been is a suspect and one that is a suspect twice has definitely repeated, which
+    # --rules out most columns in a few rows, for the rest every value is spilled to hash
+    # --partitioned files and each partition is read back into a set at the end to be sure
+
+    # --the keys are spilled to this many partitions, a partition bigger than the limit is split again
+    partitionCount = 64
+    partitionLimit = 67108864
+    bufferLimit = 100000
+
+    # --an 8 million bit bloom filter with 4 hashes, 1MB per key checked
+    bloomBitCount = 8388608
+    hashCount = 4
+    suspectLimit = 100000
+
+    # ----------------------------------------
+    def __init__(self, keyColumns, spillDir, spillTag=0):
+        self.keyColumns = keyColumns
+        self.spillDir = spillDir
+        self.spillTag = spillTag
+        self.bloomBits = bytearray(self.bloomBitCount // 8)
+        self.suspects = {}
+
+        # --a bloom filter only knows about the rows of its own chunk, so the spill has to be
+        # --read back if anything was a suspect or other chunks were merged in
+        self.needsConfirming = False
+        self.rowCnt = 0
+        self.ruledOut = None
+        self.partitionLines = [[] for i in range(self.partitionCount)]
+        self.bufferedCnt = 0
+
+    # ----------------------------------------
+    def isRuledOut(self):
+        return self.ruledOut is not None
+
+    # ----------------------------------------
+    def ruleOut(self, reason):
+        """the key is not unique, so no more of its values are needed"""
+        self.ruledOut = reason
+        self.close()
+
+    # ----------------------------------------
+    def getKeyValue(self, rowData):
+        """the row's key, a string or a list of them for several columns, None if it is empty"""
+        keyValues = [str(rowData.get(x, "")).strip() for x in self.keyColumns]
+        if all(isNullValue(x) for x in keyValues):
+            return None
+        return keyValues[0] if len(keyValues) == 1 else keyValues
+
+    # ----------------------------------------
+    def mayHaveSeen(self, keyValue):
+        """add a key to the bloom filter, returns True if it may have been added before"""
+        valueHash = hash(keyValue if type(keyValue) == str else tuple(keyValue))
+        hash1 = valueHash & 0xFFFFFFFF
+        hash2 = ((valueHash >> 32) & 0xFFFFFFFF) | 1
+        maySeen = True
+        for i in range(self.hashCount):
+            bitNum = (hash1 + i * hash2) % self.bloomBitCount
+            bitMask = 1 << (bitNum & 7)
+            if not self.bloomBits[bitNum >> 3] & bitMask:
+                self.bloomBits[bitNum >> 3] |= bitMask
+                maySeen = False
+        return maySeen
+
+    # ----------------------------------------
+    def add(self, rowData):
+        """check a row's key"""
+        if self.isRuledOut():
+            return
+        self.rowCnt += 1
+        keyValue = self.getKeyValue(rowData)
+        if keyValue is None:
+            self.ruleOut("empty in some rows")
+            return
+
+        keyLine = json.dumps(keyValue) + "\n"
+        if self.mayHaveSeen(keyValue):
+            self.needsConfirming = True
+            if keyLine in self.suspects:
+                self.ruleOut("%s repeats" % keyLine.strip())
+                return
+            if len(self.suspects) < self.suspectLimit:
+                self.suspects[keyLine] = 1
+
+        self.partitionLines[self.getPartition(keyLine, 0)].append(keyLine)
+        self.bufferedCnt += 1
+        if self.bufferedCnt >= self.bufferLimit:
+            self.spill()
+
+    # ----------------------------------------
+    def getPartition(self, keyLine, level):
+        return zlib.crc32(("%s|%s" % (level, keyLine)).encode("utf-8")) % (
+            self.partitionCount
+        )
+
+    # ----------------------------------------
+    def getPartitionFileName(self, partitionNum):
+        return os.path.join(
+            self.spillDir, "partition-%03d-%05d.jsonl" % (partitionNum, self.spillTag)
+        )
+
+    # ----------------------------------------
+    def spill(self):
+        """append the buffered keys to their partition files"""
+        if not self.bufferedCnt:
+            return
+        os.makedirs(self.spillDir, exist_ok=True)
+        for partitionNum in range(self.partitionCount):
+            if self.partitionLines[partitionNum]:
+                with open(
+                    self.getPartitionFileName(partitionNum), "a", encoding="utf-8"
+                ) as f:
+                    f.writelines(self.partitionLines[partitionNum])
+                self.partitionLines[partitionNum] = []
+        self.bufferedCnt = 0
+
+    # ----------------------------------------
+    def getResult(self):
+        """what a worker found for its chunk, with the rest of its keys spilled"""
+        self.spill()
+        checkResult = {}
+        checkResult["keyColumns"] = self.keyColumns
+        checkResult["rowCnt"] = self.rowCnt
+        checkResult["ruledOut"] = self.ruledOut
+        return checkResult
+
+    # ----------------------------------------
+    def merge(self, checkResult):
+        """add what a worker found for its chunk, a chunk that did not check the key ruled it out"""
+        if self.isRuledOut():
+            return
+        if not checkResult:
+            self.ruleOut("repeats or is empty in some rows")
+        elif checkResult["ruledOut"]:
+            self.ruleOut(checkResult["ruledOut"])
+        else:
+            self.rowCnt += checkResult["rowCnt"]
+            self.needsConfirming = True
+
+    # ----------------------------------------
+    def confirm(self):
+        """read back the spilled keys a partition at a time, returns True if none repeat"""
+        if self.isRuledOut():
+            return False
+        if not self.needsConfirming:
+            return True
+        self.spill()
+        for partitionNum in range(self.partitionCount):
+            fileList = glob.glob(
+                os.path.join(self.spillDir, "partition-%03d-*.jsonl" % partitionNum)
+            )
+            if self.hasDuplicate(fileList, 0):
+                return False
+        return True
+
+    # ----------------------------------------
+    def hasDuplicate(self, fileList, level):
+        # --a partition too big to hold in memory is split again with a different hash
+        if (
+            sum(os.path.getsize(x) for x in fileList) > self.partitionLimit
+            and level < 4
+        ):
+            subDir = fileList[0] + ".split"
+            os.mkdir(subDir)
+            subFiles = [
+                open(
+                    os.path.join(subDir, "partition-%03d.jsonl" % i),
+                    "w",
+                    encoding="utf-8",
+                )
+                for i in range(self.partitionCount)
+            ]
+            for fileName in fileList:
+                with open(fileName, "r", encoding="utf-8") as f:
+                    for keyLine in f:
+                        subFiles[self.getPartition(keyLine, level + 1)].write(keyLine)
+            for subFile in subFiles:
+                subFile.close()
+            for subFile in subFiles:
+                if self.hasDuplicate([subFile.name], level + 1):
+                    return True
+            return False
+
+        seenKeys = set()
+        for fileName in fileList:
+            with open(fileName, "r", encoding="utf-8") as f:
+                for keyLine in f:
+                    if keyLine in seenKeys:
+                        self.ruledOut = "%s repeats" % keyLine.strip()
+                        return True
+                    seenKeys.add(keyLine)
+        return False
+
+    # ----------------------------------------
+    def getStatus(self):
+        if self.isRuledOut():
+            return "not unique, %s" % self.ruledOut
+        return "unique"
+
+    # ----------------------------------------
+    def close(self):
+        """drop the keys spilled so far, they are not needed once the key is ruled out"""
+        self.partitionLines = [[] for i in range(self.partitionCount)]
+        self.bufferedCnt = 0
+        self.suspects = {}
+        self.bloomBits = bytearray()
+        for fileName in glob.glob(
+            os.path.join(self.spillDir, "partition-*-%05d.jsonl" % self.spillTag)
+        ):
+            os.remove(fileName)
@@ -11,6 +11,8 @@ from dateutil.parser import parse as dateparse
 import signal
 import random
 import hashlib
+import cProfile
+import pstats
 
 
 # =========================
@@ -174,6 +176,18 @@ if __name__ == "__main__":
         dest="log_file",
         help="optional name of the statistics log file",
     )
+    parser.add_argument(
+        "--profile_file",
+        dest="profile_file",
+        help="optional name of a pstats file to profile the mapping to",
+    )
+    parser.add_argument(
+        "--profile_sample",
+        dest="profile_sample",
+        type=int,
+        default=1,
+        help="profile only 1 in this many rows, default is every row",
+    )
     args = parser.parse_args()
 
     if not args.input_file or not os.path.exists(args.input_file):
@@ -186,16 +200,22 @@ if __name__ == "__main__":
     input_file_handle = open(args.input_file, "r")
     output_file_handle = open(args.output_file, "w", encoding="utf-8")
     mapper = mapper()
+    profiler = cProfile.Profile() if args.profile_file else None
 
     input_row_count = 0
     output_row_count = 0
     for input_row in csv.DictReader(input_file_handle, dialect=csv_dialect):
         input_row_count += 1
 
+        profile_row = profiler and input_row_count % max(args.profile_sample, 1) == 0
+        if profile_row:
+            profiler.enable()
         json_data = mapper.map(input_row, input_row_count)
         if json_data:
             output_file_handle.write(json.dumps(json_data) + "\n")
             output_row_count += 1
+        if profile_row:
+            profiler.disable()
 
         if input_row_count % 1000 == 0:
             print(
@@ -223,4 +243,15 @@ if __name__ == "__main__":
             json.dump(mapper.stat_pack, outfile, indent=4, sort_keys=True)
         print("Mapping stats written to %s\n" % args.log_file)
 
+    # --write the profile and a summary of the slowest functions beside it
+    if profiler and profiler.getstats():
+        profiler.dump_stats(args.profile_file)
+        summary_file = os.path.splitext(args.profile_file)[0] + "-summary.txt"
+        with open(summary_file, "w") as outfile:
+            profile_stats = pstats.Stats(profiler, stream=outfile)
+            profile_stats.sort_stats("cumulative").print_stats(25)
+        print(
+            "Profile written to %s, summary in %s\n" % (args.profile_file, summary_file)
+        )
+
     sys.exit(0)
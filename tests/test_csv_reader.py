@@ -0,0 +1,48 @@
+#! /usr/bin/env python3
+import io
+import os
+import sys
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+)
+import csv_reader  # noqa: E402  pylint: disable=wrong-import-position
+
+
+# ----------------------------------------
+def readRows(fileText, blockSize=65536):
+    """the rows a multi-character delimited file is read into"""
+    reader = csv_reader.multi_delimiter_reader(
+        io.StringIO(fileText), "~|~", blockSize=blockSize
+    )
+    return [list(row) for row in reader]
+
+
+# ----------------------------------------
+def test_row_cleaned_the_same_next_to_any_row():
+    """a row is read the same no matter what other rows share its block"""
+    quotedRow = 'a~|~" pad "~|~c\n'
+    assert readRows(quotedRow) == [["a", "pad", "c"]]
+
+    # --two blocks that differ only in the row next to the quoted one
+    assert readRows("x~|~y~|~z\n" + quotedRow) == [["x", "y", "z"], ["a", "pad", "c"]]
+    assert readRows("x ~|~ y~|~z\n" + quotedRow) == [["x", "y", "z"], ["a", "pad", "c"]]
+    assert readRows("'x'~|~y~|~z\n" + quotedRow) == [["x", "y", "z"], ["a", "pad", "c"]]
+
+
+# ----------------------------------------
+def test_rows_cleaned_the_same_in_any_block_size():
+    """the fields of a file come out the same whatever the block size"""
+    fileText = (
+        "x ~|~ y~|~z\n"
+        + 'a~|~" pad "~|~c\n'
+        + "'d'~|~e~|~f\n" * 20
+        + "g~|~h~|~i\n" * 20
+    )
+    expectedRows = (
+        [["x", "y", "z"], ["a", "pad", "c"]]
+        + [["d", "e", "f"]] * 20
+        + [["g", "h", "i"]] * 20
+    )
+    for blockSize in (1, 16, 64, 65536):
+        assert readRows(fileText, blockSize) == expectedRows